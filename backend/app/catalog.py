@@ -0,0 +1,365 @@
+"""Versioned catalog snapshots: offers plus their vector, BM25 and column indexes.
+
+A CatalogSnapshot is immutable once published. The store swaps in a new
+snapshot with a single reference assignment, and a request pins the snapshot
+it started with. In-flight searches therefore never see a half-applied
+update, and never a half-built reload.
+
+Incremental updates (apply) derive the next version cheaply. Base-segment
+indexes and append-only buffers are shared; only the small per-version state
+is copied: tombstone bitmaps, document frequencies and tail postings.
+Appended rows land past the row count of every older version, so older
+snapshots stay valid for the requests still holding them. Rows present at
+build time form the base segment, served by the configured vector index and
+the category-clustered columns; later rows form the tail segment, which is
+scored exactly.
+"""
+
+from __future__ import annotations
+
+import copy
+from collections.abc import Mapping
+from typing import Optional
+
+import numpy as np
+
+from app.config import get_settings
+from app.index.bm25 import BM25Index, CorpusStats, tokenize
+from app.index.columns import OfferColumns, RowFilter
+from app.index.growable import GrowableArray
+from app.index.ivf import IVFVectorIndex
+from app.index.quant import QuantizedVectorIndex
+from app.index.twostage import TwoStageVectorIndex
+from app.index.vector import ExactVectorIndex, VectorIndex, normalize_rows, top_k_indices, window_top_k
+from app.records import Hit, OfferRecord
+
+_DELETED = -1
+_NO_ROWS = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+
+
+def _offer_text(o: Mapping) -> str:
+    """Lexical fields indexed for BM25."""
+    return f"{o.get('merchantName', '')} {o.get('productName', '')} {o.get('category', '')}"
+
+
+def _category_order(offers: list) -> list[int]:
+    """Stable-group offer positions by category (first-seen order) so each category is a contiguous row range."""
+    first_seen: dict[str, int] = {}
+    for o in offers:
+        first_seen.setdefault(o["category"].lower(), len(first_seen))
+    return sorted(range(len(offers)), key=lambda i: first_seen[offers[i]["category"].lower()])
+
+
+def build_vector_index(embeddings: np.ndarray, normalized: bool = False) -> VectorIndex:
+    """Pick the vector index from VECTOR_INDEX / VECTOR_QUANTIZATION (exact float32 by default).
+
+    normalized=True marks embeddings as already unit-length (a mapped snapshot):
+    they are used as given, without a normalized copy. ValueError when
+    VECTOR_QUANTIZATION is set with an index that doesn't support it.
+    """
+    settings = get_settings()
+    if settings.VECTOR_QUANTIZATION != "none" and settings.VECTOR_INDEX != "exact":
+        raise ValueError(
+            f"VECTOR_QUANTIZATION={settings.VECTOR_QUANTIZATION} applies to VECTOR_INDEX=exact only, "
+            f"not {settings.VECTOR_INDEX}; unset one of them"
+        )
+    if settings.VECTOR_INDEX == "ivf":
+        return IVFVectorIndex(embeddings, nlist=settings.IVF_NLIST, nprobe=settings.IVF_NPROBE, normalized=normalized)
+    if settings.VECTOR_INDEX == "two_stage":
+        return TwoStageVectorIndex(
+            embeddings,
+            coarse_dim=settings.VECTOR_COARSE_DIM,
+            shortlist=settings.VECTOR_SHORTLIST,
+            projection=settings.VECTOR_COARSE_PROJECTION,
+            min_overlap=settings.VECTOR_MIN_OVERLAP,
+            normalized=normalized,
+        )
+    if settings.VECTOR_QUANTIZATION != "none":
+        return QuantizedVectorIndex(
+            embeddings,
+            mode=settings.VECTOR_QUANTIZATION,
+            rescore_k=settings.VECTOR_RESCORE_K,
+            spill_dir=settings.VECTOR_SPILL_DIR or None,
+            normalized=normalized,
+        )
+    return ExactVectorIndex(embeddings, normalized=normalized)
+
+
+class CatalogSnapshot:
+    """One immutable version of the catalog and its indexes."""
+
+    def __init__(
+        self,
+        version: int,
+        records: list[OfferRecord],  # or any list-like with len / indexing / extend (see app/snapshot.py)
+        vectors: VectorIndex,
+        tail: GrowableArray,
+        bm25: BM25Index,
+        columns: OfferColumns,
+        base_rows: Mapping[str, int],
+    ) -> None:
+        self.version = version
+        self._records = records  # append-only, shared across versions; this version sees len(columns) rows
+        self._vectors = vectors  # base rows [0, n_base)
+        self._tail_buffer = tail  # normalized embeddings of rows >= n_base, shared across versions
+        self.n_base = len(base_rows)
+        self._n_tail = len(tail)
+        self._bm25 = bm25
+        self._columns = columns
+        self._base_rows = base_rows  # id → row at build time, never modified
+        self._row_overlay: dict[str, int] = {}  # ids written since build (_DELETED = deleted)
+        self._live: Optional[list[OfferRecord]] = None
+
+    @classmethod
+    def build(cls, records: list[OfferRecord], embeddings: np.ndarray, version: int) -> "CatalogSnapshot":
+        """Clean base segment (no tail, no tombstones) from records + embeddings."""
+        # Category partitions: the embedding matrix and postings of one category are contiguous
+        order = _category_order(records)
+        records = [records[i] for i in order]
+        embeddings = embeddings[np.asarray(order, dtype=np.int64)]
+        return cls(
+            version=version,
+            records=records,
+            vectors=build_vector_index(embeddings),
+            tail=GrowableArray(np.empty((0, embeddings.shape[1]), dtype=np.float32)),
+            bm25=BM25Index.build(tokenize(_offer_text(r)) for r in records),
+            columns=OfferColumns.from_offers(records),
+            base_rows={r["id"]: i for i, r in enumerate(records)},
+        )
+
+    def __len__(self) -> int:
+        """Live offer count."""
+        return len(self._columns) - self._columns.n_dead
+
+    @property
+    def offers(self) -> list[OfferRecord]:
+        """Live offer records in row order."""
+        if self._live is None:
+            alive = self._columns.alive
+            self._live = [self._records[i] for i in np.flatnonzero(alive).tolist()]
+        return self._live
+
+    @property
+    def pending_rows(self) -> int:
+        """Tail + tombstoned rows accumulated since the last build."""
+        return self._n_tail + self._columns.n_dead
+
+    @property
+    def _tail(self) -> np.ndarray:
+        return self._tail_buffer.view[:self._n_tail]
+
+    def row_of(self, offer_id: str) -> int:
+        """Row index of an offer in the filter mask."""
+        row = self._row_overlay.get(offer_id)
+        if row is None:
+            row = self._base_rows[offer_id]
+        if row == _DELETED:
+            raise KeyError(offer_id)
+        return row
+
+    def __contains__(self, offer_id: object) -> bool:
+        return self._row_overlay.get(offer_id, self._base_rows.get(offer_id, _DELETED)) != _DELETED
+
+    # ── Derived versions ──
+
+    def apply(
+        self,
+        upserts: list[tuple[OfferRecord, np.ndarray]],
+        deletes: list[str],
+        version: int,
+    ) -> "CatalogSnapshot":
+        """Next version: upserts (record, embedding) appended as tail rows, replaced and deleted rows tombstoned.
+
+        Upserts are applied in order, then deletes. This snapshot is not modified;
+        only the latest snapshot may be extended. Everything that can fail (a
+        superseded version, an embedding of the wrong dimension, a price or
+        term the columns can't hold) is checked before the shared buffers are
+        touched.
+        """
+        if not len(self._records) == len(self._columns) == self._bm25.size:
+            raise RuntimeError("CatalogSnapshot.apply on a superseded version")
+        dim = self._tail_buffer.view.shape[1]
+        wrong = [record["id"] for record, embedding in upserts if np.shape(embedding) != (dim,)]
+        if wrong:
+            raise ValueError(f"embeddings of {', '.join(wrong)} do not have EMBEDDING_DIM={dim} dimensions")
+        self._columns.check(record for record, _ in upserts)
+        tail = normalize_rows(np.array([e for _, e in upserts], dtype=np.float32)) if upserts else None
+
+        overlay = dict(self._row_overlay)
+        row = len(self._columns)
+        dead: list[int] = []
+        for record, _ in upserts:
+            old = overlay.get(record["id"], self._base_rows.get(record["id"], _DELETED))
+            if old != _DELETED:
+                dead.append(old)
+            overlay[record["id"]] = row
+            row += 1
+        for offer_id in deletes:
+            old = overlay.get(offer_id, self._base_rows.get(offer_id, _DELETED))
+            if old != _DELETED:
+                dead.append(old)
+                overlay[offer_id] = _DELETED
+
+        n = len(self._columns)
+        records = [r for r, _ in upserts]
+        added = [tokenize(_offer_text(r)) for r in records]
+        removed = [(i, tokenize(_offer_text(self._records[i] if i < n else records[i - n]))) for i in dead]
+        new = copy.copy(self)
+        new.version = version
+        # Shared buffers: older snapshots only read their first n rows
+        new._columns = self._columns.apply(records, dead)
+        new._bm25 = self._bm25.apply(added, removed)
+        self._records.extend(records)
+        if tail is not None:
+            self._tail_buffer.append(tail)
+        new._n_tail = len(self._tail_buffer)
+        new._row_overlay = overlay
+        new._live = None
+        if not len(new._columns) == new._bm25.size == len(self._records) == new.n_base + new._n_tail:
+            raise RuntimeError(f"CatalogSnapshot v{version}: columns, BM25, records and vectors disagree on the row count")
+        return new
+
+    def compact(self, version: int) -> "CatalogSnapshot":
+        """Clean rebuild from the live rows: the tail is folded into the base, tombstones dropped."""
+        return CatalogSnapshot.build(*self.live_rows(), version=version)
+
+    def live_rows(self) -> tuple[list[OfferRecord], np.ndarray]:
+        """Live records and their embeddings, for building a compacted snapshot."""
+        live = np.flatnonzero(self._columns.alive)
+        base, tail = live[live < self.n_base], live[live >= self.n_base] - self.n_base
+        embeddings = np.concatenate([self._vectors.row_vectors(base), self._tail[tail]])
+        return [self._records[i] for i in live.tolist()], embeddings
+
+    # ── Search ──
+
+    def row_filter(self, filters: Optional[dict]) -> Optional[RowFilter]:
+        """Constraint dict (category / max_price / max_monthly / only_zero_apr) → eligible rows.
+
+        None when every row is eligible; tombstoned rows are always excluded.
+        """
+        filters = filters or {}
+        return self._columns.row_filter(
+            category=filters.get("category"),
+            max_price=filters.get("max_price"),
+            max_monthly=filters.get("max_monthly"),
+            only_zero_apr=filters.get("only_zero_apr", False),
+        )
+
+    def bm25_search(self, query: str, top_k: int = 20, filters: Optional[dict] = None) -> list[Hit]:
+        """BM25 scoring over offer text (merchantName + productName + category).
+
+        Only the postings of the query terms are scored; see BM25Index.search.
+        With filters, the top-k is taken over eligible offers only.
+        """
+        top_idx, scores = self.bm25_rows(tokenize(query), top_k, filters)
+        return self._hits(top_idx, scores, "_bm25_score")
+
+    def bm25_rows(
+        self, tokens: list[str], top_k: int, filters: Optional[dict] = None, corpus: Optional[CorpusStats] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """bm25_search as (rows, scores) for a tokenized query.
+
+        corpus scores with the statistics of a larger catalog this one is a
+        shard of (see app/shards.py).
+        """
+        if not tokens:
+            return _NO_ROWS
+        where = self.row_filter(filters)
+        if where is not None and where.count == 0:
+            return _NO_ROWS
+        bm25 = self._bm25 if corpus is None else self._bm25.with_corpus_stats(corpus)
+        return bm25.search(tokens, top_k, where)
+
+    def corpus_stats(self, tokens: list[str]) -> CorpusStats:
+        """BM25 statistics of the live offers for the given terms."""
+        return self._bm25.corpus_stats(tokens)
+
+    def vector_search(
+        self, query_embedding: list[float], top_k: int = 20, filters: Optional[dict] = None,
+    ) -> list[Hit]:
+        """Cosine similarity search over offer embeddings.
+
+        With filters, the constraint mask is applied before top-k selection and a
+        category constraint scans only that category's partition.
+        """
+        top_idx, scores = self.vector_rows(np.asarray(query_embedding, dtype=np.float32), top_k, filters)
+        return self._hits(top_idx, scores, "_similarity")
+
+    def vector_rows(
+        self, query: np.ndarray, top_k: int, filters: Optional[dict] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """vector_search as (rows, scores); rows may contain -1 padding from approximate indexes."""
+        where = self.row_filter(filters)
+        if where is not None and where.count == 0:
+            return _NO_ROWS
+        return self._vector_top(query, top_k, where)
+
+    def _vector_top(self, query: np.ndarray, top_k: int, where: Optional[RowFilter]) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k over the base index and the exact-scored tail, merged by score."""
+        ids, scores = self._vectors.search(query, top_k, where.window() if where is not None else None)
+        if not self._n_tail:
+            return ids, scores
+        tail_scores = self._tail @ normalize_rows(query)
+        if where is not None:
+            tail_ids, tail_scores = window_top_k(tail_scores, top_k, RowFilter(0, len(tail_scores), where.tail_mask))
+        else:
+            tail_ids = top_k_indices(tail_scores, top_k)
+            tail_scores = tail_scores[tail_ids]
+        ids = np.concatenate([ids, tail_ids + self.n_base])
+        scores = np.concatenate([scores, tail_scores])
+        top = top_k_indices(scores, top_k)
+        return ids[top], scores[top]
+
+    def vector_search_many(self, queries: list[list[float]], top_k: int = 20) -> list[list[Hit]]:
+        """Batched vector_search: one matrix-matrix product for a block of queries."""
+        if not len(queries):
+            return []
+        results = self.vector_rows_many(np.asarray(queries, dtype=np.float32), top_k)
+        return [self._hits(ids, sc, "_similarity") for ids, sc in results]
+
+    def vector_rows_many(self, queries: np.ndarray, top_k: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        """vector_search_many as (rows, scores) per query."""
+        if self.pending_rows:
+            return [self._vector_top(q, top_k, None) for q in queries]
+        return list(zip(*self._vectors.search_many(queries, top_k)))
+
+    def _hits(self, top_idx: np.ndarray, scores: np.ndarray, score_key: str) -> list[Hit]:
+        """Results as views over the shared records (no per-request copies)."""
+        records = self._records
+        return [
+            Hit(records[idx], score_key, score)
+            for idx, score in zip(top_idx.tolist(), scores.tolist())
+            if idx >= 0  # padding from approximate indexes
+        ]
+
+    def filter_offers(
+        self,
+        category: Optional[str] = None,
+        max_price: Optional[float] = None,
+        max_monthly: Optional[float] = None,
+        only_zero_apr: bool = False,
+    ) -> list[OfferRecord]:
+        """SQL-like filter on offers (one vectorized mask over the attribute columns)."""
+        mask = self.filter_mask(category, max_price, max_monthly, only_zero_apr)
+        return [self._records[i] for i in np.flatnonzero(mask).tolist()]
+
+    def filter_mask(
+        self,
+        category: Optional[str] = None,
+        max_price: Optional[float] = None,
+        max_monthly: Optional[float] = None,
+        only_zero_apr: bool = False,
+    ) -> np.ndarray:
+        """Boolean mask over offer rows satisfying all given constraints."""
+        return self._columns.mask(category, max_price, max_monthly, only_zero_apr)
+
+    def eligible(self, offer_ids: list[str], filters: Optional[dict]) -> list[bool]:
+        """Whether each offer satisfies the constraint dict (same keys as row_filter)."""
+        filters = filters or {}
+        allowed = self.filter_mask(
+            category=filters.get("category"),
+            max_price=filters.get("max_price"),
+            max_monthly=filters.get("max_monthly"),
+            only_zero_apr=filters.get("only_zero_apr", False),
+        )
+        return [bool(allowed[self.row_of(i)]) for i in offer_ids]
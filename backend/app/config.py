@@ -19,6 +19,18 @@ class Settings:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OLLAMA_HOST: str = os.getenv("OLLAMA_HOST", "http://localhost:11434")
     EMBEDDING_DIM: int = 384
+    # Real embedding models (app/embedder.py): "torch" (sentence-transformers) or "onnx" (ONNX Runtime CPU,
+    # from an export in EMBEDDING_ONNX_DIR, int8-quantized unless EMBEDDING_ONNX_INT8=false, CLS or mean pooling);
+    # intra-op threads (0 = runtime default), encoder threads, and the micro-batch size / collection window
+    # (0 = batch whatever queued up during the previous forward pass, adding no latency to a lone query)
+    EMBEDDING_RUNTIME: str = os.getenv("EMBEDDING_RUNTIME", "torch").lower()
+    EMBEDDING_ONNX_DIR: str = os.getenv("EMBEDDING_ONNX_DIR", "")
+    EMBEDDING_ONNX_INT8: bool = os.getenv("EMBEDDING_ONNX_INT8", "true").lower() == "true"
+    EMBEDDING_POOLING: str = os.getenv("EMBEDDING_POOLING", "cls").lower()
+    EMBEDDING_THREADS: int = int(os.getenv("EMBEDDING_THREADS", "0"))
+    EMBEDDING_WORKERS: int = int(os.getenv("EMBEDDING_WORKERS", "1"))
+    EMBEDDING_BATCH_MAX: int = int(os.getenv("EMBEDDING_BATCH_MAX", "32"))
+    EMBEDDING_BATCH_WINDOW_MS: float = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "0"))
 
     # Performance budgets
     MAX_RERANK_CANDIDATES: int = int(os.getenv("MAX_RERANK_CANDIDATES", "30"))
@@ -26,6 +38,91 @@ class Settings:
     RETRIEVE_TIMEOUT_MS: int = int(os.getenv("RETRIEVE_TIMEOUT_MS", "200"))
     TOTAL_BUDGET_MS: int = int(os.getenv("TOTAL_BUDGET_MS", "1000"))
 
+    # Query understanding (app/pipeline/understanding.py): longest query parsed (longer ones are cut
+    # at a word boundary, or at the limit without one), and the size of the sanitize and parsed-constraints memos
+    QUERY_MAX_CHARS: int = int(os.getenv("QUERY_MAX_CHARS", "256"))
+    QUERY_PARSE_CACHE_SIZE: int = int(os.getenv("QUERY_PARSE_CACHE_SIZE", "4096"))
+
+    # Vector index: "exact" (brute-force cosine), "ivf" (approximate, see app/index/ivf.py)
+    # or "two_stage" (low-dim coarse scan + full-dim rescoring, see app/index/twostage.py)
+    VECTOR_INDEX: str = os.getenv("VECTOR_INDEX", "exact").lower()
+    IVF_NLIST: int = int(os.getenv("IVF_NLIST", "0"))  # 0 = auto (~4·sqrt(n))
+    IVF_NPROBE: int = int(os.getenv("IVF_NPROBE", "8"))
+    # Exact index only: "none", "int8" or "float16" first-pass scan, rescored at full precision
+    VECTOR_QUANTIZATION: str = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+    VECTOR_RESCORE_K: int = int(os.getenv("VECTOR_RESCORE_K", "200"))
+    VECTOR_SPILL_DIR: str = os.getenv("VECTOR_SPILL_DIR", "")  # "" = system temp dir
+    # Two-stage index: coarse dims, "prefix" or "pca" projection, starting shortlist, target top-20 overlap
+    VECTOR_COARSE_DIM: int = int(os.getenv("VECTOR_COARSE_DIM", "64"))
+    VECTOR_COARSE_PROJECTION: str = os.getenv("VECTOR_COARSE_PROJECTION", "prefix").lower()
+    VECTOR_SHORTLIST: int = int(os.getenv("VECTOR_SHORTLIST", "200"))
+    VECTOR_MIN_OVERLAP: float = float(os.getenv("VECTOR_MIN_OVERLAP", "0.9"))
+
+    # Catalog updates: rebuild the indexes once appended + deleted rows exceed this fraction of the catalog
+    STORE_COMPACT_RATIO: float = float(os.getenv("STORE_COMPACT_RATIO", "0.25"))
+    # Memory-mapped catalog snapshot written by `python -m app.snapshot` ("" = build from the seed catalog)
+    SNAPSHOT_DIR: str = os.getenv("SNAPSHOT_DIR", "")
+    # File sizes are always checked at load; SNAPSHOT_VERIFY also hashes every file (a full read of the snapshot)
+    SNAPSHOT_VERIFY: bool = os.getenv("SNAPSHOT_VERIFY", "false").lower() == "true"
+    # Sharded store: partition offers across N local shard processes searched in parallel (0/1 = one process),
+    # placed by offer id ("hash") or whole categories ("category"); shards must answer within the timeout
+    STORE_SHARDS: int = int(os.getenv("STORE_SHARDS", "0"))
+    STORE_SHARD_PLACEMENT: str = os.getenv("STORE_SHARD_PLACEMENT", "hash").lower()
+    STORE_SHARD_TIMEOUT_MS: int = int(os.getenv("STORE_SHARD_TIMEOUT_MS", "1000"))
+
+    # Executor layer for heavy pipeline work (app/executors.py): pool sizes (0 = CPU count), per-stage
+    # concurrency limits ("stage=N,..."; unlisted stages are unlimited) and the smallest fallback-rerank
+    # batch worth shipping to the process pool (smaller batches are scored inline)
+    EXEC_THREAD_WORKERS: int = int(os.getenv("EXEC_THREAD_WORKERS", "0"))
+    EXEC_PROCESS_WORKERS: int = int(os.getenv("EXEC_PROCESS_WORKERS", "0"))
+    EXEC_STAGE_LIMITS: str = os.getenv("EXEC_STAGE_LIMITS", "")
+    EXEC_PROCESS_MIN_ITEMS: int = int(os.getenv("EXEC_PROCESS_MIN_ITEMS", "256"))
+    # Pre-fork server (app/serve.py): delay before replacing a dead worker, doubled per recent crash up to
+    # the max, and how many worker deaths within the window make it stop and exit (0 = never give up)
+    SERVE_RESPAWN_BACKOFF_MS: int = int(os.getenv("SERVE_RESPAWN_BACKOFF_MS", "100"))
+    SERVE_RESPAWN_MAX_MS: int = int(os.getenv("SERVE_RESPAWN_MAX_MS", "30000"))
+    SERVE_MAX_CRASHES: int = int(os.getenv("SERVE_MAX_CRASHES", "10"))
+    SERVE_CRASH_WINDOW_S: float = float(os.getenv("SERVE_CRASH_WINDOW_S", "60"))
+
+    # Catalog backend: "memory" (InMemoryStore), "sqlite" (app/sqlite_store.py: SQLite attributes,
+    # FTS5 BM25 and memory-mapped vectors in SQLITE_DIR, read through a pool of connections) or
+    # "postgres" (app/pg_store.py: pgvector HNSW + tsvector at DATABASE_URL; the default with USE_MOCK_DB=false)
+    STORE_BACKEND: str = os.getenv("STORE_BACKEND", "memory" if USE_MOCK_DB else "postgres").lower()
+    SQLITE_DIR: str = os.getenv("SQLITE_DIR", "sqlite")
+    SQLITE_READ_CONNECTIONS: int = int(os.getenv("SQLITE_READ_CONNECTIONS", "8"))
+    SQLITE_MMAP_BYTES: int = int(os.getenv("SQLITE_MMAP_BYTES", str(256 << 20)))
+    # How often each process checks for versions other processes committed (snapshot() itself does no I/O)
+    SQLITE_POLL_MS: int = int(os.getenv("SQLITE_POLL_MS", "50"))
+    # Postgres backend: schema, asyncpg pool size, HNSW build (m, ef_construction) and search (ef_search)
+    # parameters, and the deadline for acquiring a connection and for each read query
+    PG_SCHEMA: str = os.getenv("PG_SCHEMA", "public")
+    PG_POOL_MIN: int = int(os.getenv("PG_POOL_MIN", "2"))
+    PG_POOL_MAX: int = int(os.getenv("PG_POOL_MAX", "10"))
+    PG_HNSW_M: int = int(os.getenv("PG_HNSW_M", "16"))
+    PG_HNSW_EF_CONSTRUCTION: int = int(os.getenv("PG_HNSW_EF_CONSTRUCTION", "64"))
+    PG_HNSW_EF_SEARCH: int = int(os.getenv("PG_HNSW_EF_SEARCH", "100"))
+    PG_TIMEOUT_MS: int = int(os.getenv("PG_TIMEOUT_MS", "1000"))
+
+    # Query embedding cache (app/embed_cache.py): max entries (0 = off), entry lifetime (0 = no expiry),
+    # and a file to persist it across restarts ("" = in memory only)
+    EMBED_CACHE_SIZE: int = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+    EMBED_CACHE_TTL_S: float = float(os.getenv("EMBED_CACHE_TTL_S", "3600"))
+    EMBED_CACHE_PATH: str = os.getenv("EMBED_CACHE_PATH", "")
+    # Search result cache (app/search_cache.py): max entries (0 = off), entry lifetime (0 = no expiry)
+    SEARCH_CACHE_SIZE: int = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+    SEARCH_CACHE_TTL_S: float = float(os.getenv("SEARCH_CACHE_TTL_S", "300"))
+    # Vector file written by `python -m app.embed_catalog`; the seed catalog reuses its vectors ("" = embed at startup)
+    EMBED_VECTORS_DIR: str = os.getenv("EMBED_VECTORS_DIR", "")
+
+    # Feedback / search event log (app/events.py): in-memory ring capacity, and with a directory set,
+    # batched JSONL segments flushed every EVENT_LOG_FLUSH_MS, rotated by size and pruned by count (0 = keep all)
+    EVENT_LOG_DIR: str = os.getenv("EVENT_LOG_DIR", "")
+    EVENT_LOG_CAPACITY: int = int(os.getenv("EVENT_LOG_CAPACITY", "65536"))
+    EVENT_LOG_FLUSH_MS: int = int(os.getenv("EVENT_LOG_FLUSH_MS", "500"))
+    EVENT_LOG_SEGMENT_BYTES: int = int(os.getenv("EVENT_LOG_SEGMENT_BYTES", str(64 << 20)))
+    EVENT_LOG_MAX_SEGMENTS: int = int(os.getenv("EVENT_LOG_MAX_SEGMENTS", "64"))
+    EVENT_LOG_FSYNC: bool = os.getenv("EVENT_LOG_FSYNC", "false").lower() == "true"
+
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -0,0 +1,192 @@
+"""Query embedding cache: bounded LRU with a TTL, keyed by embedding model and normalized query.
+
+Query traffic is head-heavy ("laptop", "ps5", "only 0% apr"), so most
+requests can skip the embedder entirely. Store.get_embedding normalizes the
+query (lowercase, collapsed whitespace) before both the lookup and the
+embedding, so a hit returns exactly what a miss would have computed.
+Entries are read-only float32 vectors shared by every request that hits them.
+
+EMBED_CACHE_SIZE bounds the entry count (least recently used goes first;
+0 disables the cache). EMBED_CACHE_TTL_S expires entries by age, so a
+re-deployed model can never serve stale vectors for long, even though the
+model id is part of the key anyway. With EMBED_CACHE_PATH set, the cache is
+saved there at shutdown and loaded at startup, so a restart doesn't begin
+cold. Each save writes a temp file of its own and renames it over the .npz,
+so workers saving at once never interleave; a file that can't be read is
+ignored. Every process keeps its own cache; app.serve workers inherit the
+parent's at fork.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """The cache key form of a query (also what gets embedded)."""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """Thread-safe LRU of (model, query) → embedding with per-entry expiry."""
+
+    def __init__(
+        self,
+        capacity: int = 10000,
+        ttl_s: float = 3600.0,
+        path: str | Path | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self.path = Path(path) if path else None
+        self._clock = clock
+        self._entries: OrderedDict[tuple[str, str], tuple[np.ndarray, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if self.path is not None and self.path.exists():
+            try:
+                self._load()
+            except Exception as e:  # a corrupt file (BadZipFile, ...) must not take the cache down: start cold
+                self._entries.clear()
+                logger.warning("embed_cache.load_failed", extra={"path": str(self.path), "error": repr(e)})
+
+    @classmethod
+    def from_settings(cls) -> "EmbeddingCache":
+        settings = get_settings()
+        return cls(settings.EMBED_CACHE_SIZE, settings.EMBED_CACHE_TTL_S, settings.EMBED_CACHE_PATH or None)
+
+    def _expired(self, stamp: float, now: float) -> bool:
+        return self.ttl_s > 0 and now - stamp >= self.ttl_s
+
+    def get(self, model: str, query: str) -> Optional[np.ndarray]:
+        """The cached embedding of a normalized query, or None (counted as a miss)."""
+        key = (model, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], self._clock()):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+        return None
+
+    def put(self, model: str, query: str, embedding: Sequence[float]) -> np.ndarray:
+        """Cache an embedding; returns the shared read-only vector to use."""
+        vector = np.array(embedding, dtype=np.float32)
+        vector.flags.writeable = False
+        if self.capacity <= 0:
+            return vector
+        with self._lock:
+            self._entries[(model, query)] = (vector, self._clock())
+            self._entries.move_to_end((model, query))
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return vector
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    # ── Persistence ──
+
+    def save(self) -> int:
+        """Write the unexpired entries to path (atomically); returns how many were saved."""
+        if self.path is None:
+            return 0
+        now = self._clock()
+        with self._lock:
+            entries = [(k, v, s) for k, (v, s) in self._entries.items() if not self._expired(s, now)]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # A temp file of our own: pre-forked workers all save at shutdown, and must not write into one file
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    models=np.array([k[0] for k, _, _ in entries], dtype=str),
+                    queries=np.array([k[1] for k, _, _ in entries], dtype=str),
+                    dims=np.array([len(v) for _, v, _ in entries], dtype=np.int64),
+                    vectors=np.concatenate([v for _, v, _ in entries]) if entries else np.empty(0, dtype=np.float32),
+                    stamps=np.array([s for _, _, s in entries], dtype=np.float64),
+                )
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return len(entries)
+
+    def _load(self) -> None:
+        with np.load(self.path, allow_pickle=False) as data:
+            models, queries, dims, vectors, stamps = (
+                data["models"], data["queries"], data["dims"], data["vectors"], data["stamps"],
+            )
+        now = self._clock()
+        offsets = np.concatenate([[0], np.cumsum(dims)])
+        # Oldest first, so the LRU order (and which entries fit) follows insertion time
+        for i in np.argsort(stamps, kind="stable")[-self.capacity:] if self.capacity > 0 else []:
+            if self._expired(stamps[i], now):
+                continue
+            vector = vectors[offsets[i]:offsets[i + 1]].astype(np.float32)
+            vector.flags.writeable = False
+            self._entries[(str(models[i]), str(queries[i]))] = (vector, float(stamps[i]))
+        logger.info("embed_cache.loaded", extra={"path": str(self.path), "entries": len(self._entries)})
+
+    def close(self) -> None:
+        if self.path is not None:
+            saved = self.save()
+            logger.info("embed_cache.saved", extra={"path": str(self.path), "entries": saved})
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache.from_settings()
+    return _cache
+
+
+def close_embedding_cache() -> None:
+    """Persist (with EMBED_CACHE_PATH set) and drop the shared cache; the next get starts a fresh one."""
+    global _cache
+    with _cache_lock:
+        cache, _cache = _cache, None
+    if cache is not None:
+        cache.close()
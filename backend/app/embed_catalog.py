@@ -0,0 +1,268 @@
+"""Offline catalog embedding: a resumable, parallel job that writes a reusable vector file.
+
+    python -m app.embed_catalog                        # seed catalog → $EMBED_VECTORS_DIR (or ./vectors)
+    python -m app.embed_catalog --input offers.jsonl --out /var/lib/vectors --workers 8
+
+The job streams offers (JSONL of raw offer fields with "id", or the seed
+catalog) in chunks of --chunk. It embeds the chunks in parallel on a process
+pool, each worker loading the model once, and commits them in input order to
+a vector directory:
+
+    meta.json     embedding model id and dimension
+    vectors.f32   float32 rows, appended
+    index.jsonl   ["offer id", "content hash", row] per embedded offer; the last line for an id wins
+
+The content hash is a BLAKE2b of the text that gets embedded
+(seed.offer_embed_text), so a re-run only embeds offers that are new or whose
+embedded fields changed. Each chunk is committed in two steps: the vectors
+are written and fsynced, then its index lines are. A crash therefore loses at
+most the chunks in flight. On the next run any vector rows past the last
+indexed row (and a torn index line) are dropped, and the job resumes where
+it stopped.
+
+With EMBED_VECTORS_DIR set, the store seeds the catalog from the file: offers
+whose text hash is present (for the current model) reuse their row, and only
+the rest are embedded at startup.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.config import get_settings
+from app.embedder import Embedder, build_embedder, get_embedder
+from app.seed import offer_embed_text, raw_offers
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+class VectorFile:
+    """A vector directory (see module docstring), opened for lookups and appends."""
+
+    def __init__(self, directory: str | Path, model_id: str, dim: int, create: bool = True) -> None:
+        self.directory = Path(directory)
+        self.model_id = model_id
+        self.dim = dim
+        meta_path = self.directory / "meta.json"
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            if (meta["model"], meta["dim"]) != (model_id, dim):
+                raise ValueError(f"{self.directory} holds {meta['model']} ({meta['dim']} dims), not {model_id} ({dim} dims)")
+        elif create:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            meta_path.write_text(json.dumps({"model": model_id, "dim": dim}))
+        else:
+            raise FileNotFoundError(meta_path)
+        self.entries: dict[str, tuple[str, int]] = {}
+        self._by_hash: Optional[dict[str, int]] = None
+        self._vectors: Optional[np.memmap] = None
+        self._recover()
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dim * 4
+
+    def _recover(self) -> None:
+        """Load the index, then cut vectors.f32 back to the rows it references (see module docstring)."""
+        index, vectors = self.directory / "index.jsonl", self.directory / "vectors.f32"
+        rows = 0
+        if index.exists():
+            with open(index, "rb") as f:
+                good = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn tail from a crash mid-commit
+                    offer_id, digest, row = json.loads(line)
+                    self.entries[offer_id] = (digest, row)
+                    rows = max(rows, row + 1)
+                    good += len(line)
+            if good != index.stat().st_size:
+                os.truncate(index, good)
+        if vectors.exists() and vectors.stat().st_size != rows * self._row_bytes:
+            os.truncate(vectors, rows * self._row_bytes)
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def current(self, offer_id: str, digest: str) -> bool:
+        """Whether offer_id is stored with this content hash."""
+        entry = self.entries.get(offer_id)
+        return entry is not None and entry[0] == digest
+
+    def vectors(self) -> np.ndarray:
+        """All rows (rows × dim), memory-mapped read-only."""
+        if self._vectors is None or len(self._vectors) != self.rows:
+            self._vectors = (np.memmap(self.directory / "vectors.f32", dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+                             if self.rows else np.empty((0, self.dim), dtype=np.float32))
+        return self._vectors
+
+    def append(self, offer_ids: list[str], digests: list[str], vectors: np.ndarray) -> None:
+        """Commit one chunk: vectors (fsynced), then their index lines (fsynced)."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(offer_ids), self.dim)
+        with open(self.directory / "vectors.f32", "ab") as f:
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        lines = []
+        for i, (offer_id, digest) in enumerate(zip(offer_ids, digests)):
+            self.entries[offer_id] = (digest, self.rows + i)
+            lines.append(json.dumps([offer_id, digest, self.rows + i]))
+        with open(self.directory / "index.jsonl", "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.rows += len(offer_ids)
+        self._by_hash = None
+
+    def embed_many(self, texts: list[str], fallback: Callable[[list[str]], np.ndarray]) -> np.ndarray:
+        """Stored vectors for texts whose hash is present; fallback embeds the others (one call)."""
+        if self._by_hash is None:
+            self._by_hash = {digest: row for digest, row in self.entries.values()}
+        rows = np.array([self._by_hash.get(content_hash(t), -1) for t in texts], dtype=np.int64)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        found = rows >= 0
+        out[found] = self.vectors()[rows[found]]
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            out[missing] = fallback([texts[i] for i in missing])
+        logger.info("embed_catalog.reused", extra={"reused": int(found.sum()), "embedded": len(missing)})
+        return out
+
+
+def offer_embedder() -> Callable[[list[str]], np.ndarray]:
+    """embed_many for catalog offers: from EMBED_VECTORS_DIR when it holds the current model's vectors."""
+    embedder = get_embedder()
+    directory = get_settings().EMBED_VECTORS_DIR
+    if directory:
+        embedder.load()  # resolves a load fallback before the model id is compared
+        try:
+            vector_file = VectorFile(directory, embedder.model_id, embedder.dim, create=False)
+            return lambda texts: vector_file.embed_many(texts, embedder.embed_many)
+        except (OSError, ValueError) as e:
+            logger.warning("embed_catalog.unusable", extra={"dir": directory, "error": str(e)})
+    return embedder.embed_many
+
+
+# ── The job ──
+
+_worker_embedder: Optional[Embedder] = None
+
+
+def _init_worker() -> None:
+    global _worker_embedder
+    _worker_embedder = build_embedder(batching=False)
+    _worker_embedder.load()
+
+
+def _encode(texts: list[str], batch: int) -> np.ndarray:
+    """One chunk, in forward passes of at most batch texts."""
+    embedder = _worker_embedder
+    return np.concatenate([embedder.encode(texts[i:i + batch]) for i in range(0, len(texts), batch)])
+
+
+def read_offers(path: str | Path) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _chunks(offers: Iterable[Mapping], size: int) -> Iterator[list[Mapping]]:
+    it = iter(offers)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def run(
+    offers: Iterable[Mapping], directory: str | Path, workers: int = 0, chunk: int = 1024, batch: int = 32,
+) -> dict:
+    """Embed offers that are new or changed into directory; returns counts and timing.
+
+    workers <= 1 embeds in this process.
+    """
+    t0 = time.perf_counter()
+    model = build_embedder(batching=False)
+    vector_file = VectorFile(directory, model.model_id, model.dim)
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+    else:
+        _init_worker()
+
+    def submit(texts: list[str]) -> Future:
+        if pool is not None:
+            return pool.submit(_encode, texts, batch)
+        future: Future = Future()
+        future.set_result(_encode(texts, batch))
+        return future
+
+    counts = {"offers": 0, "embedded": 0, "skipped": 0}
+    pending: deque[tuple[list[str], list[str], Future]] = deque()
+    try:
+        for part in _chunks(offers, chunk):
+            ids, digests, texts = [], [], []
+            for raw in part:
+                text = offer_embed_text(raw)
+                digest = content_hash(text)
+                if not vector_file.current(raw["id"], digest):
+                    ids.append(raw["id"])
+                    digests.append(digest)
+                    texts.append(text)
+            counts["offers"] += len(part)
+            counts["skipped"] += len(part) - len(ids)
+            if ids:
+                pending.append((ids, digests, submit(texts)))
+            # Bounded read-ahead; chunks commit in input order
+            while pending and (len(pending) > 2 * max(workers, 1) or pending[0][2].done()):
+                ids, digests, future = pending.popleft()
+                vector_file.append(ids, digests, future.result())
+                counts["embedded"] += len(ids)
+        while pending:
+            ids, digests, future = pending.popleft()
+            vector_file.append(ids, digests, future.result())
+            counts["embedded"] += len(ids)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    counts.update(model=model.model_id, rows=vector_file.rows, seconds=round(time.perf_counter() - t0, 2))
+    return counts
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Embed the catalog offline into a reusable, resumable vector file.")
+    parser.add_argument("--input", help="JSONL of raw offers with ids (default: the seed catalog)")
+    parser.add_argument("--out", default=settings.EMBED_VECTORS_DIR or "vectors")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=1024)
+    parser.add_argument("--batch", type=int, default=settings.EMBEDDING_BATCH_MAX)
+    args = parser.parse_args()
+
+    offers = read_offers(args.input) if args.input else raw_offers()
+    counts = run(offers, args.out, workers=args.workers, chunk=args.chunk, batch=args.batch)
+    rate = counts["embedded"] / counts["seconds"] if counts["seconds"] else 0.0
+    print(f"{counts['offers']} offers: embedded {counts['embedded']}, unchanged {counts['skipped']} "
+          f"({counts['model']}, {rate:.0f}/s); {args.out} holds {counts['rows']} vector rows")
+
+
+if __name__ == "__main__":
+    main()
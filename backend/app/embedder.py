@@ -0,0 +1,361 @@
+"""Text embedders: the hash fallback, sentence-transformers, and ONNX Runtime on CPU, behind a micro-batcher.
+
+EMBEDDING_MODEL selects the model ("none" = the deterministic hash embedding
+from app/seed.py, which needs no dependencies). EMBEDDING_RUNTIME selects the
+runtime for a real model:
+
+  torch  sentence-transformers (requirements-full.txt).
+  onnx   ONNX Runtime, CPU execution provider, from a model exported to
+         EMBEDDING_ONNX_DIR (model.onnx + tokenizer.json), e.g. with
+         `optimum-cli export onnx --model BAAI/bge-small-en-v1.5 <dir>`.
+         With EMBEDDING_ONNX_INT8, the weights are quantized to int8 once
+         (model.int8.onnx, written next to the export) and that file is served.
+         EMBEDDING_POOLING picks CLS (bge) or mean pooling.
+
+Real models load lazily on first use; app startup calls warmup(), which
+loads the model and runs one forward pass so the first request doesn't pay
+for it. A model that fails to load (missing package, files or a dimension
+other than EMBEDDING_DIM) is logged and replaced by the hash embedding.
+Because offers are embedded through the same embedder when the catalog is
+seeded, queries and offers always share one vector space.
+
+Encoding runs on EMBEDDING_WORKERS dedicated threads (the torch / ONNX
+intra-op pool is sized by EMBEDDING_THREADS). Calls from request threads are
+queued. Each worker takes the first waiting text, keeps collecting for up to
+EMBEDDING_BATCH_WINDOW_MS or until it has EMBEDDING_BATCH_MAX texts, and
+encodes them all in one forward pass. So concurrent queries share a batch
+instead of queueing behind each other's batch-of-one passes. The default
+window of 0 takes only what is already queued. That costs a lone query
+nothing, and under load the queries that arrive during one forward pass
+become the next batch. A positive window forms larger batches and adds up
+to that much latency. `python -m benchmarks.embedder` reports throughput and
+p95 for batch sizes 1–64.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.config import get_settings
+from app.index.vector import normalize_rows
+from app.seed import _deterministic_embedding
+
+logger = logging.getLogger(__name__)
+
+RUNTIMES = ("torch", "onnx")
+
+
+class Embedder:
+    """Encodes texts to unit-length float32 vectors; subclasses implement encode()."""
+
+    model_id = "hash"
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+
+    def load(self) -> None:
+        """Load model weights (no-op for the hash embedding)."""
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """One batch: len(texts) × dim."""
+        raise NotImplementedError
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.encode([text])[0]
+
+    def embed_many(self, texts: Iterable[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return self.encode(texts)
+
+    def warmup(self) -> None:
+        self.load()
+        self.encode(["warmup"])
+
+    def stats(self) -> dict:
+        return {"model": self.model_id}
+
+    def close(self) -> None:
+        pass
+
+
+class HashEmbedder(Embedder):
+    """The deterministic SHA-256-seeded pseudo-embedding (no model)."""
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return np.array([_deterministic_embedding(t, self.dim) for t in texts], dtype=np.float32).reshape(len(texts), self.dim)
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """A sentence-transformers model on CPU."""
+
+    def __init__(self, model: str, dim: int, threads: int = 0) -> None:
+        super().__init__(dim)
+        self.model_id = model
+        self.threads = threads
+        self._model = None
+
+    def load(self) -> None:
+        if self._model is not None:
+            return
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads > 0:
+            torch.set_num_threads(self.threads)
+        model = SentenceTransformer(self.model_id, device="cpu")
+        if model.get_sentence_embedding_dimension() != self.dim:
+            raise ValueError(f"{self.model_id} embeds to {model.get_sentence_embedding_dimension()} dims, EMBEDDING_DIM is {self.dim}")
+        self._model = model
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        self.load()
+        return self._model.encode(
+            texts, batch_size=len(texts), convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False,
+        ).astype(np.float32, copy=False)
+
+
+class OnnxEmbedder(Embedder):
+    """A transformer encoder exported to ONNX, served by ONNX Runtime's CPU provider (optionally int8)."""
+
+    def __init__(
+        self, model: str, dim: int, directory: str, int8: bool = True, pooling: str = "cls", threads: int = 0,
+        max_length: int = 512,
+    ) -> None:
+        super().__init__(dim)
+        if pooling not in ("cls", "mean"):
+            raise ValueError(f"EMBEDDING_POOLING must be 'cls' or 'mean', got {pooling!r}")
+        self.model_id = f"{model}:onnx{'-int8' if int8 else ''}:{pooling}"
+        self.directory = Path(directory)
+        self.int8 = int8
+        self.pooling = pooling
+        self.threads = threads
+        self.max_length = max_length
+        self._session = None
+        self._tokenizer = None
+        self._inputs: set[str] = set()
+
+    def _model_path(self) -> Path:
+        exported = self.directory / "model.onnx"
+        if not self.int8:
+            return exported
+        quantized = self.directory / "model.int8.onnx"
+        if not quantized.exists():
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            t0 = time.perf_counter()
+            tmp = quantized.with_name(quantized.name + ".tmp")
+            quantize_dynamic(str(exported), str(tmp), weight_type=QuantType.QInt8)
+            os.replace(tmp, quantized)
+            logger.info("embedder.quantized", extra={"path": str(quantized), "ms": round((time.perf_counter() - t0) * 1000)})
+        return quantized
+
+    def load(self) -> None:
+        if self._session is not None:
+            return
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        tokenizer = Tokenizer.from_file(str(self.directory / "tokenizer.json"))
+        tokenizer.enable_padding()
+        tokenizer.enable_truncation(self.max_length)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+        session = ort.InferenceSession(str(self._model_path()), options, providers=["CPUExecutionProvider"])
+        self._tokenizer, self._inputs = tokenizer, {i.name for i in session.get_inputs()}
+        self._session = session
+        if self.encode(["dimension check"]).shape[1] != self.dim:
+            self._session = None
+            raise ValueError(f"{self.directory} embeds to a dimension other than EMBEDDING_DIM={self.dim}")
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        self.load()
+        encodings = self._tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feed["token_type_ids"] = np.zeros_like(ids)
+        hidden = self._session.run(None, feed)[0]  # last_hidden_state: batch × tokens × dim
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        else:
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        return normalize_rows(np.ascontiguousarray(pooled, dtype=np.float32))
+
+
+class BatchingEmbedder(Embedder):
+    """Micro-batches concurrent embed() calls into single forward passes on dedicated threads."""
+
+    def __init__(self, inner: Embedder, max_batch: int = 32, window_ms: float = 0.0, workers: int = 1) -> None:
+        super().__init__(inner.dim)
+        self.inner = inner
+        self.max_batch = max(1, max_batch)
+        self.window_s = window_ms / 1000
+        self.workers = max(1, workers)
+        self._queue: queue.SimpleQueue[Optional[tuple[str, Future]]] = queue.SimpleQueue()
+        self._threads: list[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.batches = 0
+        self.items = 0
+        self.max_seen = 0
+
+    @property
+    def model_id(self) -> str:
+        return self.inner.model_id
+
+    def load(self) -> None:
+        """Load the model; on failure fall back to the hash embedding (see module docstring)."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            t0 = time.perf_counter()
+            try:
+                self.inner.load()
+                logger.info("embedder.loaded", extra={"model": self.model_id, "ms": round((time.perf_counter() - t0) * 1000)})
+            except (ImportError, OSError, ValueError, RuntimeError) as e:
+                logger.error("embedder.load_failed", extra={"model": self.model_id, "error": str(e)})
+                self.inner = HashEmbedder(self.dim)
+            self._loaded = True
+
+    def _start(self) -> None:
+        """Start this process's workers (again after a fork, which doesn't copy threads)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.SimpleQueue()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"embedder-{i}", daemon=True) for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Queue every text and wait; the workers cut them into batches of at most EMBEDDING_BATCH_MAX."""
+        self.load()
+        self._start()
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return np.stack([f.result() for f in futures]) if futures else np.empty((0, self.dim), dtype=np.float32)
+
+    def _run(self) -> None:
+        q = self._queue
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.window_s
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - time.perf_counter()
+                    item = q.get(timeout=remaining) if remaining > 0 else q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    q.put(None)  # let the other workers see it too, after this batch
+                    break
+                batch.append(item)
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch: list[tuple[str, Future]]) -> None:
+        texts = list(dict.fromkeys(text for text, _ in batch))  # identical concurrent queries share a row
+        try:
+            vectors = self.inner.encode(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        row = {text: i for i, text in enumerate(texts)}
+        for text, future in batch:
+            future.set_result(vectors[row[text]])
+        self.batches += 1
+        self.items += len(batch)
+        self.max_seen = max(self.max_seen, len(batch))
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_id,
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "meanBatch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "maxBatch": self.max_seen,
+        }
+
+    def close(self) -> None:
+        if self._pid == os.getpid():
+            for _ in self._threads:
+                self._queue.put(None)
+            for thread in self._threads:
+                thread.join()
+        self._threads, self._pid = [], None
+
+
+def build_embedder(batching: bool = True) -> Embedder:
+    """The embedder the settings describe (unloaded); batching=False returns the bare model, without
+    the micro-batcher's threads and load fallback (offline jobs that encode whole chunks themselves)."""
+    settings = get_settings()
+    if settings.EMBEDDING_MODEL.lower() == "none":
+        return HashEmbedder(settings.EMBEDDING_DIM)
+    if settings.EMBEDDING_RUNTIME not in RUNTIMES:
+        raise ValueError(f"EMBEDDING_RUNTIME must be one of {RUNTIMES}, got {settings.EMBEDDING_RUNTIME!r}")
+    if settings.EMBEDDING_RUNTIME == "onnx":
+        inner: Embedder = OnnxEmbedder(
+            settings.EMBEDDING_MODEL, settings.EMBEDDING_DIM, settings.EMBEDDING_ONNX_DIR,
+            int8=settings.EMBEDDING_ONNX_INT8, pooling=settings.EMBEDDING_POOLING, threads=settings.EMBEDDING_THREADS,
+        )
+    else:
+        inner = SentenceTransformerEmbedder(settings.EMBEDDING_MODEL, settings.EMBEDDING_DIM, settings.EMBEDDING_THREADS)
+    if not batching:
+        return inner
+    return BatchingEmbedder(
+        inner, settings.EMBEDDING_BATCH_MAX, settings.EMBEDDING_BATCH_WINDOW_MS, settings.EMBEDDING_WORKERS,
+    )
+
+
+_embedder: Optional[Embedder] = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> Embedder:
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _embedder = build_embedder()
+    return _embedder
+
+
+def close_embedder() -> None:
+    """Stop the shared embedder's workers; the next get_embedder() builds a fresh one."""
+    global _embedder
+    with _embedder_lock:
+        embedder, _embedder = _embedder, None
+    if embedder is not None:
+        embedder.close()
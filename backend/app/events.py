@@ -0,0 +1,242 @@
+"""Append-only event log: feedback and per-search events, bounded in memory, flushed to disk in batches.
+
+record() is the only call on the request path. It appends a (type, ts, payload)
+tuple to a bounded ring buffer (a deque, so no lock and no serialization) and
+returns. When the buffer is full the oldest unflushed events are dropped and
+counted, so a stalled disk costs events, never memory.
+
+With EVENT_LOG_DIR set, a background thread drains the buffer every
+EVENT_LOG_FLUSH_MS (or as soon as half of it fills). It serializes the whole
+batch and commits it with one write() and one flush, plus an fsync when
+EVENT_LOG_FSYNC is set (group commit). Segments are JSONL files named
+events-<created ns>-<pid>.jsonl, so pre-forked workers can share a directory.
+A segment rotates past EVENT_LOG_SEGMENT_BYTES, and the oldest segments
+beyond EVENT_LOG_MAX_SEGMENTS are deleted. Only closed segments are: a writer
+holds an exclusive flock on the segment it has open (released when it
+rotates, closes or dies), and pruning skips any segment it can't lock, so one
+worker never deletes another's active file. Without a directory the buffer
+just keeps the most recent events (recent()).
+
+Offline jobs stream events back with iter_events(directory), which skips a
+torn final line left by a crash mid-write:
+
+    from app.events import iter_events
+    for event in iter_events("/var/lib/discovery/events", types={"search"}):
+        ...
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator, Mapping
+from pathlib import Path
+from typing import Any, Optional, TextIO
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_GLOB = "events-*.jsonl"
+
+
+def segments(directory: str | Path) -> list[Path]:
+    """Segment files in write order (creation time, then pid)."""
+    return sorted(Path(directory).glob(SEGMENT_GLOB))
+
+
+def iter_events(directory: str | Path, types: Optional[Iterable[str]] = None) -> Iterator[dict]:
+    """Stream every event in a log directory, oldest segment first; optionally only some event types."""
+    wanted = set(types) if types is not None else None
+    for path in segments(directory):
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:  # removed by retention while listing
+            continue
+        with f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn tail: a writer crashed (or is mid-commit)
+                event = json.loads(line)
+                if wanted is None or event["type"] in wanted:
+                    yield event
+
+
+def _unlink_if_closed(path: Path) -> bool:
+    """Delete a segment unless a writer still holds it open (its flock); whether it is gone."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return True
+    with f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        path.unlink(missing_ok=True)
+    return True
+
+
+class EventLog:
+    """Bounded ring buffer of events, with an optional background writer to rotating segment files."""
+
+    def __init__(
+        self,
+        directory: str | Path | None = None,
+        capacity: int = 65536,
+        flush_ms: int = 500,
+        segment_bytes: int = 64 << 20,
+        max_segments: int = 64,
+        fsync: bool = False,
+    ) -> None:
+        self.directory = Path(directory) if directory else None
+        self.capacity = capacity
+        self.flush_ms = flush_ms
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.fsync = fsync
+        self._buffer: deque[tuple[str, float, Any]] = deque(maxlen=capacity)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._segment: Optional[TextIO] = None
+        self._segment_path: Optional[Path] = None
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self._writer: Optional[threading.Thread] = None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._writer = threading.Thread(target=self._run, name="event-log", daemon=True)
+            self._writer.start()
+
+    @classmethod
+    def from_settings(cls) -> "EventLog":
+        settings = get_settings()
+        return cls(
+            settings.EVENT_LOG_DIR or None,
+            capacity=settings.EVENT_LOG_CAPACITY,
+            flush_ms=settings.EVENT_LOG_FLUSH_MS,
+            segment_bytes=settings.EVENT_LOG_SEGMENT_BYTES,
+            max_segments=settings.EVENT_LOG_MAX_SEGMENTS,
+            fsync=settings.EVENT_LOG_FSYNC,
+        )
+
+    def record(self, type: str, payload: Mapping[str, Any]) -> None:
+        """Append one event. Never blocks on I/O; the payload is serialized later, so don't mutate it."""
+        buffer = self._buffer
+        if len(buffer) == self.capacity:
+            self.dropped += 1  # deque(maxlen) evicts the oldest
+        buffer.append((type, time.time(), payload))
+        if self._writer is not None and len(buffer) * 2 >= self.capacity:
+            self._wake.set()
+
+    def recent(self) -> list[dict]:
+        """Events still held in memory (all recent events when there is no log directory)."""
+        return [{"type": t, "ts": ts, **payload} for t, ts, payload in list(self._buffer)]
+
+    def flush(self) -> int:
+        """Commit all buffered events to the current segment; returns how many were written."""
+        if self.directory is None:
+            return 0
+        with self._flush_lock:
+            batch = []
+            buffer = self._buffer
+            while True:
+                try:
+                    t, ts, payload = buffer.popleft()
+                except IndexError:
+                    break
+                batch.append(json.dumps({"type": t, "ts": ts, **payload}, separators=(",", ":"), default=str))
+            if not batch:
+                return 0
+            segment = self._open_segment()
+            segment.write("\n".join(batch) + "\n")
+            segment.flush()
+            if self.fsync:
+                os.fsync(segment.fileno())
+            self.written += len(batch)
+            self.flushes += 1
+            if segment.tell() >= self.segment_bytes:
+                self._rotate()
+            return len(batch)
+
+    def _open_segment(self) -> TextIO:
+        if self._segment is None:
+            self._segment_path = self.directory / f"events-{time.time_ns():020d}-{os.getpid()}.jsonl"
+            self._segment = open(self._segment_path, "a", encoding="utf-8")
+            fcntl.flock(self._segment.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)  # marks it active (see _prune)
+            self._prune()
+        return self._segment
+
+    def _rotate(self) -> None:
+        self._segment.close()
+        self._segment = None
+
+    def _prune(self) -> None:
+        if self.max_segments <= 0:
+            return
+        old = [p for p in segments(self.directory) if p != self._segment_path]
+        excess = len(old) + 1 - self.max_segments
+        for path in old:
+            if excess <= 0:
+                break
+            if _unlink_if_closed(path):
+                excess -= 1
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_ms / 1000)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("events.flush_failed", extra={"error": str(e), "buffered": len(self._buffer)})
+
+    def stats(self) -> dict:
+        return {
+            "directory": str(self.directory) if self.directory else None,
+            "buffered": len(self._buffer),
+            "capacity": self.capacity,
+            "dropped": self.dropped,
+            "written": self.written,
+            "flushes": self.flushes,
+        }
+
+    def close(self) -> None:
+        """Stop the writer after a final flush."""
+        if self._writer is not None:
+            self._stop.set()
+            self._wake.set()
+            self._writer.join()
+            self._writer = None
+            self.flush()
+        if self._segment is not None:
+            self._rotate()
+
+
+_event_log: Optional[EventLog] = None
+_event_log_lock = threading.Lock()
+
+
+def get_event_log() -> EventLog:
+    global _event_log
+    if _event_log is None:
+        with _event_log_lock:
+            if _event_log is None:
+                _event_log = EventLog.from_settings()
+    return _event_log
+
+
+def close_event_log() -> None:
+    """Flush and stop the shared log; the next get_event_log() starts a fresh one."""
+    global _event_log
+    with _event_log_lock:
+        log, _event_log = _event_log, None
+    if log is not None:
+        log.close()
@@ -0,0 +1,292 @@
+"""Executor layer for heavy pipeline work: worker pools, per-stage limits, queue metrics.
+
+The pipeline nodes are coroutines on the serving event loop (see
+app/pipeline/orchestrator.py). They await their heavy work through
+Executors.arun(), or call run() / submit() from plain threads, naming a stage
+and an execution kind:
+
+  - "thread":  a bounded ThreadPoolExecutor (EXEC_THREAD_WORKERS), for NumPy /
+               torch calls that release the GIL (CrossEncoder.predict, ...);
+  - "process": a ProcessPoolExecutor (EXEC_PROCESS_WORKERS), for pure-Python
+               scoring the GIL would serialize. Arguments and results are
+               pickled, so only batches large enough to pay for that belong here;
+  - "inline":  the calling thread (stage limit and metrics only).
+
+Each stage has a concurrency limit (EXEC_STAGE_LIMITS, e.g. "rerank=8,retrieve=32";
+unlisted stages are unlimited). Calls over the limit wait in the caller,
+so one stage can't take every worker: run() / submit() block their thread,
+and arun() awaits a future the gate resolves when a permit frees up, so
+waiting coroutines hold no thread at all. stats() reports per stage how many calls
+wait for the limit, how many are admitted, completions, failures and the
+total wait / run time, and per pool the calls in flight and queued behind its
+workers. It is served at GET /v1/metrics.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Mapping
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("thread", "process", "inline")
+
+
+def parse_stage_limits(spec: str) -> dict[str, int]:
+    """"rerank=8, retrieve=32" → {"rerank": 8, "retrieve": 32}."""
+    limits = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        stage, sep, limit = item.partition("=")
+        if not sep or not limit.strip().isdigit() or int(limit) < 1:
+            raise ValueError(f"invalid stage limit {item.strip()!r} (expected stage=N, N >= 1)")
+        limits[stage.strip()] = int(limit)
+    return limits
+
+
+class _Gate:
+    """Counting semaphore whose waiters are futures: threads block on them, coroutines await them."""
+
+    def __init__(self, limit: int) -> None:
+        self._free = limit
+        self._waiters: deque[Future] = deque()
+        self._lock = threading.Lock()
+
+    def acquire_future(self) -> Future:
+        """A future resolved once the caller holds a permit (already done when one is free).
+
+        Cancelling it while it is pending gives up the place in line.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                future.set_running_or_notify_cancel()
+                future.set_result(None)
+            else:
+                self._waiters.append(future)
+        return future
+
+    def acquire(self) -> None:
+        self.acquire_future().result()
+
+    def release(self) -> None:
+        """Hand the permit to the oldest waiter still waiting, or free it."""
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if waiter.set_running_or_notify_cancel():  # False: it was cancelled
+                    break
+            else:
+                self._free += 1
+                return
+        waiter.set_result(None)
+
+
+@dataclass
+class _Stage:
+    limit: Optional[int]
+    gate: Optional[_Gate]
+    waiting: int = 0
+    active: int = 0
+    completed: int = 0
+    failed: int = 0
+    wait_ms: float = 0.0
+    run_ms: float = 0.0
+
+
+@dataclass
+class _Pool:
+    workers: int
+    executor: Optional[Executor] = None
+    inflight: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class Executors:
+    """Worker pools shared by the pipeline stages. Pools start on first use."""
+
+    def __init__(self, thread_workers: int = 0, process_workers: int = 0,
+                 stage_limits: Optional[Mapping[str, int]] = None) -> None:
+        cpus = os.cpu_count() or 1
+        self._pools = {
+            "thread": _Pool(thread_workers or cpus),
+            "process": _Pool(process_workers or cpus),
+        }
+        self._limits = dict(stage_limits or {})
+        self._stages: dict[str, _Stage] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "Executors":
+        settings = get_settings()
+        return cls(settings.EXEC_THREAD_WORKERS, settings.EXEC_PROCESS_WORKERS,
+                   parse_stage_limits(settings.EXEC_STAGE_LIMITS))
+
+    def _stage(self, name: str) -> _Stage:
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                limit = self._limits.get(name)
+                stage = _Stage(limit, _Gate(limit) if limit else None)
+                self._stages[name] = stage
+            return stage
+
+    def _executor(self, kind: str) -> Executor:
+        pool = self._pools[kind]
+        with pool.lock:
+            if pool.executor is None:
+                if kind == "thread":
+                    pool.executor = ThreadPoolExecutor(pool.workers, thread_name_prefix="exec")
+                else:
+                    # spawn: forking a process that runs threads can copy held locks into the child
+                    pool.executor = ProcessPoolExecutor(pool.workers, mp_context=multiprocessing.get_context("spawn"))
+                logger.info("executors.pool_started", extra={"kind": kind, "workers": pool.workers})
+            return pool.executor
+
+    def _admit(self, stage: str, kind: str) -> tuple[_Stage, float]:
+        """Count a call as waiting for its stage; the caller then takes the stage gate."""
+        if kind not in KINDS:
+            raise ValueError(f"unknown executor kind {kind!r} (expected one of {KINDS})")
+        state = self._stage(stage)
+        with self._lock:
+            state.waiting += 1
+        return state, time.perf_counter()
+
+    def _start(self, state: _Stage, t0: float, kind: str, fn: Callable[..., Any], args: tuple) -> Future:
+        """Run an admitted call (gate held) on its kind of worker; the gate is released when it finishes."""
+        t1 = time.perf_counter()
+        with self._lock:
+            state.waiting -= 1
+            state.active += 1
+            state.wait_ms += (t1 - t0) * 1000
+        pool = self._pools.get(kind)
+
+        def done(future: Future) -> None:
+            with self._lock:
+                state.active -= 1
+                state.run_ms += (time.perf_counter() - t1) * 1000
+                if future.cancelled() or future.exception() is not None:
+                    state.failed += 1
+                else:
+                    state.completed += 1
+                if pool is not None:
+                    pool.inflight -= 1
+            if state.gate is not None:
+                state.gate.release()
+
+        if pool is None:
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            with self._lock:
+                pool.inflight += 1
+            try:
+                future = self._executor(kind).submit(fn, *args)
+            except Exception as e:
+                # Pool shut down or broken: account the call as failed and surface the error
+                future = Future()
+                future.set_exception(e)
+        future.add_done_callback(done)
+        return future
+
+    def submit(self, stage: str, kind: str, fn: Callable[..., Any], *args: Any) -> Future:
+        """Run fn(*args) for a stage on the given kind of worker; waits while the stage is at its limit."""
+        state, t0 = self._admit(stage, kind)
+        if state.gate is not None:
+            state.gate.acquire()
+        return self._start(state, t0, kind, fn, args)
+
+    def run(self, stage: str, kind: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """submit() and wait for the result (re-raising fn's exception)."""
+        return self.submit(stage, kind, fn, *args).result()
+
+    async def arun(self, stage: str, kind: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """run() for coroutines: neither the stage limit nor the work blocks the event loop.
+
+        A call over the stage limit awaits the gate's future (no thread waits for it);
+        "inline" calls run on the loop itself, so only cheap work belongs there.
+        """
+        state, t0 = self._admit(stage, kind)
+        if state.gate is not None:
+            acquired = state.gate.acquire_future()
+            if not acquired.done():
+                try:
+                    await asyncio.wrap_future(acquired)
+                except asyncio.CancelledError:
+                    # Leave the line; if the permit was already handed over, give it back
+                    if not acquired.cancel():
+                        acquired.add_done_callback(lambda _: state.gate.release())
+                    with self._lock:
+                        state.waiting -= 1
+                    raise
+        return await asyncio.wrap_future(self._start(state, t0, kind, fn, args))
+
+    def stats(self) -> dict:
+        with self._lock:
+            stages = {
+                name: {
+                    "limit": s.limit,
+                    "waiting": s.waiting,
+                    "active": s.active,
+                    "completed": s.completed,
+                    "failed": s.failed,
+                    "waitMs": round(s.wait_ms, 1),
+                    "runMs": round(s.run_ms, 1),
+                }
+                for name, s in sorted(self._stages.items())
+            }
+            pools = {
+                kind: {
+                    "workers": p.workers,
+                    "started": p.executor is not None,
+                    "inflight": p.inflight,
+                    "queued": max(0, p.inflight - p.workers),
+                }
+                for kind, p in self._pools.items()
+            }
+        return {"stages": stages, "pools": pools}
+
+    def close(self) -> None:
+        """Shut the pools down, waiting for running work."""
+        for pool in self._pools.values():
+            with pool.lock:
+                executor, pool.executor = pool.executor, None
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+
+_executors: Optional[Executors] = None
+_executors_lock = threading.Lock()
+
+
+def get_executors() -> Executors:
+    global _executors
+    with _executors_lock:
+        if _executors is None:
+            _executors = Executors.from_settings()
+        return _executors
+
+
+def shutdown_executors() -> None:
+    """Stop the shared pools; the next get_executors() starts fresh ones."""
+    global _executors
+    with _executors_lock:
+        executors, _executors = _executors, None
+    if executors is not None:
+        executors.close()
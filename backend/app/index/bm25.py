@@ -0,0 +1,402 @@
+"""Inverted BM25 index: CSR postings, cached IDF, MaxScore top-k pruning.
+
+Scores are bit-identical to the reference per-document scorer:
+    idf = ln((n - df + 0.5) / (df + 0.5) + 1)
+    score = Σ_q idf(q) · tf·(k1+1) / (tf + k1·(1 - b + b·dl/avgdl))
+summed in query-token order (repeated query tokens count once per occurrence).
+
+The index is incremental: apply() returns a new version with documents
+appended to per-term delta postings and others tombstoned, with df, the live
+document count and the average length updated. The old version is left intact
+for readers still holding it. IDF and pruning bounds are cached until the
+first update and computed per query term afterwards.
+
+An index can also score as one shard of a larger corpus: with_corpus_stats()
+substitutes corpus-wide document count, average length and document
+frequencies, so every shard scores exactly like the unsplit index would.
+
+mapped() wraps the arrays of a snapshot (app/snapshot.py) as they are,
+including the cached IDF and bounds from derived_arrays().
+"""
+
+from __future__ import annotations
+
+import copy
+import math
+import re
+from collections import Counter
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+
+from app.index.columns import RowFilter
+from app.index.growable import GrowableArray
+
+K1 = 1.5
+B = 0.75
+
+# Relative slack on score upper bounds, so that summing in a different order
+# than the exact scorer can never prune a document that belongs in the top-k.
+_BOUND_SLACK = 1e-9
+
+_EMPTY_IDS = np.empty(0, dtype=np.int64)
+_EMPTY_SCORES = np.empty(0, dtype=np.float64)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase, strip punctuation, split on whitespace."""
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def _tf_norm(tf: np.ndarray, dl: np.ndarray, avg_dl: float) -> np.ndarray:
+    # Same operation order as the reference scorer so float results match exactly.
+    return (tf * (K1 + 1)) / (tf + K1 * (1 - B + B * dl / avg_dl))
+
+
+@dataclass(frozen=True)
+class CorpusStats:
+    """BM25 collection statistics: live documents, their total length, and df of some terms."""
+
+    n_docs: int
+    total_len: int
+    df: Mapping[str, int]
+
+    @classmethod
+    def combine(cls, parts: Iterable["CorpusStats"]) -> "CorpusStats":
+        """Statistics of the union of disjoint document sets."""
+        n_docs = total_len = 0
+        df: Counter = Counter()
+        for part in parts:
+            n_docs += part.n_docs
+            total_len += part.total_len
+            df.update(part.df)
+        return cls(n_docs, total_len, dict(df))
+
+
+class BM25Index:
+    """Term → postings index stored as CSR arrays.
+
+    Postings for term t live in doc_ids[indptr[t]:indptr[t+1]] (ascending doc id)
+    with matching term frequencies in tfs. Document lengths, IDF and per-term
+    score upper bounds are precomputed so a query only touches the postings of
+    its own terms.
+    """
+
+    def __init__(
+        self,
+        vocab: dict[str, int],
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+    ) -> None:
+        self._init_postings(vocab, indptr, doc_ids, tfs, GrowableArray(doc_len.astype(np.float64)), int(doc_len.sum()))
+        self.df = np.diff(indptr)
+        self._idf = np.array(
+            [math.log((self.n_docs - df + 0.5) / (df + 0.5) + 1.0) for df in self.df.tolist()],
+            dtype=np.float64,
+        )
+        self._max_tf, self._min_dl = self._term_extremes()
+        self._upper = self._idf * _tf_norm(self._max_tf, self._min_dl, self.avg_dl)
+        self._init_state()
+
+    def _init_postings(
+        self, vocab: dict[str, int], indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+        doc_len: GrowableArray, total_len: int,
+    ) -> None:
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self._base_terms = len(indptr) - 1
+        # Shared by every version derived via apply(); each sees its first _size docs
+        self._doc_len = doc_len
+        self._size = len(doc_len)
+        self._alive = np.ones(self._size, dtype=bool)
+        self.n_docs = self._size  # live documents
+        self._total_len = total_len
+        # Python int division, matching the reference avg_dl exactly
+        self.avg_dl = self._total_len / max(self.n_docs, 1)
+
+    def _init_state(self) -> None:
+        # Incremental state: postings appended since build, and terms whose cached
+        # postings / IDF no longer match the base arrays
+        self._delta: dict[int, tuple[list[int], list[int]]] = {}
+        self._merged: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+        self._touched: frozenset[int] = frozenset()
+        self._clean = True
+        # Corpus-wide (n_docs, term id → df) when scoring as a shard; see with_corpus_stats
+        self._corpus: Optional[tuple[int, dict[int, int]]] = None
+
+    @classmethod
+    def mapped(cls, vocab: dict[str, int], arrays: Mapping[str, np.ndarray]) -> "BM25Index":
+        """Index over the CSR arrays, float64 doc_len and derived_arrays() of a build, used as-is (no copies)."""
+        self = cls.__new__(cls)
+        self._init_postings(
+            vocab, arrays["indptr"], arrays["doc_ids"], arrays["tfs"],
+            GrowableArray.wrap(arrays["doc_len"]), int(arrays["total_len"]),
+        )
+        self.df = arrays["df"]
+        self._idf = arrays["idf"]
+        self._max_tf, self._min_dl = arrays["max_tf"], arrays["min_dl"]
+        self._upper = arrays["upper"]
+        self._init_state()
+        return self
+
+    def derived_arrays(self) -> dict[str, np.ndarray]:
+        """Document frequencies, IDF, per-term bounds and total length, as mapped() takes them (unmodified index)."""
+        return {
+            "df": self.df,
+            "idf": self._idf,
+            "max_tf": self._max_tf,
+            "min_dl": self._min_dl,
+            "upper": self._upper,
+            "total_len": np.array(self._total_len, dtype=np.int64),
+        }
+
+    @classmethod
+    def build(cls, docs: Iterable[list[str]]) -> "BM25Index":
+        """Build the index from pre-tokenized documents (row i = document i)."""
+        vocab: dict[str, int] = {}
+        term_col: list[int] = []
+        doc_col: list[int] = []
+        tf_col: list[int] = []
+        lengths: list[int] = []
+        for doc_id, tokens in enumerate(docs):
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_col.append(vocab.setdefault(term, len(vocab)))
+                doc_col.append(doc_id)
+                tf_col.append(tf)
+
+        terms = np.array(term_col, dtype=np.int64)
+        # Stable sort keeps doc ids ascending within each postings list
+        order = np.argsort(terms, kind="stable")
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=indptr[1:])
+        return cls(
+            vocab=vocab,
+            indptr=indptr,
+            doc_ids=np.array(doc_col, dtype=np.int32)[order],
+            tfs=np.array(tf_col, dtype=np.int32)[order],
+            doc_len=np.array(lengths, dtype=np.int32),
+        )
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    @property
+    def doc_len(self) -> np.ndarray:
+        return self._doc_len.view[:self._size]
+
+    @property
+    def size(self) -> int:
+        """Doc id space, including tombstoned documents."""
+        return self._size
+
+    def _term_extremes(self) -> tuple[np.ndarray, np.ndarray]:
+        """Per-term max tf and min doc length: tf_norm grows with tf and shrinks with dl."""
+        if not len(self.doc_ids):
+            n_terms = self._base_terms
+            return np.zeros(n_terms), np.full(n_terms, np.inf)
+        starts = self.indptr[:-1]
+        max_tf = np.maximum.reduceat(self.tfs, starts).astype(np.float64)
+        min_dl = np.minimum.reduceat(self.doc_len[self.doc_ids], starts)
+        return max_tf, min_dl
+
+    # ── Incremental maintenance ──
+
+    def apply(
+        self, added: Iterable[list[str]] = (), removed: Iterable[tuple[int, list[str]]] = (),
+    ) -> "BM25Index":
+        """New version with documents added (ids continue from size) and removed.
+
+        removed holds (doc id, tokens it was indexed with). This version is not
+        modified; only the latest version may be extended.
+        """
+        if len(self._doc_len) != self._size:
+            raise RuntimeError("BM25Index.apply on a superseded version")
+        new = copy.copy(self)
+        docs_counts = [(Counter(tokens), len(tokens)) for tokens in added]
+        for counts, _ in docs_counts:
+            for term in counts:
+                if term not in new.vocab:
+                    if new.vocab is self.vocab:
+                        new.vocab = dict(self.vocab)
+                    new.vocab[term] = len(new.vocab)
+        grow = len(new.vocab) - len(self.df)
+        new.df = np.concatenate([self.df, np.zeros(grow, dtype=self.df.dtype)])
+        new._max_tf = np.concatenate([self._max_tf, np.zeros(grow)])
+        new._min_dl = np.concatenate([self._min_dl, np.full(grow, np.inf)])
+        new._delta = dict(self._delta)
+        touched: set[int] = set()
+        for counts, length in docs_counts:
+            doc = new._doc_len.append([length])
+            for term, tf in counts.items():
+                t = new.vocab[term]
+                docs, tfs = new._delta.get(t, ((), ()))
+                new._delta[t] = ([*docs, doc], [*tfs, tf])
+                new.df[t] += 1
+                new._max_tf[t] = max(new._max_tf[t], tf)
+                new._min_dl[t] = min(new._min_dl[t], length)
+                touched.add(t)
+            new.n_docs += 1
+            new._total_len += length
+        new._size = len(new._doc_len)
+        new._alive = np.ones(new._size, dtype=bool)
+        new._alive[:self._size] = self._alive
+        for doc, tokens in removed:
+            if not new._alive[doc]:
+                continue
+            new._alive[doc] = False
+            for term in set(tokens):
+                t = new.vocab[term]
+                new.df[t] -= 1
+                touched.add(t)
+            new.n_docs -= 1
+            new._total_len -= len(tokens)
+        new.avg_dl = new._total_len / max(new.n_docs, 1)
+        # dict() copies atomically, so readers filling this version's cache are safe
+        new._merged = dict(self._merged)
+        for t in touched:
+            new._merged.pop(t, None)
+        new._touched = self._touched | touched
+        new._clean = self._clean and new._size == self._size and new.n_docs == self.n_docs
+        return new
+
+    def corpus_stats(self, tokens: Iterable[str]) -> CorpusStats:
+        """This index's statistics for the given terms (terms outside the vocabulary are omitted)."""
+        df = {t: int(self.df[self.vocab[t]]) for t in set(tokens) if t in self.vocab}
+        return CorpusStats(self.n_docs, self._total_len, df)
+
+    def with_corpus_stats(self, stats: CorpusStats) -> "BM25Index":
+        """Read-only view scoring this index's documents with corpus-wide statistics.
+
+        stats.df must cover the query terms. Used when the corpus is split
+        across shards: scores then equal those of a single index over all of it.
+        """
+        view = copy.copy(self)
+        view.avg_dl = stats.total_len / max(stats.n_docs, 1)
+        view._corpus = (stats.n_docs, {self.vocab[t]: df for t, df in stats.df.items() if t in self.vocab})
+        view._clean = False
+        return view
+
+    def _term_idf(self, term: int) -> float:
+        if self._clean:
+            return self._idf[term]
+        if self._corpus is not None:
+            n_docs, df = self._corpus[0], self._corpus[1][term]
+        else:
+            n_docs, df = self.n_docs, int(self.df[term])
+        return math.log((n_docs - df + 0.5) / (df + 0.5) + 1.0)
+
+    def _term_upper(self, term: int) -> float:
+        if self._clean:
+            return float(self._upper[term])
+        return float(self._term_idf(term) * _tf_norm(self._max_tf[term], self._min_dl[term], self.avg_dl))
+
+    def _postings(self, term: int) -> tuple[np.ndarray, np.ndarray]:
+        """Live postings (ascending doc id): base CSR slice + appended delta, minus tombstones."""
+        if term not in self._touched:
+            lo, hi = self.indptr[term], self.indptr[term + 1]
+            return self.doc_ids[lo:hi], self.tfs[lo:hi]
+        cached = self._merged.get(term)
+        if cached is None:
+            if term < self._base_terms:
+                lo, hi = self.indptr[term], self.indptr[term + 1]
+                docs, tfs = self.doc_ids[lo:hi], self.tfs[lo:hi]
+            else:
+                docs, tfs = self.doc_ids[:0], self.tfs[:0]
+            extra = self._delta.get(term)
+            if extra:
+                docs = np.concatenate([docs, np.array(extra[0], dtype=docs.dtype)])
+                tfs = np.concatenate([tfs, np.array(extra[1], dtype=tfs.dtype)])
+            if self.n_docs < self.size:
+                keep = self._alive[docs]
+                docs, tfs = docs[keep], tfs[keep]
+            cached = self._merged[term] = (docs, tfs)
+        return cached
+
+    def _eligible_postings(self, term: int, where: RowFilter) -> tuple[np.ndarray, np.ndarray]:
+        """Postings restricted to the window (a contiguous sub-range, since doc ids ascend) and mask."""
+        all_docs, all_tfs = self._postings(term)
+        lo, hi = np.searchsorted(all_docs, [where.lo, where.hi])
+        docs, tfs = all_docs[lo:hi], all_tfs[lo:hi]
+        if where.mask is not None:
+            keep = where.mask[docs - where.lo]
+            docs, tfs = docs[keep], tfs[keep]
+        if where.tail_mask is not None:
+            start = np.searchsorted(all_docs, where.tail_lo)
+            tail_docs, tail_tfs = all_docs[start:], all_tfs[start:]
+            keep = where.tail_mask[tail_docs - where.tail_lo]
+            docs = np.concatenate([docs, tail_docs[keep]])
+            tfs = np.concatenate([tfs, tail_tfs[keep]])
+        return docs, tfs
+
+    def _impacts(self, term: int, docs: np.ndarray, tfs: np.ndarray) -> np.ndarray:
+        tf_norm = _tf_norm(tfs.astype(np.float64), self.doc_len[docs], self.avg_dl)
+        return self._term_idf(term) * tf_norm
+
+    def search(
+        self, tokens: list[str], top_k: int, where: Optional[RowFilter] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k (doc ids, scores) with score > 0, ordered by score desc then doc id.
+
+        MaxScore: terms are visited by descending upper bound. Once the k-th best
+        partial score exceeds the summed bounds of the unvisited terms, no unseen
+        document can enter the top-k, so the remaining postings are only probed
+        for surviving candidates. With where, only eligible postings become
+        candidates, so the top-k is taken over eligible documents.
+        """
+        term_ids = [self.vocab.get(t) for t in tokens]
+        mult = Counter(t for t in term_ids if t is not None)
+        if not mult or top_k <= 0:
+            return _EMPTY_IDS, _EMPTY_SCORES
+
+        upper = {t: self._term_upper(t) for t in mult}
+        terms = sorted(mult, key=lambda t: upper[t] * mult[t], reverse=True)
+        bounds = [upper[t] * mult[t] for t in terms]
+        remaining = [0.0] * (len(terms) + 1)
+        for j in range(len(terms) - 1, -1, -1):
+            remaining[j] = remaining[j + 1] + bounds[j]
+
+        cand = _EMPTY_IDS
+        partial = _EMPTY_SCORES
+        visited = 0
+        for term in terms:
+            if len(cand) >= top_k:
+                theta = np.partition(partial, len(partial) - top_k)[len(partial) - top_k]
+                if remaining[visited] * (1 + _BOUND_SLACK) < theta:
+                    break
+            docs, tfs = self._postings(term) if where is None else self._eligible_postings(term, where)
+            contrib = self._impacts(term, docs, tfs) * mult[term]
+            cand, inverse = np.unique(np.concatenate([cand, docs]), return_inverse=True)
+            partial = np.bincount(inverse, weights=np.concatenate([partial, contrib]), minlength=len(cand))
+            visited += 1
+
+        # Drop candidates whose best case still falls short of the k-th partial score
+        if len(cand) > top_k:
+            theta = np.partition(partial, len(partial) - top_k)[len(partial) - top_k]
+            keep = (partial + remaining[visited]) * (1 + _BOUND_SLACK) >= theta
+            cand = cand[keep]
+
+        scores = self._score_exact(cand, term_ids)
+        order = np.lexsort((cand, -scores))[:top_k]
+        return cand[order], scores[order]
+
+    def _score_exact(self, cand: np.ndarray, term_ids: list) -> np.ndarray:
+        """Exact BM25 for candidate docs, accumulated in query-token order."""
+        scores = np.zeros(len(cand), dtype=np.float64)
+        for term in term_ids:
+            if term is None:
+                continue
+            docs, tfs = self._postings(term)
+            if not len(docs):
+                continue
+            pos = np.minimum(np.searchsorted(docs, cand), len(docs) - 1)
+            hit = docs[pos] == cand
+            if hit.any():
+                scores[hit] += self._impacts(term, docs[pos[hit]], tfs[pos[hit]])
+        return scores
@@ -0,0 +1,402 @@
+"""Columnar offer attributes with vectorized constraint filtering.
+
+Category and merchant are dictionary-encoded; prices and monthly payments are
+int32 cents. Category and zero-APR predicates are precomputed bitmaps, and
+price / monthly ranges are answered from sorted indexes, so a full constraint
+set resolves to a single boolean row mask.
+
+Rows can be appended and tombstoned after build via apply(), which returns a
+new version and leaves the old one untouched (readers may still hold it).
+Bitmaps and sorted indexes cover the rows present at build time; appended
+(tail) rows are compared directly, which stays cheap because the store
+compacts once the tail grows.
+
+mapped() wraps arrays written by a snapshot (app/snapshot.py) as they are,
+with the bitmaps and sorted indexes read from derived_arrays() instead of
+being recomputed.
+"""
+
+from __future__ import annotations
+
+import copy
+import math
+from dataclasses import dataclass
+from collections.abc import Mapping
+from typing import Iterable, Optional
+
+import numpy as np
+
+from app.index.growable import GrowableArray
+
+
+def to_cents(amount: float) -> int:
+    """Dollar amount → integer cents (rounded, so 54.13 → 5413)."""
+    return int(round(amount * 100))
+
+
+def cents_ceiling(max_amount: float) -> int:
+    """Largest cents value c with c/100 <= max_amount."""
+    return math.floor(round(max_amount * 100, 6))
+
+
+# Largest whole-dollar amount an int32 cents column holds
+MAX_AMOUNT = np.iinfo(np.int32).max // 100
+
+
+def column_bound(column: np.ndarray, bound: int) -> np.generic:
+    """bound as a scalar of an integer column's dtype, clamped to its range (past the max, every row is <= it)."""
+    info = np.iinfo(column.dtype)
+    return column.dtype.type(min(max(bound, info.min), info.max))
+
+
+@dataclass(frozen=True)
+class RowFilter:
+    """Eligible rows for a filtered search: the window [lo, hi) narrowed by an optional mask.
+
+    When rows are clustered by category, a category constraint becomes the window
+    and indexes scan only that partition; mask covers the remaining predicates
+    (mask[i] refers to row lo + i). Rows appended after build are covered by
+    tail_mask (tail_mask[i] refers to row tail_lo + i).
+    """
+
+    lo: int
+    hi: int
+    mask: Optional[np.ndarray] = None
+    tail_lo: int = 0
+    tail_mask: Optional[np.ndarray] = None
+
+    @property
+    def window_count(self) -> int:
+        return self.hi - self.lo if self.mask is None else int(self.mask.sum())
+
+    @property
+    def count(self) -> int:
+        tail = int(self.tail_mask.sum()) if self.tail_mask is not None else 0
+        return self.window_count + tail
+
+    def window(self) -> "RowFilter":
+        """The filter without its tail rows (what indexes over build-time rows see)."""
+        return RowFilter(self.lo, self.hi, self.mask)
+
+    def allows(self, rows: np.ndarray) -> np.ndarray:
+        """Vectorized membership test for arbitrary row ids."""
+        inside = (rows >= self.lo) & (rows < self.hi)
+        if self.mask is None and self.tail_mask is None:
+            return inside
+        out = inside if self.mask is None else np.zeros(len(rows), dtype=bool)
+        if self.mask is not None:
+            out[inside] = self.mask[rows[inside] - self.lo]
+        if self.tail_mask is not None:
+            tail = (rows >= self.tail_lo) & (rows < self.tail_lo + len(self.tail_mask))
+            out[tail] = self.tail_mask[rows[tail] - self.tail_lo]
+        return out
+
+    def rows(self) -> np.ndarray:
+        rows = np.arange(self.lo, self.hi) if self.mask is None else self.lo + np.flatnonzero(self.mask)
+        if self.tail_mask is not None:
+            rows = np.concatenate([rows, self.tail_lo + np.flatnonzero(self.tail_mask)])
+        return rows
+
+
+class _SortedRange:
+    """Sorted index over an integer column for `value <= bound` lookups."""
+
+    # Scattering rows from the sorted index beats a full-column compare only when
+    # few rows fall on one side of the cut (random writes vs a sequential scan).
+    SCATTER_FRACTION = 1 / 16
+
+    def __init__(self, values: np.ndarray, order: Optional[np.ndarray] = None, sorted: Optional[np.ndarray] = None) -> None:
+        self.values = values
+        self.order = np.argsort(values, kind="stable") if order is None else order
+        self.sorted = values[self.order] if sorted is None else sorted
+
+    def at_most(self, bound: int) -> np.ndarray:
+        n = len(self.values)
+        # Bound in the column dtype; a Python int would make searchsorted cast the whole column
+        bound = column_bound(self.values, bound)
+        cut = int(np.searchsorted(self.sorted, bound, side="right"))
+        limit = int(n * self.SCATTER_FRACTION)
+        if cut <= limit:
+            mask = np.zeros(n, dtype=bool)
+            mask[self.order[:cut]] = True
+        elif n - cut <= limit:
+            mask = np.ones(n, dtype=bool)
+            mask[self.order[cut:]] = False
+        else:
+            mask = self.values <= bound
+        return mask
+
+
+COLUMNS = ("category_code", "merchant_code", "price_cents", "monthly_cents", "apr", "term_months")
+
+
+class OfferColumns:
+    """Offer attributes as NumPy columns, row-aligned with the store's offers."""
+
+    def __init__(
+        self,
+        categories: list[str],
+        category_code: np.ndarray,
+        merchants: list[str],
+        merchant_code: np.ndarray,
+        price_cents: np.ndarray,
+        monthly_cents: np.ndarray,
+        apr: np.ndarray,
+        term_months: np.ndarray,
+    ) -> None:
+        columns = (category_code, merchant_code, price_cents, monthly_cents, apr, term_months)
+        self._init_columns(categories, merchants, dict(zip(COLUMNS, map(GrowableArray, columns))))
+
+        # Bitmaps for the common predicates
+        self.category_masks = [category_code == i for i in range(len(categories))]
+        # Contiguous [lo, hi) row range per category, when rows are clustered by category
+        self.category_ranges: dict[int, tuple[int, int]] = {}
+        for code, cat_mask in enumerate(self.category_masks):
+            rows = np.flatnonzero(cat_mask)
+            if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+                self.category_ranges[code] = (int(rows[0]), int(rows[-1]) + 1)
+        self.zero_apr = apr == 0
+        # Sorted indexes for range predicates
+        self._price_index = _SortedRange(price_cents)
+        self._monthly_index = _SortedRange(monthly_cents)
+
+    def _init_columns(self, categories: list[str], merchants: list[str], columns: dict[str, GrowableArray]) -> None:
+        self.categories = categories
+        self.category_ids = {c: i for i, c in enumerate(categories)}
+        self.merchants = merchants
+        self.merchant_ids = {m: i for i, m in enumerate(merchants)}
+        # Column buffers are shared by every version derived via apply(); each
+        # version sees its first _n rows, and appends only write past them
+        for name in COLUMNS:
+            setattr(self, f"_{name}", columns[name])
+        self._n = len(columns["category_code"])
+        self.alive = np.ones(self._n, dtype=bool)
+        self.n_dead = 0
+        # Rows covered by the bitmaps / sorted indexes; later rows are the tail
+        self.n_indexed = self._n
+
+    @classmethod
+    def mapped(cls, categories: list[str], merchants: list[str], arrays: Mapping[str, np.ndarray]) -> "OfferColumns":
+        """Columns over the COLUMNS arrays and derived_arrays() of a build, used as-is (no copies).
+
+        The first append to a read-only column copies it to private memory.
+        """
+        self = cls.__new__(cls)
+        self._init_columns(categories, merchants, {name: GrowableArray.wrap(arrays[name]) for name in COLUMNS})
+        self.category_masks = list(arrays["category_masks"])
+        self.category_ranges = {int(code): (int(lo), int(hi)) for code, lo, hi in arrays["category_ranges"]}
+        self.zero_apr = arrays["zero_apr"]
+        self._price_index = _SortedRange(self.price_cents, arrays["price_order"], arrays["price_sorted"])
+        self._monthly_index = _SortedRange(self.monthly_cents, arrays["monthly_order"], arrays["monthly_sorted"])
+        return self
+
+    def derived_arrays(self) -> dict[str, np.ndarray]:
+        """Bitmaps, category ranges and sorted indexes, as mapped() takes them (call with no tail rows)."""
+        return {
+            "category_masks": np.array(self.category_masks, dtype=bool).reshape(len(self.category_masks), self.n_indexed),
+            "category_ranges": np.array(
+                [(code, lo, hi) for code, (lo, hi) in self.category_ranges.items()], dtype=np.int64,
+            ).reshape(-1, 3),
+            "zero_apr": self.zero_apr,
+            "price_order": self._price_index.order,
+            "price_sorted": self._price_index.sorted,
+            "monthly_order": self._monthly_index.order,
+            "monthly_sorted": self._monthly_index.sorted,
+        }
+
+    @classmethod
+    def from_offers(cls, offers: list) -> "OfferColumns":
+        categories: dict[str, int] = {}
+        merchants: dict[str, int] = {}
+        category_code = [categories.setdefault(o["category"].lower(), len(categories)) for o in offers]
+        merchant_code = [merchants.setdefault(o["merchantName"], len(merchants)) for o in offers]
+        return cls(
+            categories=list(categories),
+            category_code=np.array(category_code, dtype=np.int32),
+            merchants=list(merchants),
+            merchant_code=np.array(merchant_code, dtype=np.int32),
+            price_cents=np.array([to_cents(o["totalPrice"]) for o in offers], dtype=np.int32),
+            monthly_cents=np.array([to_cents(o["monthlyPayment"]) for o in offers], dtype=np.int32),
+            apr=np.array([o["apr"] for o in offers], dtype=np.float64),
+            term_months=np.array([o["termMonths"] for o in offers], dtype=np.int32),
+        )
+
+    def __len__(self) -> int:
+        return self._n
+
+    category_code = property(lambda self: self._category_code.view[:self._n])
+    merchant_code = property(lambda self: self._merchant_code.view[:self._n])
+    price_cents = property(lambda self: self._price_cents.view[:self._n])
+    monthly_cents = property(lambda self: self._monthly_cents.view[:self._n])
+    apr = property(lambda self: self._apr.view[:self._n])
+    term_months = property(lambda self: self._term_months.view[:self._n])
+
+    # ── Incremental maintenance ──
+
+    def apply(self, offers: Iterable = (), deleted: Iterable[int] = ()) -> "OfferColumns":
+        """New version with offers appended as tail rows and deleted rows tombstoned.
+
+        This version stays valid: appends land past its row count and tombstones
+        go to a fresh alive array. Only the latest version may be extended.
+        """
+        if len(self._category_code) != self._n:
+            raise RuntimeError("OfferColumns.apply on a superseded version")
+        new = copy.copy(self)
+        offers = list(offers)
+        category_code: list[int] = []
+        merchant_code: list[int] = []
+        for offer in offers:
+            category = offer["category"].lower()
+            code = new.category_ids.get(category)
+            if code is None:
+                if new.category_ids is self.category_ids:
+                    new.categories, new.category_ids = list(self.categories), dict(self.category_ids)
+                code = new.category_ids[category] = len(new.categories)
+                new.categories.append(category)
+            merchant = new.merchant_ids.get(offer["merchantName"])
+            if merchant is None:
+                if new.merchant_ids is self.merchant_ids:
+                    new.merchants, new.merchant_ids = list(self.merchants), dict(self.merchant_ids)
+                merchant = new.merchant_ids[offer["merchantName"]] = len(new.merchants)
+                new.merchants.append(offer["merchantName"])
+            category_code.append(code)
+            merchant_code.append(merchant)
+        # Convert every new row before growing a shared buffer: a value the column dtype can't hold
+        # (cents past int32) must fail here, not after some columns already grew past the others
+        rows = {
+            "category_code": category_code,
+            "merchant_code": merchant_code,
+            "price_cents": [to_cents(o["totalPrice"]) for o in offers],
+            "monthly_cents": [to_cents(o["monthlyPayment"]) for o in offers],
+            "apr": [o["apr"] for o in offers],
+            "term_months": [o["termMonths"] for o in offers],
+        }
+        rows = {name: np.asarray(values, dtype=getattr(self, name).dtype) for name, values in rows.items()}
+        if offers:
+            for name, values in rows.items():
+                getattr(new, f"_{name}").append(values)
+        new._n = len(new._category_code)
+        new.alive = np.ones(new._n, dtype=bool)
+        new.alive[:self._n] = self.alive
+        for row in deleted:
+            if new.alive[row]:
+                new.alive[row] = False
+                new.n_dead += 1
+        return new
+
+    def check(self, offers: Iterable) -> None:
+        """ValueError naming the offers whose price, monthly payment or term these columns can't hold."""
+        bad = []
+        for offer in offers:
+            try:
+                values = [
+                    (self.price_cents, to_cents(offer["totalPrice"])),
+                    (self.monthly_cents, to_cents(offer["monthlyPayment"])),
+                    (self.term_months, int(offer["termMonths"])),
+                ]
+            except (ValueError, OverflowError):  # NaN / infinity
+                bad.append(offer["id"])
+                continue
+            if any(not np.iinfo(column.dtype).min <= value <= np.iinfo(column.dtype).max for column, value in values):
+                bad.append(offer["id"])
+        if bad:
+            raise ValueError(f"offers {', '.join(bad)} have a price, monthly payment or term out of range")
+
+    # ── Queries ──
+
+    def category_rows(self, category: str) -> np.ndarray:
+        """Live row ids of one category partition (empty for unknown categories)."""
+        return np.flatnonzero(self.mask(category=category))
+
+    def _code(self, category: Optional[str]) -> Optional[int]:
+        """Category code, None when unconstrained, -1 when unknown."""
+        if not category:
+            return None
+        return self.category_ids.get(category.lower(), -1)
+
+    def _tail_mask(
+        self, code: Optional[int], max_price: Optional[float], max_monthly: Optional[float], only_zero_apr: bool,
+    ) -> np.ndarray:
+        """Predicates over the tail rows by direct comparison (no indexes)."""
+        lo = self.n_indexed
+        mask = self.alive[lo:].copy()
+        if code is not None:
+            mask &= self.category_code[lo:] == code
+        if only_zero_apr:
+            mask &= self.apr[lo:] == 0
+        if max_price is not None:
+            mask &= self.price_cents[lo:] <= column_bound(self.price_cents, cents_ceiling(max_price))
+        if max_monthly is not None:
+            mask &= self.monthly_cents[lo:] <= column_bound(self.monthly_cents, cents_ceiling(max_monthly))
+        return mask
+
+    def _base_mask(
+        self, code: Optional[int], max_price: Optional[float], max_monthly: Optional[float], only_zero_apr: bool,
+    ) -> np.ndarray:
+        n = self.n_indexed
+        if code is not None and not 0 <= code < len(self.category_masks):
+            return np.zeros(n, dtype=bool)
+        mask = np.ones(n, dtype=bool)
+        if code is not None:
+            mask &= self.category_masks[code]
+        if only_zero_apr:
+            mask &= self.zero_apr
+        if max_price is not None:
+            mask &= self._price_index.at_most(cents_ceiling(max_price))
+        if max_monthly is not None:
+            mask &= self._monthly_index.at_most(cents_ceiling(max_monthly))
+        if self.n_dead:
+            mask &= self.alive[:n]
+        return mask
+
+    def mask(
+        self,
+        category: Optional[str] = None,
+        max_price: Optional[float] = None,
+        max_monthly: Optional[float] = None,
+        only_zero_apr: bool = False,
+    ) -> np.ndarray:
+        """Boolean row mask for the conjunction of the given constraints."""
+        code = self._code(category)
+        mask = self._base_mask(code, max_price, max_monthly, only_zero_apr)
+        if len(self) > self.n_indexed:
+            mask = np.concatenate([mask, self._tail_mask(code, max_price, max_monthly, only_zero_apr)])
+        return mask
+
+    def row_filter(
+        self,
+        category: Optional[str] = None,
+        max_price: Optional[float] = None,
+        max_monthly: Optional[float] = None,
+        only_zero_apr: bool = False,
+    ) -> Optional[RowFilter]:
+        """Eligible rows as a RowFilter (None when every row is eligible).
+
+        A category constraint with a contiguous partition only evaluates the
+        other predicates over that partition.
+        """
+        constrained = bool(category or max_price is not None or max_monthly is not None or only_zero_apr)
+        if not constrained and not self.n_dead:
+            return None
+        code = self._code(category)
+        tail_mask = None
+        if len(self) > self.n_indexed:
+            tail_mask = self._tail_mask(code, max_price, max_monthly, only_zero_apr)
+        if code == -1:
+            return RowFilter(0, 0, tail_lo=self.n_indexed, tail_mask=tail_mask)
+        if code is not None and code in self.category_ranges:
+            lo, hi = self.category_ranges[code]
+            mask = self.alive[lo:hi].copy() if self.n_dead else None
+            if only_zero_apr:
+                part = self.zero_apr[lo:hi]
+                mask = part.copy() if mask is None else mask & part
+            if max_price is not None:
+                part = self.price_cents[lo:hi] <= column_bound(self.price_cents, cents_ceiling(max_price))
+                mask = part if mask is None else mask & part
+            if max_monthly is not None:
+                part = self.monthly_cents[lo:hi] <= column_bound(self.monthly_cents, cents_ceiling(max_monthly))
+                mask = part if mask is None else mask & part
+            return RowFilter(lo, hi, mask, self.n_indexed, tail_mask)
+        return RowFilter(
+            0, self.n_indexed, self._base_mask(code, max_price, max_monthly, only_zero_apr), self.n_indexed, tail_mask,
+        )
@@ -0,0 +1,60 @@
+"""Append-friendly NumPy buffer with amortized capacity doubling."""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+class GrowableArray:
+    """A NumPy array that supports cheap appends along axis 0.
+
+    Storage is over-allocated and doubled when full, so n appends cost O(n)
+    copies in total. `view` is the live prefix; it is a view into the buffer
+    and is invalidated by the next append that grows capacity. A read-only
+    buffer (shared between processes, see app/serve.py) is copied to private
+    memory on the first append instead of being written in place.
+    """
+
+    def __init__(self, initial: np.ndarray, min_capacity: int = 16) -> None:
+        initial = np.asarray(initial)
+        capacity = max(len(initial), min_capacity)
+        self._buf = np.empty((capacity,) + initial.shape[1:], dtype=initial.dtype)
+        self._buf[:len(initial)] = initial
+        self._n = len(initial)
+
+    @classmethod
+    def wrap(cls, array: np.ndarray) -> "GrowableArray":
+        """Use array itself as the (full) buffer, without copying it (a mapped snapshot's pages stay shared)."""
+        self = cls.__new__(cls)
+        self._buf = array
+        self._n = len(array)
+        return self
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._buf[:self._n]
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buf)
+
+    def append(self, rows: np.ndarray) -> int:
+        """Append rows (shape (k,) + row shape); returns the index of the first appended row."""
+        rows = np.asarray(rows, dtype=self._buf.dtype)
+        start, end = self._n, self._n + len(rows)
+        if end > len(self._buf) or not self._buf.flags.writeable:
+            grown = np.empty((max(end, 2 * len(self._buf)),) + self._buf.shape[1:], dtype=self._buf.dtype)
+            grown[:start] = self._buf[:start]
+            self._buf = grown
+        self._buf[start:end] = rows
+        self._n = end
+        return start
+
+    def __getitem__(self, key):
+        return self.view[key]
+
+    def __setitem__(self, key, value) -> None:
+        self.view[key] = value
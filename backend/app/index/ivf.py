@@ -0,0 +1,153 @@
+"""IVF approximate nearest-neighbour index (pure NumPy).
+
+A spherical k-means coarse quantizer splits the catalog into nlist inverted
+lists. A query scores the nlist centroids, then scans only the nprobe closest
+lists exactly. Vectors are stored grouped by list so every probed list is a
+contiguous slice (no gather copy).
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import time
+from typing import Optional
+
+import numpy as np
+
+from app.index.columns import RowFilter
+from app.index.vector import normalize_rows, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+# Training sample per centroid; k-means on the full catalog buys little recall
+TRAIN_POINTS_PER_LIST = 64
+KMEANS_ITERS = 10
+_ASSIGN_CHUNK = 65536
+
+
+def default_nlist(n: int) -> int:
+    """Rule of thumb: ~4·sqrt(n) lists."""
+    return max(1, int(4 * math.sqrt(n)))
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (max inner product) per row, chunked to bound memory."""
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        block = vectors[start:start + _ASSIGN_CHUNK]
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def train_kmeans(vectors: np.ndarray, k: int, iters: int = KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a random training sample. Returns (k, d) unit centroids."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    if n == 0:
+        return np.zeros((k, vectors.shape[1]), dtype=np.float32)
+    sample_size = min(n, max(k * TRAIN_POINTS_PER_LIST, k))
+    sample = vectors[rng.choice(n, size=sample_size, replace=False)] if sample_size < n else vectors
+    centroids = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters from random training points
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFVectorIndex:
+    """Inverted-file index with a k-means coarse quantizer and tunable nprobe."""
+
+    def __init__(
+        self, embeddings: np.ndarray, nlist: int = 0, nprobe: int = 8, seed: int = 0, normalized: bool = False,
+    ) -> None:
+        t0 = time.perf_counter()
+        vectors = embeddings if normalized else normalize_rows(embeddings)
+        n = len(vectors)
+        self.nlist = max(1, min(nlist or default_nlist(n), n))
+        self.nprobe = max(1, nprobe)
+        self.centroids = train_kmeans(vectors, self.nlist, seed=seed)
+
+        assign = _assign(vectors, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        self.ids = order  # list-ordered position → original row id
+        self.positions = np.argsort(order)  # original row id → list-ordered position
+        self.vectors = vectors[order]
+        self.offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=self.nlist), out=self.offsets[1:])
+        logger.info("ivf.built", extra={
+            "n": n, "nlist": self.nlist,
+            "build_ms": round((time.perf_counter() - t0) * 1000, 1),
+        })
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def row_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Normalized float32 vectors of the given rows."""
+        return self.vectors[self.positions[rows]]
+
+    def _scan(
+        self, q: np.ndarray, lists: np.ndarray, top_k: int, where: Optional[RowFilter] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        positions = [np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists]
+        scores = [self.vectors[self.offsets[c]:self.offsets[c + 1]] @ q for c in lists]
+        if not positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        pos = np.concatenate(positions)
+        scores = np.concatenate(scores)
+        if where is not None:
+            keep = where.allows(self.ids[pos])
+            pos, scores = pos[keep], scores[keep]
+        top = top_k_indices(scores, top_k)
+        return self.ids[pos[top]], scores[top]
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        where: Optional[RowFilter] = None,
+        nprobe: Optional[int] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k (row ids, cosine scores) scanning nprobe lists.
+
+        With where, an eligible set no larger than a typical probe is scored
+        exactly; otherwise probed lists are filtered and nprobe doubles until
+        top_k eligible rows are found.
+        """
+        q = normalize_rows(query)
+        nprobe = nprobe or self.nprobe
+        if where is not None and where.count <= nprobe * len(self) / self.nlist:
+            rows = where.rows()
+            scores = self.vectors[self.positions[rows]] @ q
+            top = top_k_indices(scores, top_k)
+            return rows[top], scores[top]
+        centroid_scores = self.centroids @ q
+        while True:
+            ids, scores = self._scan(q, top_k_indices(centroid_scores, nprobe), top_k, where)
+            if where is None or len(ids) >= top_k or nprobe >= self.nlist:
+                return ids, scores
+            nprobe *= 2
+
+    def search_many(self, queries: np.ndarray, top_k: int, nprobe: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+        """Batched search: centroids are scored for all queries in one product.
+
+        Rows with fewer than top_k hits are padded with id -1 / score -inf.
+        """
+        q = normalize_rows(np.atleast_2d(queries))
+        lists = top_k_indices(q @ self.centroids.T, nprobe or self.nprobe)
+        k = min(top_k, len(self))
+        ids = np.full((len(q), k), -1, dtype=np.int64)
+        scores = np.full((len(q), k), -np.inf, dtype=np.float32)
+        for i in range(len(q)):
+            row_ids, row_scores = self._scan(q[i], lists[i], k)
+            ids[i, :len(row_ids)] = row_ids
+            scores[i, :len(row_scores)] = row_scores
+        return ids, scores
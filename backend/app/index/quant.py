@@ -0,0 +1,122 @@
+"""Quantized vector index: compact first-pass scan + full-precision rescoring.
+
+Resident memory holds only the quantized codes (int8 with a per-vector scale,
+or float16). The normalized float32 matrix is spilled to a .npy file and
+memory-mapped read-only, so only the rows touched by the rescoring pass are
+paged in.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import uuid
+from typing import Optional
+
+import numpy as np
+
+from app.index.columns import RowFilter
+from app.index.vector import normalize_rows, top_k_indices, window_top_k
+
+QUANTIZATION_MODES = ("int8", "float16")
+
+# Rows dequantized per block in the first pass; bounds the temporary float32 buffer
+_SCAN_CHUNK = 32768
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8: v ≈ codes * scale."""
+    scale = np.abs(vectors).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scale[:, None]), -127, 127).astype(np.int8)
+    return codes, scale.astype(np.float32)
+
+
+def spill_to_disk(vectors: np.ndarray, spill_dir: Optional[str] = None) -> np.ndarray:
+    """Write vectors to a .npy file and return a read-only memory map of it."""
+    directory = spill_dir or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"vectors-{os.getpid()}-{uuid.uuid4().hex[:8]}.npy")
+    np.save(path, vectors)
+    mapped = np.load(path, mmap_mode="r")
+    try:
+        os.unlink(path)  # the mapping keeps the data alive; nothing left behind on exit
+    except OSError:
+        pass
+    return mapped
+
+
+class QuantizedVectorIndex:
+    """Quantized brute-force scan, exact cosine rescoring of the top rescore_k rows."""
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        mode: str = "int8",
+        rescore_k: int = 200,
+        spill_dir: Optional[str] = None,
+        normalized: bool = False,
+    ) -> None:
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode!r}")
+        vectors = embeddings if normalized else normalize_rows(embeddings)
+        self.mode = mode
+        self.rescore_k = rescore_k
+        if mode == "int8":
+            self.codes, self.scale = quantize_int8(vectors)
+        else:
+            self.codes, self.scale = vectors.astype(np.float16), None
+        # Already-normalized input is a mapped snapshot file; rescore from it directly
+        self.full = vectors if normalized else spill_to_disk(vectors, spill_dir)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def resident_bytes(self) -> int:
+        """Bytes held in process memory (excludes the memory-mapped rescoring copy)."""
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def row_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Normalized float32 vectors of the given rows (read from the memory-mapped copy)."""
+        return np.asarray(self.full[rows])
+
+    def _approx_scores(self, q: np.ndarray, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+        """First pass over the codes of rows [lo, hi) for a (d,) or (d, b) query block."""
+        hi = len(self.codes) if hi is None else hi
+        out = np.empty((hi - lo,) + q.shape[1:], dtype=np.float32)
+        for start in range(lo, hi, _SCAN_CHUNK):
+            block = self.codes[start:min(start + _SCAN_CHUNK, hi)].astype(np.float32)
+            out[start - lo:start - lo + len(block)] = block @ q
+        if self.scale is not None:
+            out *= self.scale[lo:hi].reshape((-1,) + (1,) * (q.ndim - 1))
+        return out
+
+    def _rescore(self, q: np.ndarray, shortlist: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        shortlist = np.sort(shortlist)  # sorted rows read the mmap sequentially
+        exact = np.asarray(self.full[shortlist]) @ q
+        top = top_k_indices(exact, top_k)
+        return shortlist[top], exact[top]
+
+    def search(
+        self, query: np.ndarray, top_k: int, where: Optional[RowFilter] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        q = normalize_rows(query)
+        depth = max(self.rescore_k, top_k)
+        if where is not None:
+            shortlist, _ = window_top_k(self._approx_scores(q, where.lo, where.hi), depth, where)
+        else:
+            shortlist = top_k_indices(self._approx_scores(q), depth)
+        return self._rescore(q, shortlist, top_k)
+
+    def search_many(self, queries: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """First pass for the whole block in one scan; rescoring per query."""
+        q = normalize_rows(np.atleast_2d(queries))
+        approx = self._approx_scores(q.T)
+        k = min(top_k, len(self))
+        ids = np.empty((len(q), k), dtype=np.int64)
+        scores = np.empty((len(q), k), dtype=np.float32)
+        for i in range(len(q)):
+            shortlist = top_k_indices(approx[:, i], max(self.rescore_k, k))
+            ids[i], scores[i] = self._rescore(q[i], shortlist, k)
+        return ids, scores
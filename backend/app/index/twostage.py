@@ -0,0 +1,116 @@
+"""Two-stage coarse-to-fine vector index.
+
+Stage 1 scores every offer on a low-dimensional copy of the embeddings — the
+first coarse_dim dimensions (prefix) or a PCA projection computed at build
+time. Stage 2 rescores only the shortlist at full dimension.
+
+At build time the shortlist is calibrated: it is doubled until the mean
+top-20 overlap with exact search on probe queries reaches min_overlap.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+import numpy as np
+
+from app.index.columns import RowFilter
+from app.index.vector import normalize_rows, top_k_indices, window_top_k
+
+logger = logging.getLogger(__name__)
+
+PROJECTIONS = ("prefix", "pca")
+CALIBRATION_QUERIES = 64
+CALIBRATION_TOP_K = 20
+_PCA_SAMPLE = 20000
+
+
+def pca_basis(vectors: np.ndarray, dim: int, seed: int = 0) -> np.ndarray:
+    """Top principal directions (uncentered, so inner products are preserved) as a (dim, d) matrix."""
+    rng = np.random.default_rng(seed)
+    sample = vectors if len(vectors) <= _PCA_SAMPLE else vectors[rng.choice(len(vectors), _PCA_SAMPLE, replace=False)]
+    _, _, vt = np.linalg.svd(sample, full_matrices=False)
+    return vt[:dim].astype(np.float32)
+
+
+class TwoStageVectorIndex:
+    """Low-dim coarse scan over all rows, full-dim rescoring of the shortlist."""
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        coarse_dim: int = 64,
+        shortlist: int = 200,
+        projection: str = "prefix",
+        min_overlap: float = 0.9,
+        normalized: bool = False,
+    ) -> None:
+        if projection not in PROJECTIONS:
+            raise ValueError(f"Unknown projection: {projection!r}")
+        self.vectors = embeddings if normalized else normalize_rows(embeddings)
+        self.coarse_dim = min(coarse_dim, self.vectors.shape[1])
+        self.projection = projection
+        self._basis = pca_basis(self.vectors, self.coarse_dim) if projection == "pca" else None
+        self.coarse = np.ascontiguousarray(self._project(self.vectors))
+        self.shortlist = shortlist
+        self.overlap = self.calibrate(min_overlap)
+        logger.info("two_stage.built", extra={
+            "n": len(self), "coarse_dim": self.coarse_dim, "projection": projection,
+            "shortlist": self.shortlist, "overlap": round(self.overlap, 3),
+        })
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def row_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Normalized float32 vectors of the given rows."""
+        return self.vectors[rows]
+
+    def _project(self, x: np.ndarray) -> np.ndarray:
+        if self._basis is not None:
+            return x @ self._basis.T
+        return x[..., :self.coarse_dim]
+
+    def calibrate(self, min_overlap: float) -> float:
+        """Grow the shortlist until probe queries reach min_overlap with exact top-20."""
+        n = len(self)
+        rng = np.random.default_rng(0)
+        probes = self.vectors[rng.choice(n, size=min(CALIBRATION_QUERIES, n), replace=False)]
+        probes = normalize_rows(probes + 0.3 * rng.standard_normal(probes.shape).astype(np.float32) / np.sqrt(probes.shape[1]))
+        k = min(CALIBRATION_TOP_K, n)
+        truth = top_k_indices(probes @ self.vectors.T, k)
+        while True:
+            found, _ = self.search_many(probes, k)
+            overlap = float(np.mean([len(np.intersect1d(f, t)) / k for f, t in zip(found, truth)]))
+            if overlap >= min_overlap or self.shortlist >= n:
+                return overlap
+            self.shortlist = min(self.shortlist * 2, n)
+
+    def _rescore(self, q: np.ndarray, shortlist: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        exact = self.vectors[shortlist] @ q
+        top = top_k_indices(exact, top_k)
+        return shortlist[top], exact[top]
+
+    def search(
+        self, query: np.ndarray, top_k: int, where: Optional[RowFilter] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        q = normalize_rows(query)
+        depth = max(self.shortlist, top_k)
+        if where is not None:
+            shortlist, _ = window_top_k(self.coarse[where.lo:where.hi] @ self._project(q), depth, where)
+        else:
+            shortlist = top_k_indices(self.coarse @ self._project(q), depth)
+        return self._rescore(q, shortlist, top_k)
+
+    def search_many(self, queries: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Coarse stage for the whole block in one product; rescoring per query."""
+        q = normalize_rows(np.atleast_2d(queries))
+        coarse_scores = self._project(q) @ self.coarse.T
+        k = min(top_k, len(self))
+        ids = np.empty((len(q), k), dtype=np.int64)
+        scores = np.empty((len(q), k), dtype=np.float32)
+        for i in range(len(q)):
+            shortlist = top_k_indices(coarse_scores[i], max(self.shortlist, k))
+            ids[i], scores[i] = self._rescore(q[i], shortlist, k)
+        return ids, scores
@@ -0,0 +1,99 @@
+"""Vector indexes over offer embeddings (cosine similarity)."""
+
+from __future__ import annotations
+
+from typing import Optional, Protocol
+
+import numpy as np
+
+from app.index.columns import RowFilter
+
+
+class VectorIndex(Protocol):
+    """Interface shared by the exact, IVF, quantized and two-stage indexes."""
+
+    def __len__(self) -> int: ...
+
+    def search(
+        self, query: np.ndarray, top_k: int, where: Optional[RowFilter] = None,
+    ) -> tuple[np.ndarray, np.ndarray]: ...
+
+    def search_many(self, queries: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]: ...
+
+    def row_vectors(self, rows: np.ndarray) -> np.ndarray: ...
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows into a float32 matrix (epsilon guards zero vectors)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True) + 1e-9
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores along the last axis, best first.
+
+    argpartition selects the k winners in O(n); only those k get sorted.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def window_top_k(scores: np.ndarray, k: int, where: RowFilter) -> tuple[np.ndarray, np.ndarray]:
+    """Top-k over scores of the rows [where.lo, where.hi), skipping masked-out rows.
+
+    Returns global row ids; fewer than k when fewer rows are eligible.
+    """
+    if where.mask is not None:
+        scores = np.where(where.mask, scores, -np.inf)
+    top = top_k_indices(scores, k)
+    if where.mask is not None:
+        top = top[where.mask[top]]
+    return top + where.lo, scores[top]
+
+
+class ExactVectorIndex:
+    """Brute-force cosine search over a matrix normalized once at build time."""
+
+    def __init__(self, embeddings: np.ndarray, normalized: bool = False) -> None:
+        # normalized=True serves the matrix as given (e.g. a read-only memory map)
+        self.vectors = embeddings if normalized else normalize_rows(embeddings)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def search(
+        self, query: np.ndarray, top_k: int, where: Optional[RowFilter] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k (row ids, cosine scores) for one query vector.
+
+        With where, only the eligible window of the matrix is scored.
+        """
+        q = normalize_rows(query)
+        if where is not None:
+            return window_top_k(self.vectors[where.lo:where.hi] @ q, top_k, where)
+        scores = self.vectors @ q
+        top = top_k_indices(scores, top_k)
+        return top, scores[top]
+
+    def row_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Normalized float32 vectors of the given rows."""
+        return self.vectors[rows]
+
+    def search_many(self, queries: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k for a block of queries with a single matrix-matrix product.
+
+        Returns (ids, scores), both shaped (n_queries, top_k).
+        """
+        q = normalize_rows(np.atleast_2d(queries))
+        scores = q @ self.vectors.T
+        top = top_k_indices(scores, top_k)
+        return top, np.take_along_axis(scores, top, axis=-1)
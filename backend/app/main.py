@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 from pathlib import Path
@@ -11,11 +12,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
+from app.embed_cache import close_embedding_cache
+from app.embedder import close_embedder, get_embedder
+from app.events import close_event_log
+from app.search_cache import close_search_cache
+from app.executors import shutdown_executors
 from app.middleware import RequestIdMiddleware
 from app.routes.health import router as health_router
 from app.routes.search import router as search_router
 from app.routes.profile import router as profile_router
 from app.routes.quality import router as quality_router
+from app.routes.admin import router as admin_router
+from app.routes.metrics import router as metrics_router
 from app.store import get_store
 
 STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
@@ -48,6 +56,8 @@ app.include_router(health_router)
 app.include_router(search_router)
 app.include_router(profile_router)
 app.include_router(quality_router)
+app.include_router(admin_router)
+app.include_router(metrics_router)
 
 # Serve Expo web build as static files (if present)
 if STATIC_DIR.is_dir():
@@ -69,6 +79,23 @@ if STATIC_DIR.is_dir():
 
 @app.on_event("startup")
 async def startup():
-    """Seed in-memory store on startup."""
-    store = get_store()
-    logging.info(f"Store initialized with {len(store.offers)} offers")
+    """Load (and warm up) the embedding model, then seed the store with it.
+
+    Seeding runs in a worker thread: it builds indexes or waits on the database,
+    and the Postgres store refuses sync calls on the event loop.
+    """
+    await asyncio.to_thread(get_embedder().warmup)
+    store = await asyncio.to_thread(get_store)
+    logging.info(f"Store initialized with {len(store.snapshot())} offers (catalog v{store.catalog_version})")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop background catalog work (reloads, shard processes), the executor pools, the event log and the
+    embedder threads; persist the embedding cache and drop the search result cache."""
+    get_store().close()
+    shutdown_executors()
+    close_event_log()
+    close_embedding_cache()
+    close_search_cache()
+    close_embedder()
@@ -0,0 +1,582 @@
+"""Postgres + pgvector catalog store on an asyncpg pool (STORE_BACKEND=postgres, the default with USE_MOCK_DB=false).
+
+Schema (in PG_SCHEMA, created on first connect):
+
+  offers        id (primary key), category, price_cents, monthly_cents, apr, lexical,
+                tsv (generated: to_tsvector('simple', lexical)), data (jsonb record),
+                embedding vector(EMBEDDING_DIM) (unit length).
+                Indexes: HNSW on embedding (vector_cosine_ops), GIN on tsv, and
+                btree on category + price, price, monthly payment and APR.
+  catalog_meta  the catalog version, bumped by every write.
+
+PgDatabase is the async API. Every query is a fixed SQL text with typed
+parameters. Filters are pushed into the WHERE clause as nullable parameters
+("$2::text IS NULL OR category = $2"), so each statement text is prepared
+once per pooled connection by asyncpg's statement cache, and later calls
+only bind and execute it. Connections run with plan_cache_mode =
+force_custom_plan. That way Postgres still plans each call with the actual
+filter values: selective filters use the btree indexes and an exact sort,
+and broad ones walk the HNSW index. hybrid_search answers both retrieve
+legs (HNSW + tsvector) in one round trip.
+
+HNSW is approximate. hnsw.ef_search (PG_HNSW_EF_SEARCH) bounds how many
+candidates a scan yields. On pgvector >= 0.8 connections also enable
+iterative scans, so filtered searches keep walking the graph until they
+have top_k rows. On older versions a filtered search that comes back short
+is rerun without the index, which makes it exact over the eligible rows.
+
+PgStore exposes the synchronous store interface that the pipeline, admin
+routes and scripts use. It owns one event loop thread per process, and the
+pool, the queries and a LISTEN connection for version changes all live on
+that loop. The event loop serving requests never waits on Postgres:
+  - pipeline nodes run in worker threads, which submit coroutines to the
+    store loop and wait on the result;
+  - a sync catalog call made from a thread that is running an event loop
+    raises RuntimeError; async code awaits store.run(store.database.<query>(...)) instead;
+  - snapshot(), len() and version are cached. Writes from any process
+    NOTIFY the new version and offer count, and every store LISTENs.
+
+Versions are reported, not isolated. Postgres keeps no per-version rows here,
+so a PgCatalog pins the version number and count it reports, while its
+queries read the latest committed rows (READ COMMITTED). Use the SQLite
+backend when requests must see exactly one version.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections.abc import Awaitable, Iterable, Mapping, Sequence
+from concurrent.futures import Future
+from typing import Callable, Optional, TypeVar
+
+import numpy as np
+
+from app.catalog import _offer_text
+from app.config import get_settings
+from app.index.bm25 import tokenize
+from app.index.columns import cents_ceiling, to_cents
+from app.index.vector import normalize_rows
+from app.records import Hit, LazyOffers, OfferRecord
+from app.store import InMemoryStore
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_meta (key text PRIMARY KEY, value bigint NOT NULL);
+INSERT INTO catalog_meta VALUES ('version', 0) ON CONFLICT DO NOTHING;
+CREATE TABLE IF NOT EXISTS offers (
+    id text PRIMARY KEY,
+    category text NOT NULL,
+    price_cents integer NOT NULL,
+    monthly_cents integer NOT NULL,
+    apr real NOT NULL,
+    lexical text NOT NULL,
+    tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', lexical)) STORED,
+    data jsonb NOT NULL,
+    embedding vector({dim}) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS offers_embedding ON offers
+    USING hnsw (embedding vector_cosine_ops) WITH (m = {m}, ef_construction = {ef_construction});
+CREATE INDEX IF NOT EXISTS offers_tsv ON offers USING gin (tsv);
+CREATE INDEX IF NOT EXISTS offers_category ON offers (category, price_cents);
+CREATE INDEX IF NOT EXISTS offers_price ON offers (price_cents);
+CREATE INDEX IF NOT EXISTS offers_monthly ON offers (monthly_cents);
+CREATE INDEX IF NOT EXISTS offers_apr ON offers (apr);
+"""
+
+_COLUMNS = ("id", "category", "price_cents", "monthly_cents", "apr", "lexical", "data", "embedding")
+
+# Unconstrained filter parameters (category, price cap, monthly cap, zero-APR only)
+_NO_FILTERS = [None, None, None, False]
+
+
+def _filter_sql(first: int) -> str:
+    """Constraint predicate over offers with its four parameters numbered from $first."""
+    c, p, m, z = (f"${i}" for i in range(first, first + 4))
+    return (f"({c}::text IS NULL OR category = {c}) AND ({p}::bigint IS NULL OR price_cents <= {p})"
+            f" AND ({m}::bigint IS NULL OR monthly_cents <= {m}) AND (NOT {z}::bool OR apr = 0)")
+
+
+_VECTOR_SQL = f"""
+SELECT data, 1 - (embedding <=> $1) AS score FROM offers
+WHERE {_filter_sql(2)}
+ORDER BY embedding <=> $1 LIMIT $6
+"""
+
+_LEXICAL_SQL = f"""
+SELECT data, ts_rank(tsv, q) AS score FROM offers, to_tsquery('simple', $1) q
+WHERE tsv @@ q AND {_filter_sql(2)}
+ORDER BY score DESC, id LIMIT $6
+"""
+
+_HYBRID_SQL = f"""
+WITH v AS (
+    SELECT data, 1 - (embedding <=> $1) AS score FROM offers
+    WHERE {_filter_sql(3)}
+    ORDER BY embedding <=> $1 LIMIT $7
+), l AS (
+    SELECT data, ts_rank(tsv, q) AS score FROM offers, to_tsquery('simple', $2) q
+    WHERE tsv @@ q AND {_filter_sql(3)}
+    ORDER BY score DESC, id LIMIT $7
+)
+SELECT true AS vector, data, score FROM v
+UNION ALL SELECT false, data, score FROM l
+"""
+
+_SELECT_SQL = f"SELECT data FROM offers WHERE {_filter_sql(1)} ORDER BY id LIMIT $5 OFFSET $6"
+
+_ELIGIBLE_SQL = f"SELECT id FROM offers WHERE id = ANY($1::text[]) AND {_filter_sql(2)}"
+
+_UPSERT_SQL = f"""
+INSERT INTO offers ({", ".join(_COLUMNS)}) VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+ON CONFLICT (id) DO UPDATE SET
+    category = EXCLUDED.category, price_cents = EXCLUDED.price_cents, monthly_cents = EXCLUDED.monthly_cents,
+    apr = EXCLUDED.apr, lexical = EXCLUDED.lexical, data = EXCLUDED.data, embedding = EXCLUDED.embedding
+"""
+
+
+def _filter_params(filters: Optional[dict]) -> list:
+    """A constraint dict (row_filter keys) as the four _filter_sql parameters."""
+    filters = filters or {}
+    category, max_price, max_monthly = filters.get("category"), filters.get("max_price"), filters.get("max_monthly")
+    return [
+        category.lower() if category else None,
+        cents_ceiling(max_price) if max_price is not None else None,
+        cents_ceiling(max_monthly) if max_monthly is not None else None,
+        bool(filters.get("only_zero_apr")),
+    ]
+
+
+def _tsquery(query: str) -> Optional[str]:
+    """OR of the query's tokens (our tokenizer's, so [a-z0-9]+ and safe in to_tsquery), or None."""
+    tokens = list(dict.fromkeys(tokenize(query)))
+    return " | ".join(tokens) if tokens else None
+
+
+def _record(data: str) -> OfferRecord:
+    return OfferRecord.from_dict(json.loads(data))
+
+
+def _hits(rows: Iterable, score_key: str) -> list[Hit]:
+    return [Hit(_record(r["data"]), score_key, float(r["score"])) for r in rows]
+
+
+def _row(record: Mapping, embedding: np.ndarray) -> tuple:
+    return (
+        record["id"], record["category"].lower(), to_cents(record["totalPrice"]), to_cents(record["monthlyPayment"]),
+        float(record["apr"]), " ".join(tokenize(_offer_text(record))),
+        json.dumps(dict(record), separators=(",", ":")),
+        normalize_rows(np.asarray(embedding, dtype=np.float32)),
+    )
+
+
+class PgDatabase:
+    """The catalog in Postgres: async reads and writes over an asyncpg pool."""
+
+    def __init__(
+        self,
+        dsn: str,
+        dim: int,
+        schema: str = "public",
+        pool_min: int = 2,
+        pool_max: int = 10,
+        hnsw_m: int = 16,
+        hnsw_ef_construction: int = 64,
+        hnsw_ef_search: int = 100,
+        timeout_ms: int = 1000,
+    ) -> None:
+        if not re.fullmatch(r"[a-z_][a-z0-9_]*", schema):
+            raise ValueError(f"PG_SCHEMA must be a lowercase identifier, got {schema!r}")
+        # SQLAlchemy-style URLs (postgresql+asyncpg://) name the driver; asyncpg wants plain postgresql://
+        self.dsn = dsn.replace("+asyncpg", "", 1)
+        self.dim = dim
+        self.schema = schema
+        self.pool_min = pool_min
+        self.pool_max = pool_max
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self.timeout = timeout_ms / 1000
+        self.channel = f"{schema}_catalog_version"
+        self.pool = None
+        self._listener = None
+
+    async def connect(self) -> None:
+        """Create the extension, schema and indexes if needed, then open the pool."""
+        import asyncpg
+
+        conn = await asyncpg.connect(self.dsn)
+        try:
+            async with conn.transaction():
+                # Workers starting together would race on CREATE ... IF NOT EXISTS
+                await conn.execute("SELECT pg_advisory_xact_lock(hashtext($1))", self.channel)
+                await conn.execute(f"CREATE EXTENSION IF NOT EXISTS vector; CREATE SCHEMA IF NOT EXISTS {self.schema}")
+                await conn.execute(f"SET LOCAL search_path TO {self.schema}, public")
+                await conn.execute(_SCHEMA.format(
+                    dim=self.dim, m=self.hnsw_m, ef_construction=self.hnsw_ef_construction,
+                ))
+        finally:
+            await conn.close()
+        self.pool = await asyncpg.create_pool(
+            self.dsn, min_size=self.pool_min, max_size=self.pool_max, init=self._init_connection,
+        )
+
+    async def _init_connection(self, conn) -> None:
+        import asyncpg
+        from pgvector.asyncpg import register_vector
+
+        await register_vector(conn)
+        await conn.execute(f"SET search_path TO {self.schema}, public")
+        await conn.execute(f"SET hnsw.ef_search = {int(self.hnsw_ef_search)}")
+        await conn.execute("SET plan_cache_mode = force_custom_plan")
+        try:
+            await conn.execute("SET hnsw.iterative_scan = strict_order")
+        except asyncpg.PostgresError:
+            pass  # pgvector < 0.8: short filtered scans are rerun exactly (see vector_search)
+
+    async def listen(self, callback: Callable[[int, int], None]) -> None:
+        """Call callback(version, offer count) for every committed write, from any process."""
+        import asyncpg
+
+        def notified(_conn, _pid, _channel, payload: str) -> None:
+            version, count = payload.split()
+            callback(int(version), int(count))
+
+        self._listener = await asyncpg.connect(self.dsn)
+        await self._listener.add_listener(self.channel, notified)
+
+    async def meta(self) -> tuple[int, int]:
+        """(catalog version, offer count)."""
+        async with self.pool.acquire(timeout=self.timeout) as conn:
+            row = await conn.fetchrow(
+                "SELECT (SELECT value FROM catalog_meta WHERE key = 'version'), (SELECT count(*) FROM offers)",
+                timeout=self.timeout,
+            )
+        return row[0], row[1]
+
+    # ── Reads ──
+
+    async def vector_search(self, embedding, top_k: int = 20, filters: Optional[dict] = None) -> list[Hit]:
+        """Cosine similarity (HNSW), top-k among eligible offers."""
+        if top_k <= 0:
+            return []
+        query = normalize_rows(np.asarray(embedding, dtype=np.float32))
+        params = _filter_params(filters)
+        async with self.pool.acquire(timeout=self.timeout) as conn:
+            rows = await conn.fetch(_VECTOR_SQL, query, *params, top_k, timeout=self.timeout)
+            if len(rows) < top_k and params != _NO_FILTERS:
+                rows = await self._exact(conn, query, params, top_k)
+        return _hits(rows, "_similarity")
+
+    async def _exact(self, conn, query: np.ndarray, params: list, top_k: int) -> list:
+        """_VECTOR_SQL without index scans: filter first, then sort the eligible rows by distance."""
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_indexscan = off")
+            return await conn.fetch(_VECTOR_SQL, query, *params, top_k, timeout=self.timeout)
+
+    async def bm25_search(self, query: str, top_k: int = 20, filters: Optional[dict] = None) -> list[Hit]:
+        """ts_rank over the tsvector of merchantName + productName + category (any query token), top-k."""
+        tsquery = _tsquery(query)
+        if tsquery is None or top_k <= 0:
+            return []
+        async with self.pool.acquire(timeout=self.timeout) as conn:
+            rows = await conn.fetch(_LEXICAL_SQL, tsquery, *_filter_params(filters), top_k, timeout=self.timeout)
+        return _hits(rows, "_bm25_score")
+
+    async def hybrid_search(
+        self, embedding, query: str, top_k: int = 20, filters: Optional[dict] = None,
+    ) -> tuple[list[Hit], list[Hit]]:
+        """(vector_search, bm25_search) in one round trip."""
+        tsquery = _tsquery(query)
+        if tsquery is None:
+            return await self.vector_search(embedding, top_k, filters), []
+        if top_k <= 0:
+            return [], []
+        vector = normalize_rows(np.asarray(embedding, dtype=np.float32))
+        params = _filter_params(filters)
+        async with self.pool.acquire(timeout=self.timeout) as conn:
+            rows = await conn.fetch(_HYBRID_SQL, vector, tsquery, *params, top_k, timeout=self.timeout)
+            vector_rows = [r for r in rows if r["vector"]]
+            if len(vector_rows) < top_k and params != _NO_FILTERS:
+                vector_rows = await self._exact(conn, vector, params, top_k)
+        return _hits(vector_rows, "_similarity"), _hits((r for r in rows if not r["vector"]), "_bm25_score")
+
+    async def vector_search_many(self, queries: list[list[float]], top_k: int = 20) -> list[list[Hit]]:
+        """Unconstrained vector_search per query, run concurrently on the pool."""
+        return list(await asyncio.gather(*(self.vector_search(q, top_k) for q in queries)))
+
+    async def select(self, limit: Optional[int], offset: int = 0, filters: Optional[dict] = None) -> list[OfferRecord]:
+        """Eligible offers in id order (limit None = all)."""
+        async with self.pool.acquire(timeout=self.timeout) as conn:
+            rows = await conn.fetch(_SELECT_SQL, *_filter_params(filters), limit, offset)
+        return [_record(r["data"]) for r in rows]
+
+    async def eligible(self, offer_ids: list[str], filters: Optional[dict]) -> list[bool]:
+        async with self.pool.acquire(timeout=self.timeout) as conn:
+            found = {r["id"] for r in await conn.fetch(
+                _ELIGIBLE_SQL, list(offer_ids), *_filter_params(filters), timeout=self.timeout,
+            )}
+        return [i in found for i in offer_ids]
+
+    async def live_rows(self) -> tuple[list[OfferRecord], np.ndarray]:
+        """All records and their embeddings, in id order."""
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT data, embedding FROM offers ORDER BY id")
+        embeddings = np.array([r["embedding"] for r in rows], dtype=np.float32).reshape(len(rows), self.dim)
+        return [_record(r["data"]) for r in rows], embeddings
+
+    # ── Writes ──
+
+    async def write(
+        self, upserts: Iterable[tuple[Mapping, np.ndarray]], deletes: Iterable[str] = (), replace: bool = False,
+    ) -> tuple[int, int, list[str]]:
+        """Upsert, then delete, in one transaction; replace first empties the table.
+
+        Returns (version, offer count, deleted ids). A write that changes nothing
+        rolls back and leaves the version alone.
+        """
+        rows = [_row(r, e) for r, e in {r["id"]: (r, e) for r, e in upserts}.values()]
+        deletes = list(dict.fromkeys(deletes))
+        async with self.pool.acquire() as conn:
+            tx = conn.transaction()
+            await tx.start()
+            try:
+                # Taken first so concurrent writers (any process) serialize on the meta row
+                version = await conn.fetchval("UPDATE catalog_meta SET value = value + 1 WHERE key = 'version' RETURNING value")
+                if replace:
+                    # DELETE, not TRUNCATE: readers keep the old rows until commit instead of blocking
+                    await conn.execute("DELETE FROM offers")
+                    await conn.copy_records_to_table("offers", records=rows, columns=_COLUMNS, schema_name=self.schema)
+                elif rows:
+                    await conn.executemany(_UPSERT_SQL, rows)
+                deleted = [r["id"] for r in await conn.fetch(
+                    "DELETE FROM offers WHERE id = ANY($1::text[]) RETURNING id", deletes,
+                )] if deletes else []
+                if not (rows or deleted or replace):
+                    await tx.rollback()
+                    return version - 1, await conn.fetchval("SELECT count(*) FROM offers"), []
+                count = await conn.fetchval("SELECT count(*) FROM offers")
+                await conn.execute("SELECT pg_notify($1, $2)", self.channel, f"{version} {count}")
+            except BaseException:
+                await tx.rollback()
+                raise
+            await tx.commit()
+        order = {i: n for n, i in enumerate(deletes)}
+        return version, count, sorted(deleted, key=order.__getitem__)
+
+    async def vacuum(self) -> None:
+        """Reclaim dead rows and refresh planner statistics (autovacuum does this eventually)."""
+        async with self.pool.acquire() as conn:
+            await conn.execute("VACUUM (ANALYZE) offers")
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def forget(self) -> None:
+        """Drop connections inherited across a fork without closing them (they belong to the parent)."""
+        self._listener = None
+        self.pool = None
+
+
+class PgCatalog:
+    """A catalog version reported by a PgStore: the CatalogSnapshot read interface, each call one query."""
+
+    pending_rows = 0  # dead tuples are Postgres's to vacuum
+
+    def __init__(self, store: "PgStore", version: int, count: int) -> None:
+        self.version = version
+        self._store = store
+        self._db = store.database
+        self._len = count
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, offer_id: object) -> bool:
+        return self._store.call(self._db.eligible([offer_id], None))[0]
+
+    @property
+    def offers(self) -> Sequence[OfferRecord]:
+        """Offer records in id order (read lazily; slice rather than iterate large catalogs)."""
+        return LazyOffers(self._select, len(self))
+
+    def _select(self, limit: int, offset: int, filters: Optional[dict] = None) -> list[OfferRecord]:
+        return self._store.call(self._db.select(None if limit < 0 else limit, offset, filters))
+
+    def live_rows(self) -> tuple[list[OfferRecord], np.ndarray]:
+        return self._store.call(self._db.live_rows())
+
+    def bm25_search(self, query: str, top_k: int = 20, filters: Optional[dict] = None) -> list[Hit]:
+        return self._store.call(self._db.bm25_search(query, top_k, filters))
+
+    def vector_search(
+        self, query_embedding: list[float], top_k: int = 20, filters: Optional[dict] = None,
+    ) -> list[Hit]:
+        return self._store.call(self._db.vector_search(query_embedding, top_k, filters))
+
+    def hybrid_search(
+        self, query_embedding: list[float], query: str, top_k: int = 20, filters: Optional[dict] = None,
+    ) -> tuple[list[Hit], list[Hit]]:
+        """(vector_search, bm25_search) in one round trip."""
+        return self._store.call(self._db.hybrid_search(query_embedding, query, top_k, filters))
+
+    def vector_search_many(self, queries: list[list[float]], top_k: int = 20) -> list[list[Hit]]:
+        return self._store.call(self._db.vector_search_many(queries, top_k))
+
+    def filter_offers(
+        self,
+        category: Optional[str] = None,
+        max_price: Optional[float] = None,
+        max_monthly: Optional[float] = None,
+        only_zero_apr: bool = False,
+    ) -> list[OfferRecord]:
+        """SQL filter on offers (indexed on category, price, monthly payment and APR), in id order."""
+        filters = {"category": category, "max_price": max_price, "max_monthly": max_monthly, "only_zero_apr": only_zero_apr}
+        return self._select(-1, 0, filters)
+
+    def eligible(self, offer_ids: list[str], filters: Optional[dict]) -> list[bool]:
+        """Whether each offer satisfies the constraint dict (same keys as row_filter)."""
+        return self._store.call(self._db.eligible(offer_ids, filters))
+
+    def filter_mask(self, *args, **kwargs) -> np.ndarray:
+        raise NotImplementedError("Postgres catalogs have no row-indexed masks; use eligible() or filter_offers()")
+
+    def row_of(self, offer_id: str) -> int:
+        raise NotImplementedError("Postgres catalogs have no row-indexed masks; use eligible() or filter_offers()")
+
+
+class PgStore(InMemoryStore):
+    """The store API over a Postgres catalog (STORE_BACKEND=postgres); profile fixtures stay in memory."""
+
+    _instance: Optional["PgStore"] = None
+
+    def _seed(self) -> None:
+        settings = get_settings()
+        self.database = PgDatabase(
+            settings.DATABASE_URL,
+            settings.EMBEDDING_DIM,
+            schema=settings.PG_SCHEMA,
+            pool_min=settings.PG_POOL_MIN,
+            pool_max=settings.PG_POOL_MAX,
+            hnsw_m=settings.PG_HNSW_M,
+            hnsw_ef_construction=settings.PG_HNSW_EF_CONSTRUCTION,
+            hnsw_ef_search=settings.PG_HNSW_EF_SEARCH,
+            timeout_ms=settings.PG_TIMEOUT_MS,
+        )
+        self._publish_lock = threading.Lock()
+        self._loop_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_pid: Optional[int] = None
+        version, count = self.call(self.database.meta())
+        if version == 0:
+            # Empty database: import the configured catalog (SNAPSHOT_DIR, else the seed offers)
+            records, embeddings = self._load_catalog().live_rows()
+            version, count, _ = self.call(self.database.write(list(zip(records, embeddings)), replace=True))
+        self._publish(version, count)
+
+    # ── The store's event loop ──
+
+    def _process_loop(self) -> asyncio.AbstractEventLoop:
+        """This process's store loop, started (and connected) on first use and again after a fork."""
+        if self._loop_pid != os.getpid():
+            with self._loop_lock:
+                if self._loop_pid != os.getpid():
+                    if self._loop_pid is not None:
+                        self.database.forget()
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="pg-store", daemon=True)
+                    thread.start()
+                    asyncio.run_coroutine_threadsafe(self._connect(), loop).result()
+                    self._loop, self._loop_thread, self._loop_pid = loop, thread, os.getpid()
+        return self._loop
+
+    async def _connect(self) -> None:
+        await self.database.connect()
+        await self.database.listen(self._publish)
+
+    def run(self, coro: Awaitable[T]) -> "asyncio.Future[T]":
+        """Await a PgDatabase coroutine from any event loop (it runs on the store loop)."""
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._process_loop()))
+
+    def call(self, coro: Awaitable[T]) -> T:
+        """Run a PgDatabase coroutine on the store loop and wait for it; not allowed on an event loop thread."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run_coroutine_threadsafe(coro, self._process_loop()).result()
+        coro.close()
+        raise RuntimeError("PgStore: a sync catalog call here would block the event loop; "
+                           "await store.run(store.database...) or call it from a worker thread")
+
+    def _publish(self, version: int, count: int) -> PgCatalog:
+        """Make version current unless a newer one already is (writes here, NOTIFY from other processes)."""
+        with self._publish_lock:
+            if self._snapshot is None or version > self._snapshot.version:
+                self._snapshot = PgCatalog(self, version, count)
+            return self._snapshot
+
+    def close(self) -> None:
+        super().close()
+        if self._loop is not None and self._loop_pid == os.getpid():
+            asyncio.run_coroutine_threadsafe(self.database.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
+        self._loop = self._loop_thread = self._loop_pid = None
+
+    # ── Catalog mutations ──
+
+    def upsert_offers(self, offers: Iterable[Mapping]) -> list[str]:
+        """Insert or replace offers by id; returns the ids written (see InMemoryStore.upsert_offers)."""
+        dim = get_settings().EMBEDDING_DIM
+        upserts = self._prepare(offers, dim)
+        version, count, _ = self.call(self.database.write(upserts))
+        self._publish(version, count)
+        return [record["id"] for record, _ in upserts]
+
+    def delete_offers(self, offer_ids: Iterable[str]) -> list[str]:
+        """Delete offers by id; returns the ids that existed."""
+        version, count, deleted = self.call(self.database.write([], offer_ids))
+        self._publish(version, count)
+        return deleted
+
+    def compact(self) -> None:
+        """VACUUM ANALYZE the offers table."""
+        t0 = time.perf_counter()
+        self.call(self.database.vacuum())
+        logger.info("store.compacted", extra={"ms": round((time.perf_counter() - t0) * 1000, 1)})
+
+    def reload(self, offers: Optional[Iterable[Mapping]] = None) -> Future:
+        """Replace the catalog with offers in one transaction; None re-reads the version from the
+        database. Searches keep reading the old rows until the commit. The Future resolves to the new version."""
+        return asyncio.run_coroutine_threadsafe(
+            self._replace(None if offers is None else list(offers)), self._process_loop(),
+        )
+
+    async def _replace(self, offers: Optional[list[Mapping]]) -> int:
+        t0 = time.perf_counter()
+        if offers is None:
+            version, count = await self.database.meta()
+        else:
+            # Embedding the offers is CPU work; keep it off the store loop
+            records, embeddings = await asyncio.to_thread(self._prepare_catalog, offers)
+            version, count, _ = await self.database.write(list(zip(records, embeddings)), replace=True)
+        catalog = self._publish(version, count)
+        logger.info("store.reloaded", extra={
+            "offers": len(catalog), "version": catalog.version, "ms": round((time.perf_counter() - t0) * 1000, 1),
+        })
+        return catalog.version
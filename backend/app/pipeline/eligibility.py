@@ -6,7 +6,7 @@ import logging
 import time
 
 from app.store import get_store
-from app.pipeline.state import SearchState
+from app.pipeline.state import SearchState, tracing
 
 logger = logging.getLogger(__name__)
 
@@ -80,11 +80,13 @@ def eligibility_node(state: SearchState) -> dict:
         "capped": capped,
     })
 
+    out = {"ranked": ranked}
     elapsed = round((time.perf_counter() - t0) * 1000, 1)
-    trace = list(state.get("debug_trace", []))
-    trace.append({
-        "step": "eligibility",
-        "ms": elapsed,
-        "notes": f"preview applied to {len(ranked)} items, {capped} capped above spending power",
-    })
-    return {"ranked": ranked, "debug_trace": trace}
+    out["step_ms"] = {"eligibility": elapsed}
+    if tracing(state):
+        out["debug_trace"] = [{
+            "step": "eligibility",
+            "ms": elapsed,
+            "notes": f"preview applied to {len(ranked)} items, {capped} capped above spending power",
+        }]
+    return out
@@ -1,10 +1,25 @@
-"""LangGraph orchestrator: wires pipeline nodes into a stateful graph."""
+"""LangGraph orchestrator: wires pipeline nodes into a stateful graph.
+
+run_search awaits the graph on the serving event loop, and every node is a
+coroutine. LangGraph would hand a plain function to the loop's default thread
+pool, one hop per node, with every request sharing those few threads. So the
+cheap nodes (ingress, intent, router, rank, eligibility, summarize: regexes
+and sorts over at most 50 candidates) run inline on the loop. retrieve and
+rerank are async themselves and await their heavy work (embedding, index
+scans, catalog queries, cross-encoder predict) on the bounded executor pools
+(app/executors.py), so the loop never blocks on it.
+
+Before any of that, run_search looks the search up in the result cache
+(app/search_cache.py); a hit returns without invoking the graph.
+"""
 
 from __future__ import annotations
 
+import functools
 import logging
+import time
 import uuid
-from typing import Literal
+from typing import Callable, Literal
 
 from langgraph.graph import StateGraph, END
 
@@ -16,6 +31,7 @@ from app.pipeline.rerank import rerank_node
 from app.pipeline.rank import rank_node
 from app.pipeline.eligibility import eligibility_node
 from app.pipeline.summarize import summarize_node
+from app.search_cache import get_search_cache, profile_version, search_key
 from app.store import get_store
 
 logger = logging.getLogger(__name__)
@@ -52,19 +68,27 @@ def route_after_router(state: SearchState) -> Literal["retrieve"]:
     return "retrieve"
 
 
+def _inline(node: Callable[[SearchState], dict]):
+    """A cheap sync node as a coroutine, so LangGraph runs it on the loop instead of a thread."""
+    @functools.wraps(node)
+    async def run(state: SearchState) -> dict:
+        return node(state)
+    return run
+
+
 def build_search_graph() -> StateGraph:
     """Construct the LangGraph search pipeline."""
     graph = StateGraph(SearchState)
 
     # Add nodes
-    graph.add_node("ingress", ingress_node)
-    graph.add_node("intent", intent_node)
-    graph.add_node("router", router_node)
+    graph.add_node("ingress", _inline(ingress_node))
+    graph.add_node("intent", _inline(intent_node))
+    graph.add_node("router", _inline(router_node))
     graph.add_node("retrieve", retrieve_node)
     graph.add_node("rerank", rerank_node)
-    graph.add_node("rank", rank_node)
-    graph.add_node("eligibility", eligibility_node)
-    graph.add_node("summarize", summarize_node)
+    graph.add_node("rank", _inline(rank_node))
+    graph.add_node("eligibility", _inline(eligibility_node))
+    graph.add_node("summarize", _inline(summarize_node))
 
     # Wire edges
     graph.set_entry_point("ingress")
@@ -107,12 +131,36 @@ async def run_search(
     user_id: str = "demo-user",
     refine: dict | None = None,
     personalized: bool = True,
+    trace: bool = True,
+    cached: bool = True,
 ) -> SearchState:
-    """Execute the full agentic search pipeline."""
+    """Execute the full agentic search pipeline.
+
+    With trace=False the nodes build no debug_trace steps at all (it stays empty);
+    step_ms, each node's latency, is filled either way.
+    With cached=True a repeated search is answered from the result cache: a
+    read-only result whose step_ms and debug_trace are one "cache" step.
+    """
+    t0 = time.perf_counter()
     request_id = str(uuid.uuid4())[:8]
     logger.info("pipeline.start", extra={"request_id": request_id, "query": query[:100]})
 
     store = get_store()
+    catalog = store.snapshot()
+    cache = get_search_cache() if cached else None
+    if cache is not None and cache.capacity > 0:
+        key = search_key(query, refine, personalized)
+        epoch = (catalog.version, profile_version(store))
+        hit = cache.get(key, epoch)
+        if hit is not None:
+            result, saved_ms = hit
+            elapsed = round((time.perf_counter() - t0) * 1000, 1)
+            logger.info("pipeline.cache_hit", extra={"request_id": request_id, "saved_ms": saved_ms})
+            step = {"step": "cache", "ms": elapsed, "notes": f"hit, saved {saved_ms:.1f}ms, catalog v{catalog.version}"}
+            return {
+                **result, "query": query, "request_id": request_id,
+                "step_ms": {"cache": elapsed}, "debug_trace": [step] if trace else [],
+            }
     user_profile = {
         **store.user,
         "existing_monthly": sum(p["monthlyPayment"] for p in store.plans),
@@ -126,9 +174,11 @@ async def run_search(
         "user_id": user_id,
         "personalized": personalized,
         "user_profile": user_profile,
+        "catalog": catalog,
         "parsed_constraints": {},
         "route": "",
         "candidates": [],
+        "candidate_scores": {},
         "reranked": [],
         "ranked": [],
         "ai_summary": "",
@@ -136,6 +186,8 @@ async def run_search(
         "monthly_impact": [],
         "disclaimers": [],
         "error": None,
+        "step_ms": {},
+        "trace": trace,
         "debug_trace": [],
         "applied_constraints": {},
         "why_this_recommendation": "",
@@ -150,6 +202,8 @@ async def run_search(
 
     graph = get_search_graph()
     result = await graph.ainvoke(initial_state)
+    if cache is not None and cache.capacity > 0 and not result.get("error"):
+        cache.put(key, epoch, result, (time.perf_counter() - t0) * 1000)
 
     logger.info("pipeline.done", extra={
         "request_id": request_id,
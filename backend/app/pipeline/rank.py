@@ -5,77 +5,91 @@ from __future__ import annotations
 import logging
 import time
 
-from app.pipeline.state import SearchState
+import numpy as np
+
+from app.pipeline.state import SearchState, score_column, tracing
 
 logger = logging.getLogger(__name__)
 
 CONFIDENCE_SCORES = {"high": 1.0, "med": 0.6, "low": 0.3}
+MAX_RESULTS = 5
 
 
 def rank_node(state: SearchState) -> dict:
-    """Score and rank reranked candidates by affordability, APR, confidence, and rerank score."""
+    """Score and rank reranked candidates by affordability, APR, confidence, and rerank score.
+
+    Scoring runs over arrays in rerank order; only the top MAX_RESULTS candidates
+    are materialized into response dicts (carrying _rank_score).
+    """
     t0 = time.perf_counter()
     request_id = state.get("request_id", "unknown")
-    reranked = state.get("reranked", [])
+    candidates = state.get("candidates", [])
+    order = state.get("reranked", [])
     constraints = state.get("parsed_constraints", {})
     sort_mode = constraints.get("sort")
-    logger.info("rank.start", extra={"request_id": request_id, "count": len(reranked)})
+    logger.info("rank.start", extra={"request_id": request_id, "count": len(order)})
 
-    if not reranked:
+    if not order:
         return {"ranked": []}
 
+    offers = [candidates[i] for i in order]
+    monthly = np.array([o["monthlyPayment"] for o in offers], dtype=np.float64)
+    total = np.array([o["totalPrice"] for o in offers], dtype=np.float64)
+    apr = np.array([o["apr"] for o in offers], dtype=np.float64)
+    confidence = np.array([CONFIDENCE_SCORES.get(o["eligibilityConfidence"], 0.5) for o in offers])
+    rerank = score_column(state, "rerank")[order]
+    rerank[np.isnan(rerank)] = 0.5
+
     # Normalize values for scoring
-    max_monthly = max(o["monthlyPayment"] for o in reranked) or 1
-    max_total = max(o["totalPrice"] for o in reranked) or 1
-    max_apr = max(o["apr"] for o in reranked) or 1
-
-    for o in reranked:
-        # Component scores (0-1, higher is better)
-        affordability = 1.0 - (o["monthlyPayment"] / max_monthly)
-        apr_score = 1.0 - (o["apr"] / max_apr) if max_apr > 0 else 1.0
-        confidence = CONFIDENCE_SCORES.get(o["eligibilityConfidence"], 0.5)
-        rerank = o.get("_rerank_score", 0.5)
-        total_score = 1.0 - (o["totalPrice"] / max_total)
-
-        # Weighted composite — weights shift based on sort mode
-        if sort_mode == "lowest_monthly":
-            score = affordability * 0.5 + apr_score * 0.15 + confidence * 0.15 + rerank * 0.2
-        elif sort_mode == "lowest_total":
-            score = total_score * 0.5 + apr_score * 0.15 + confidence * 0.15 + rerank * 0.2
-        elif sort_mode == "shortest_term":
-            term_score = 1.0 - (o["termMonths"] / 24)
-            score = term_score * 0.4 + affordability * 0.2 + confidence * 0.2 + rerank * 0.2
-        else:
-            # Default: balanced
-            score = affordability * 0.3 + apr_score * 0.2 + confidence * 0.2 + rerank * 0.3
-
-        # Penalty for items that violate user's explicit constraints (from relaxation padding)
-        # Heavy penalty ensures strict-matching items always rank above violators
-        penalty = 0.0
-        if constraints.get("max_price") is not None and o["totalPrice"] > constraints["max_price"]:
-            penalty += 0.6
-        if constraints.get("max_monthly") is not None and o["monthlyPayment"] > constraints["max_monthly"]:
-            penalty += 0.6
-        if constraints.get("only_zero_apr") and o["apr"] != 0:
-            penalty += 0.5
-        if constraints.get("category") and o.get("category") != constraints["category"]:
-            penalty += 0.5
-
-        o["_rank_score"] = max(score - penalty, 0.0)
-
-    ranked = sorted(reranked, key=lambda x: x.get("_rank_score", 0), reverse=True)
-
-    # Cap at 5 results (1 recommended + 4 alternatives)
-    ranked = ranked[:5]
+    max_monthly = monthly.max() or 1
+    max_total = total.max() or 1
+    max_apr = apr.max() or 1
+
+    # Component scores (0-1, higher is better)
+    affordability = 1.0 - (monthly / max_monthly)
+    apr_score = 1.0 - (apr / max_apr) if max_apr > 0 else np.ones(len(offers))
+    total_score = 1.0 - (total / max_total)
+
+    # Weighted composite — weights shift based on sort mode
+    if sort_mode == "lowest_monthly":
+        score = affordability * 0.5 + apr_score * 0.15 + confidence * 0.15 + rerank * 0.2
+    elif sort_mode == "lowest_total":
+        score = total_score * 0.5 + apr_score * 0.15 + confidence * 0.15 + rerank * 0.2
+    elif sort_mode == "shortest_term":
+        term_score = 1.0 - (np.array([o["termMonths"] for o in offers], dtype=np.float64) / 24)
+        score = term_score * 0.4 + affordability * 0.2 + confidence * 0.2 + rerank * 0.2
+    else:
+        # Default: balanced
+        score = affordability * 0.3 + apr_score * 0.2 + confidence * 0.2 + rerank * 0.3
+
+    # Penalty for items that violate user's explicit constraints (from relaxation padding)
+    # Heavy penalty ensures strict-matching items always rank above violators
+    penalty = np.zeros(len(offers))
+    if constraints.get("max_price") is not None:
+        penalty += np.where(total > constraints["max_price"], 0.6, 0.0)
+    if constraints.get("max_monthly") is not None:
+        penalty += np.where(monthly > constraints["max_monthly"], 0.6, 0.0)
+    if constraints.get("only_zero_apr"):
+        penalty += np.where(apr != 0, 0.5, 0.0)
+    if constraints.get("category"):
+        penalty += np.array([0.5 if o.get("category") != constraints["category"] else 0.0 for o in offers])
+
+    rank_score = np.maximum(score - penalty, 0.0)
+
+    # Cap at 5 results (1 recommended + 4 alternatives); stable, so ties keep rerank order
+    top = np.argsort(-rank_score, kind="stable")[:MAX_RESULTS]
+    ranked = [{**offers[i], "_rank_score": float(rank_score[i])} for i in top.tolist()]
 
     logger.info("rank.done", extra={
         "request_id": request_id,
         "top": ranked[0]["productName"] if ranked else "none",
     })
 
+    out = {"ranked": ranked}
     elapsed = round((time.perf_counter() - t0) * 1000, 1)
-    trace = list(state.get("debug_trace", []))
-    mode = sort_mode or "balanced"
-    top_name = ranked[0]["productName"] if ranked else "none"
-    trace.append({"step": "rank", "ms": elapsed, "notes": f"mode={mode}, top={top_name}, scored {len(ranked)} items"})
-    return {"ranked": ranked, "debug_trace": trace}
+    out["step_ms"] = {"rank": elapsed}
+    if tracing(state):
+        mode = sort_mode or "balanced"
+        top_name = ranked[0]["productName"] if ranked else "none"
+        out["debug_trace"] = [{"step": "rank", "ms": elapsed, "notes": f"mode={mode}, top={top_name}, scored {len(ranked)} items"}]
+    return out
@@ -2,13 +2,19 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import math
 import re
 import time
+from collections.abc import Mapping
 from typing import Optional
 
+import numpy as np
+
 from app.config import get_settings
-from app.pipeline.state import SearchState
+from app.executors import get_executors
+from app.pipeline.state import SearchState, score_column, tracing
 
 logger = logging.getLogger(__name__)
 
@@ -42,17 +48,17 @@ def _normalize_tokens(text: str) -> set[str]:
     return set(t for t in tokens if len(t) > 1)
 
 
-def _deterministic_rerank_score(query: str, offer: dict) -> float:
-    """Fallback reranker: normalized keyword overlap + similarity score."""
-    query_tokens = _normalize_tokens(query)
+def _deterministic_rerank_score(query_tokens: set[str], offer: Mapping, similarity: float) -> float:
+    """Fallback reranker: normalized keyword overlap + similarity score (0.5 when unscored)."""
     text = f"{offer.get('category', '')} {offer.get('merchantName', '')} {offer.get('productName', '')}"
     offer_tokens = _normalize_tokens(text)
     overlap = len(query_tokens & offer_tokens)
-    similarity = offer.get("_similarity", 0.5)
+    if math.isnan(similarity):
+        similarity = 0.5
     return overlap * 0.3 + similarity * 0.7
 
 
-def _category_preference_boost(offer: dict, constraints: dict) -> float:
+def _category_preference_boost(offer: Mapping, constraints: dict) -> float:
     """Boost offers matching the detected category or brand keywords. Clamped to MAX_CATEGORY_BOOST."""
     boost = 0.0
     target_cat = constraints.get("category")
@@ -68,9 +74,23 @@ def _category_preference_boost(offer: dict, constraints: dict) -> float:
     return min(boost, MAX_CATEGORY_BOOST)
 
 
-def rerank_node(state: SearchState) -> dict:
+def _fallback_scores(
+    query_tokens: set[str], offers: list[Mapping], similarity: list[float], constraints: dict, personalized: bool,
+) -> list[float]:
+    """Deterministic rerank scores for a batch. Pure Python, so large batches go to the process pool."""
+    return [
+        _deterministic_rerank_score(query_tokens, o, s)
+        + (_category_preference_boost(o, constraints) if personalized else 0.0)
+        for o, s in zip(offers, similarity)
+    ]
+
+
+async def rerank_node(state: SearchState) -> dict:
     """Rerank: semantic relevance (BGE / keyword fallback) + category/brand preference.
-    Only scores top RERANK_TOP_K candidates; tail candidates keep original order."""
+    Only scores top RERANK_TOP_K candidates; tail candidates keep original order.
+
+    Returns the rerank order as candidate indices plus a "rerank" score side-array;
+    candidate records are not touched."""
     t0 = time.perf_counter()
     request_id = state.get("request_id", "unknown")
     query = state.get("sanitized_query", "")
@@ -87,9 +107,10 @@ def rerank_node(state: SearchState) -> dict:
     rerank_timeout_ms = settings.RERANK_TIMEOUT_MS
 
     head = candidates[:rerank_top_k]
-    tail = candidates[rerank_top_k:]
+    rerank_scores = np.full(len(candidates), np.nan)
 
-    reranker = _get_reranker()
+    # The first request loads the model, off the event loop
+    reranker = _reranker if _reranker is not None or settings.RERANKER_MODEL == "none" else await asyncio.to_thread(_get_reranker)
     used_model = False
     timed_out = False
 
@@ -102,36 +123,49 @@ def rerank_node(state: SearchState) -> dict:
             (query, f"{c['merchantName']} {c['productName']} ${c['totalPrice']} {c['apr']}% APR {c['termMonths']} months {c['category']}")
             for c in head
         ]
-        scores = reranker.predict(pairs)
+        # torch releases the GIL: run on the bounded thread pool under the rerank stage limit
+        scores = await get_executors().arun("rerank", "thread", reranker.predict, pairs)
         rerank_elapsed = (time.perf_counter() - rerank_t0) * 1000
         if rerank_elapsed > rerank_timeout_ms:
             timed_out = True
             logger.warning("rerank.timeout", extra={"request_id": request_id, "ms": rerank_elapsed})
         for i, c in enumerate(head):
             boost = _category_preference_boost(c, constraints) if personalized else 0.0
-            c["_rerank_score"] = float(scores[i]) + boost
+            rerank_scores[i] = float(scores[i]) + boost
         used_model = True
     else:
         # Deterministic fallback (fast-path): keyword overlap + similarity + category preference
-        for c in head:
-            boost = _category_preference_boost(c, constraints) if personalized else 0.0
-            c["_rerank_score"] = _deterministic_rerank_score(query, c) + boost
-
-    # Sort head by rerank score descending, append unsorted tail
-    reranked = sorted(head, key=lambda x: x.get("_rerank_score", 0), reverse=True) + tail
+        query_tokens = _normalize_tokens(query)
+        similarity = score_column(state, "similarity")
+        # Only the fields the scorer reads, so a process-pool batch pickles small dicts, not records
+        offers = [{k: c.get(k, "") for k in ("category", "merchantName", "productName")} for c in head]
+        kind = "process" if len(head) >= settings.EXEC_PROCESS_MIN_ITEMS else "inline"
+        scores = await get_executors().arun(
+            "rerank", kind, _fallback_scores,
+            query_tokens, offers, [float(s) for s in similarity[:len(head)]], constraints, personalized,
+        )
+        rerank_scores[:len(head)] = scores
+
+    # Sort head by rerank score descending (stable), append unsorted tail
+    head_order = np.argsort(-rerank_scores[:len(head)], kind="stable")
+    reranked = head_order.tolist() + list(range(len(head), len(candidates)))
+    top_score = float(rerank_scores[reranked[0]]) if reranked and not math.isnan(rerank_scores[reranked[0]]) else 0.0
 
     logger.info("rerank.done", extra={
         "request_id": request_id,
         "reranked_count": len(head),
-        "top_score": reranked[0].get("_rerank_score", 0) if reranked else 0,
+        "top_score": top_score,
     })
 
+    candidate_scores = {**state.get("candidate_scores", {}), "rerank": rerank_scores}
+    out = {"reranked": reranked, "candidate_scores": candidate_scores}
     elapsed = round((time.perf_counter() - t0) * 1000, 1)
-    trace = list(state.get("debug_trace", []))
-    mode = "full-rerank" if used_model else "fast-path"
-    method = "bge-crossencoder" if used_model else "keyword+similarity"
-    top_str = f", top={reranked[0].get('_rerank_score', 0):.2f}" if reranked else ""
-    pers_str = ", personalized" if personalized else ", generic"
-    timeout_str = ", TIMEOUT" if timed_out else ""
-    trace.append({"step": "rerank", "ms": elapsed, "notes": f"mode={mode}, {method}, scored {len(head)}/{len(candidates)}{top_str}{pers_str}{timeout_str}"})
-    return {"reranked": reranked, "debug_trace": trace}
+    out["step_ms"] = {"rerank": elapsed}
+    if tracing(state):
+        mode = "full-rerank" if used_model else "fast-path"
+        method = "bge-crossencoder" if used_model else "keyword+similarity"
+        top_str = f", top={top_score:.2f}" if reranked else ""
+        pers_str = ", personalized" if personalized else ", generic"
+        timeout_str = ", TIMEOUT" if timed_out else ""
+        out["debug_trace"] = [{"step": "rerank", "ms": elapsed, "notes": f"mode={mode}, {method}, scored {len(head)}/{len(candidates)}{top_str}{pers_str}{timeout_str}"}]
+    return out
@@ -2,23 +2,50 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import math
 import time
 
+import numpy as np
+
+from app.config import get_settings
+from app.executors import get_executors
+from app.records import Hit, OfferRecord
 from app.store import get_store
-from app.pipeline.state import SearchState
+from app.pipeline.state import SearchState, tracing
 
 logger = logging.getLogger(__name__)
 
 MAX_CANDIDATES = 50
 
 
-def retrieve_node(state: SearchState) -> dict:
+def _vector_leg(store, catalog, query: str, constraints: dict) -> tuple[np.ndarray, list[Hit], None]:
+    """Embed the query and search the vector index (the embedding is kept for relaxation)."""
+    embedding = store.get_embedding(query)
+    return embedding, catalog.vector_search(embedding, 20, constraints), None
+
+
+def _hybrid_leg(store, catalog, query: str, constraints: dict) -> tuple[np.ndarray, list[Hit], list[Hit]]:
+    """Both legs in one catalog call (database backends); shaped like _vector_leg plus the BM25 hits."""
+    embedding = store.get_embedding(query)
+    return (embedding, *catalog.hybrid_search(embedding, query, 20, constraints))
+
+
+def _head(catalog) -> list[OfferRecord]:
+    return list(catalog.offers[:MAX_CANDIDATES])
+
+
+async def retrieve_node(state: SearchState) -> dict:
     """Retrieve candidate offers via hybrid search (vector + BM25) + constraint filters.
 
+    Constraints are pushed into both searches, so each leg returns its top-k among
+    eligible offers only; an unfiltered vector search runs only for relaxation.
+    The legs run concurrently, so retrieve costs the slower leg rather than the sum.
+
     Circuit breakers:
-      - If embedder fails → fall back to BM25-only retrieval
-      - If BM25 also fails → fall back to unfiltered store offers
+      - If embedder fails (or the vector leg is late) → fall back to BM25-only retrieval
+      - If BM25 also fails (or is late) → fall back to unfiltered store offers
     """
     t0 = time.perf_counter()
     request_id = state.get("request_id", "unknown")
@@ -27,65 +54,101 @@ def retrieve_node(state: SearchState) -> dict:
     logger.info("retrieve.start", extra={"request_id": request_id})
 
     store = get_store()
+    # Both legs run at once on the executor thread pool, under the "retrieve" stage limit.
+    # Each gets at most RETRIEVE_TIMEOUT_MS; a late leg is left to finish in the pool and
+    # counts as failed (same breakers as an exception), noted in the trace.
+    executors = get_executors()
+    timeout_ms = get_settings().RETRIEVE_TIMEOUT_MS
+    # All catalog reads go to one snapshot, so a concurrent update or reload can't tear them
+    catalog = state.get("catalog")
+    if catalog is None:
+        catalog = store.snapshot()
     retrieval_path = "hybrid"
-
-    # Step 1a: Vector similarity search (with circuit breaker)
-    vector_results: list[dict] = []
+    late: list[str] = []
+    # Database catalogs (app/pg_store.py) answer both legs in one round trip
+    hybrid = getattr(catalog, "hybrid_search", None) is not None
+
+    async def leg(name: str, fn, *args):
+        try:
+            return await asyncio.wait_for(
+                executors.arun("retrieve", "thread", fn, *args), timeout_ms / 1000 if timeout_ms > 0 else None,
+            )
+        except asyncio.TimeoutError:
+            late.append(name)
+            raise TimeoutError(f"{name} leg exceeded RETRIEVE_TIMEOUT_MS={timeout_ms}") from None
+
+    # Step 1a/1b: vector similarity and BM25 lexical legs, concurrently (each with its circuit breaker)
+    if hybrid:
+        vector_leg = asyncio.ensure_future(leg("hybrid", _hybrid_leg, store, catalog, query, constraints))
+        bm25_leg = None
+    else:
+        vector_leg = asyncio.ensure_future(leg("vector", _vector_leg, store, catalog, query, constraints))
+        bm25_leg = asyncio.ensure_future(leg("bm25", catalog.bm25_search, query, 20, constraints))
+
+    vector_results: list[Hit] = []
+    bm25_results: list[Hit] = []
+    query_embedding = None
     try:
-        query_embedding = store.get_embedding(query)
-        vector_results = store.vector_search(query_embedding, top_k=20)
+        query_embedding, vector_results, lexical = await vector_leg
+        if lexical is not None:
+            bm25_results = lexical
     except Exception as e:
         retrieval_path = "bm25-only"
         logger.warning("retrieve.vector_failed", extra={"request_id": request_id, "error": str(e)})
+        if bm25_leg is None:
+            bm25_leg = asyncio.ensure_future(leg("bm25", catalog.bm25_search, query, 20, constraints))
 
-    # Step 1b: BM25 lexical search (with circuit breaker)
-    bm25_results: list[dict] = []
     try:
-        bm25_results = store.bm25_search(query, top_k=20)
+        if bm25_leg is not None:
+            bm25_results = await bm25_leg
     except Exception as e:
         if retrieval_path == "bm25-only":
             retrieval_path = "fallback-unfiltered"
         logger.warning("retrieve.bm25_failed", extra={"request_id": request_id, "error": str(e)})
 
-    # Step 1c: Union + dedup (vector results take priority for _similarity)
-    seen_ids: set[str] = set()
-    merged: list[dict] = []
-    for o in vector_results:
-        if o["id"] not in seen_ids:
-            merged.append(o)
-            seen_ids.add(o["id"])
-    for o in bm25_results:
-        if o["id"] not in seen_ids:
-            merged.append(o)
-            seen_ids.add(o["id"])
+    # Step 1c: Union + dedup of the shared records (vector order first);
+    # scores go to side arrays aligned with merged, NaN where a leg missed the offer
+    merged: list[OfferRecord] = []
+    similarity: list[float] = []
+    bm25: list[float] = []
+    position: dict[str, int] = {}
+    for h in vector_results:
+        if h["id"] not in position:
+            position[h["id"]] = len(merged)
+            merged.append(h.record)
+            similarity.append(h.score)
+            bm25.append(math.nan)
+    for h in bm25_results:
+        i = position.get(h["id"])
+        if i is not None:
+            bm25[i] = h.score
+            continue
+        position[h["id"]] = len(merged)
+        merged.append(h.record)
+        similarity.append(math.nan)
+        bm25.append(h.score)
 
     # Fallback: if both search paths failed, use raw store offers
     if not merged and retrieval_path == "fallback-unfiltered":
         logger.warning("retrieve.total_fallback", extra={"request_id": request_id})
-        merged = [dict(o) for o in store.offers[:MAX_CANDIDATES]]
+        merged = await executors.arun("retrieve", "thread", _head, catalog)
+        similarity = [math.nan] * len(merged)
+        bm25 = [math.nan] * len(merged)
 
     merged = merged[:MAX_CANDIDATES]
+    similarity = similarity[:MAX_CANDIDATES]
+    bm25 = bm25[:MAX_CANDIDATES]
 
-    bm25_only_count = len([o for o in merged if "_bm25_score" in o and "_similarity" not in o])
-
-    # Step 2: Apply structured filters from parsed constraints
-    filtered = merged
-    category = constraints.get("category")
-    max_price = constraints.get("max_price")
-    max_monthly = constraints.get("max_monthly")
-    only_zero_apr = constraints.get("only_zero_apr", False)
-
-    if category:
-        filtered = [o for o in filtered if o["category"] == category]
-
-    if max_price is not None:
-        filtered = [o for o in filtered if o["totalPrice"] <= max_price]
-
-    if max_monthly is not None:
-        filtered = [o for o in filtered if o["monthlyPayment"] <= max_monthly]
+    bm25_only_count = sum(1 for v, b in zip(similarity, bm25) if math.isnan(v) and not math.isnan(b)) if tracing(state) else 0
 
-    if only_zero_apr:
-        filtered = [o for o in filtered if o["apr"] == 0]
+    # Step 2: Apply structured filters from parsed constraints (one vectorized mask).
+    # The search legs are already filtered; this guards the unfiltered fallback.
+    # Like every catalog read here it runs off the event loop (database catalogs query).
+    allowed = await executors.arun("retrieve", "thread", catalog.eligible, [o["id"] for o in merged], constraints)
+    keep = [i for i, ok in enumerate(allowed) if ok]
+    filtered = [merged[i] for i in keep]
+    similarity = [similarity[i] for i in keep]
+    bm25 = [bm25[i] for i in keep]
 
     # If filters are too aggressive and we have < 3 results, relax by padding from vector pool
     relaxed_triggered = False
@@ -98,10 +161,18 @@ def retrieve_node(state: SearchState) -> dict:
             "relaxing": True,
         })
         seen_ids = {o["id"] for o in filtered}
-        for o in vector_results:
-            if o["id"] not in seen_ids:
-                filtered.append(o)
-                seen_ids.add(o["id"])
+        relaxed_pool: list[Hit] = []
+        if query_embedding is not None:
+            try:
+                relaxed_pool = await executors.arun("retrieve", "thread", catalog.vector_search, query_embedding, 20)
+            except Exception as e:
+                logger.warning("retrieve.relax_failed", extra={"request_id": request_id, "error": str(e)})
+        for h in relaxed_pool:
+            if h["id"] not in seen_ids:
+                filtered.append(h.record)
+                similarity.append(h.score)
+                bm25.append(math.nan)
+                seen_ids.add(h["id"])
             if len(filtered) >= 8:
                 break
 
@@ -111,10 +182,21 @@ def retrieve_node(state: SearchState) -> dict:
         "relaxed": relaxed_triggered,
     })
 
+    out = {
+        "candidates": filtered,
+        "candidate_scores": {
+            "similarity": np.array(similarity, dtype=np.float64),
+            "bm25": np.array(bm25, dtype=np.float64),
+        },
+    }
     elapsed = round((time.perf_counter() - t0) * 1000, 1)
-    trace = list(state.get("debug_trace", []))
-    notes = f"{retrieval_path} → {len(merged)} merged, {bm25_only_count} bm25-only → {len(filtered)} after filter"
-    if relaxed_triggered:
-        notes += f" (relaxed from {strict_count})"
-    trace.append({"step": "retrieve", "ms": elapsed, "notes": notes})
-    return {"candidates": filtered, "debug_trace": trace}
+    out["step_ms"] = {"retrieve": elapsed}
+    if tracing(state):
+        notes = f"{retrieval_path} → {len(merged)} merged, {bm25_only_count} bm25-only → {len(filtered)} after filter"
+        if relaxed_triggered:
+            notes += f" (relaxed from {strict_count})"
+        if late:
+            notes += f" ({', '.join(late)} leg late > {timeout_ms}ms)"
+        notes += f", catalog v{catalog.version}"
+        out["debug_trace"] = [{"step": "retrieve", "ms": elapsed, "notes": notes}]
+    return out
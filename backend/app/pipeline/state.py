@@ -2,7 +2,13 @@
 
 from __future__ import annotations
 
-from typing import TypedDict, Optional, Any
+import operator
+from collections.abc import Mapping
+from typing import Annotated, TypedDict, Optional, Any
+
+import numpy as np
+
+from app.catalog import CatalogSnapshot
 
 
 class ParsedConstraints(TypedDict, total=False):
@@ -33,12 +39,18 @@ class SearchState(TypedDict, total=False):
     # User profile context (loaded from store)
     user_profile: dict
 
+    # Catalog version pinned for the whole request (reloads swap in new snapshots)
+    catalog: CatalogSnapshot
+
     # Pipeline stages
     parsed_constraints: ParsedConstraints
     route: str  # "simple" | "complex"
-    candidates: list[dict]
-    reranked: list[dict]
-    ranked: list[dict]
+    candidates: list[Mapping]  # shared OfferRecords; never mutated per request
+    # Per-request scores as float arrays aligned with candidates (NaN = not scored):
+    # "similarity", "bm25" (retrieve), "rerank" (rerank)
+    candidate_scores: dict[str, np.ndarray]
+    reranked: list[int]  # candidate indices in rerank order
+    ranked: list[dict]  # final top results, materialized response dicts
 
     # Output
     ai_summary: str
@@ -47,7 +59,25 @@ class SearchState(TypedDict, total=False):
     disclaimers: list[str]
     error: Optional[str]
 
-    # Agentic trace (dev only)
-    debug_trace: list[dict]
+    # Per-node latency (always recorded, for search events): each node returns {step: ms}, the reducer merges
+    step_ms: Annotated[dict[str, float], operator.or_]
+    # Agentic trace (dev only): with trace off, nodes skip building their step entirely;
+    # with it on, each node returns just its own step and the reducer appends it
+    trace: bool
+    debug_trace: Annotated[list[dict], operator.add]
     applied_constraints: dict
     why_this_recommendation: str
+
+
+def tracing(state: SearchState) -> bool:
+    """Whether this request records a debug trace (on unless run_search turned it off)."""
+    return state.get("trace", True)
+
+
+def score_column(state: SearchState, name: str) -> np.ndarray:
+    """Side-array of one candidate score (NaN-filled when the stage did not run)."""
+    n = len(state.get("candidates", []))
+    column = state.get("candidate_scores", {}).get(name)
+    if column is None:
+        return np.full(n, np.nan)
+    return np.asarray(column, dtype=np.float64)
@@ -5,7 +5,7 @@ from __future__ import annotations
 import logging
 import time
 
-from app.pipeline.state import SearchState
+from app.pipeline.state import SearchState, tracing
 
 logger = logging.getLogger(__name__)
 
@@ -179,16 +179,16 @@ def summarize_node(state: SearchState) -> dict:
 
     logger.info("summarize.done", extra={"request_id": request_id, "summary_len": len(ai_summary)})
 
-    elapsed = round((time.perf_counter() - t0) * 1000, 1)
-    trace = list(state.get("debug_trace", []))
-    trace.append({"step": "summarize", "ms": elapsed, "notes": f"summary={len(ai_summary)} chars, reasons={len(ranked)} items"})
-
-    return {
+    out = {
         "ranked": ranked,
         "ai_summary": ai_summary,
         "refine_chips": REFINE_CHIPS,
         "monthly_impact": monthly_impact,
         "disclaimers": disclaimers,
         "why_this_recommendation": why,
-        "debug_trace": trace,
     }
+    elapsed = round((time.perf_counter() - t0) * 1000, 1)
+    out["step_ms"] = {"summarize": elapsed}
+    if tracing(state):
+        out["debug_trace"] = [{"step": "summarize", "ms": elapsed, "notes": f"summary={len(ai_summary)} chars, reasons={len(ranked)} items"}]
+    return out
@@ -0,0 +1,283 @@
+"""Compiled query understanding shared by the ingress and intent nodes.
+
+Everything is compiled once at import:
+
+  - one PII scanner: a single regex alternation over all PII_PATTERNS
+    (SSN, card, email, phone) substituted in one pass;
+  - one guardrail scanner: a single alternation over DISALLOWED_PATTERNS;
+  - an Aho-Corasick automaton over every CATEGORY_KEYWORDS keyword, so
+    category detection is one pass over the query whatever the keyword count.
+    The result matches the old nested loop: the first category in
+    CATEGORY_KEYWORDS order with any keyword occurring in the query;
+  - the intent regexes (price, monthly, 0% APR, tokens).
+
+Both scanners sit behind exact prefilters: each PII pattern needs an "@"
+or a digit run the hint regex finds quickly, and each guardrail pattern needs
+its leading word. A typical query never reaches the alternations.
+
+Input is capped at QUERY_MAX_CHARS, cut back to the last whitespace so a PII
+token is never split into an unrecognizable (and unredacted) fragment. The
+cap bounds the regex scans: the email pattern backtracks on long dotted runs.
+The automaton is linear anyway.
+
+parse_constraints() memoizes by sanitized query plus refine overrides in an LRU of
+QUERY_PARSE_CACHE_SIZE entries, so repeated queries skip parsing entirely.
+sanitize() memoizes raw queries the same way, but only those where no PII was
+found: a query that needed redacting is never kept.
+"""
+
+from __future__ import annotations
+
+import functools
+import re
+from typing import Optional
+
+from app.config import get_settings
+
+DISALLOWED_PATTERNS = [
+    r"hack\s+credit",
+    r"steal\s+identity",
+    r"fraud",
+    r"launder",
+    r"exploit\s+",
+    r"bypass\s+approval",
+]
+
+PII_PATTERNS = [
+    (r"\b\d{3}-\d{2}-\d{4}\b", "[SSN_REDACTED]"),        # SSN
+    (r"\b\d{16}\b", "[CARD_REDACTED]"),                     # Card number
+    (r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b", "[EMAIL_REDACTED]"),
+    (r"\b\d{3}[-.]\d{3}[-.]\d{4}\b", "[PHONE_REDACTED]"),
+]
+
+CATEGORY_KEYWORDS = {
+    "electronics": ["electronics", "laptop", "phone", "tablet", "headphone", "tv", "computer", "kindle", "ipad", "macbook", "samsung", "sony", "dell", "asus", "oled"],
+    "travel": ["trip", "travel", "vacation", "flight", "hotel", "beach", "ski", "resort", "cancun", "miami", "nyc", "costa rica", "denver"],
+    "sneakers": ["sneaker", "shoe", "jordan", "nike", "adidas", "new balance", "air max", "ultraboost"],
+    "home": ["sofa", "couch", "furniture", "mattress", "desk", "shelf", "table", "vacuum", "home upgrade"],
+    "fitness": ["fitness", "gym", "peloton", "bike", "garmin", "watch", "workout"],
+    "gaming": ["gaming", "ps5", "playstation", "xbox", "steam deck", "razer", "game"],
+    "fashion": ["fashion", "parka", "coat", "jacket", "designer"],
+    "appliances": ["fridge", "washer", "dryer", "appliance", "appliances", "coffee", "coffee machine", "breville"],
+}
+
+STOPWORDS = frozenset({
+    "a", "an", "the", "with", "and", "or", "for", "my", "me", "i", "under", "only", "just", "want", "need",
+    "looking", "find", "get", "buy", "plan", "try", "cheaper", "options",
+})
+
+_PII = re.compile("|".join(f"({pattern})" for pattern, _ in PII_PATTERNS))
+_PII_REPLACEMENTS = [None] + [replacement for _, replacement in PII_PATTERNS]  # by group number
+# Every PII match contains "@" or one of these; re skips straight to digits for a pattern that starts with one
+_PII_HINT = re.compile(r"\d{3}(?:[-.]|\d{13})")
+_DISALLOWED = re.compile("|".join(f"({pattern})" for pattern in DISALLOWED_PATTERNS), re.IGNORECASE)
+# The leading word each guardrail pattern needs ("" = none, always scan); checked on the lowercased query
+_DISALLOWED_HINTS = tuple(dict.fromkeys(m.group() if (m := re.match(r"[a-z]+", p)) else "" for p in DISALLOWED_PATTERNS))
+_PRICE = re.compile(r"under\s*\$\s*([\d,]+)(?!\s*/)")
+_MONTHLY = re.compile(r"under\s*\$\s*([\d,]+)\s*(?:/\s*mo|per\s*month|monthly)")
+_ZERO_APR = re.compile(r"0\s*%\s*apr|zero\s*%?\s*apr|no\s*interest")
+_TOKENS = re.compile(r"[a-z]+")
+
+
+_NONE = 1 << 30  # weight of "no keyword matched"
+
+
+class KeywordAutomaton:
+    """Aho-Corasick over weighted keywords: the lowest weight of any keyword occurring in a text."""
+
+    def __init__(self, keywords: dict[str, int]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        best = [_NONE]
+        for keyword, weight in keywords.items():
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    best.append(_NONE)
+                state = nxt
+            best[state] = min(best[state], weight)
+        # Failure links, breadth-first; a state's best also covers the keywords ending at its suffixes
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                best[nxt] = min(best[nxt], best[self._fail[nxt]])
+                queue.append(nxt)
+        self._best = best
+
+    def best(self, text: str) -> Optional[int]:
+        """The lowest weight among keywords occurring in text (None if none does)."""
+        goto, fail, best = self._goto, self._fail, self._best
+        state, found = 0, _NONE
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if best[state] < found:
+                found = best[state]
+                if found == 0:
+                    break
+        return None if found == _NONE else found
+
+
+_CATEGORIES = list(CATEGORY_KEYWORDS)
+_category_ranks: dict[str, int] = {}
+for _rank, _category in enumerate(_CATEGORIES):
+    for _kw in CATEGORY_KEYWORDS[_category]:
+        _category_ranks.setdefault(_kw, _rank)
+_CATEGORY_AUTOMATON = KeywordAutomaton(_category_ranks)
+
+
+def detect_category(text: str) -> Optional[str]:
+    rank = _CATEGORY_AUTOMATON.best(text)
+    return None if rank is None else _CATEGORIES[rank]
+
+
+def cap_query(query: str, limit: int) -> str:
+    """query cut to at most limit chars, at the last whitespace so no token is split.
+
+    Without whitespace to cut at (one long token), it is cut at limit instead.
+    """
+    if len(query) <= limit:
+        return query
+    head = query[:limit + 1]
+    cut = max(head.rfind(" "), head.rfind("\t"), head.rfind("\n"))
+    kept = head[:cut].rstrip() if cut > 0 else ""
+    return kept or query[:limit]
+
+
+class _Redacted(Exception):
+    """_scan found PII: the result is returned through the exception so lru_cache keeps no copy."""
+
+    def __init__(self, cleaned: str, blocked: Optional[str]) -> None:
+        self.result = cleaned, blocked
+
+
+@functools.lru_cache(maxsize=get_settings().QUERY_PARSE_CACHE_SIZE)
+def _scan(query: str, limit: int) -> tuple[str, Optional[str]]:
+    cleaned = cap_query(query, limit)
+    redacted = False
+    # The one-pass scanners are exact but try every alternative at every position; the hints rule most queries out
+    if "@" in cleaned or _PII_HINT.search(cleaned):
+        cleaned, redacted = _PII.subn(lambda m: _PII_REPLACEMENTS[m.lastindex], cleaned)
+    cleaned = " ".join(cleaned.lower().split())
+    blocked = None
+    for hint in _DISALLOWED_HINTS:
+        if hint in cleaned:
+            match = _DISALLOWED.search(cleaned)
+            blocked = None if match is None else DISALLOWED_PATTERNS[match.lastindex - 1]
+            break
+    if redacted:
+        raise _Redacted(cleaned, blocked)
+    return cleaned, blocked
+
+
+def sanitize(query: str) -> tuple[str, Optional[str]]:
+    """(cleaned query, matched disallowed pattern or None): PII redacted, lowercased, whitespace collapsed.
+
+    Memoized for queries without PII, the only ones whose raw text is safe to keep.
+    """
+    try:
+        return _scan(query.strip(), get_settings().QUERY_MAX_CHARS)
+    except _Redacted as redacted:
+        return redacted.result
+
+
+@functools.lru_cache(maxsize=get_settings().QUERY_PARSE_CACHE_SIZE)
+def _parse(
+    query: str, only_zero_apr: bool, max_monthly: Optional[float], sort: Optional[str], category: Optional[str],
+) -> tuple[dict, dict]:
+    constraints = {
+        "max_price": None,
+        "max_monthly": None,
+        "only_zero_apr": False,
+        "category": None,
+        "sort": None,
+        "raw_keywords": [],
+    }
+
+    # Apply client-side refine overrides first
+    if only_zero_apr:
+        constraints["only_zero_apr"] = True
+    if max_monthly:
+        constraints["max_monthly"] = max_monthly
+    if sort:
+        constraints["sort"] = sort
+    if category:
+        constraints["category"] = category
+
+    # Parse "under $X" (total price)
+    price_match = _PRICE.search(query)
+    if price_match:
+        constraints["max_price"] = float(price_match.group(1).replace(",", ""))
+
+    # Parse "under $X/mo" or "under $X per month" or "stay under $X/mo"
+    monthly_match = _MONTHLY.search(query)
+    if monthly_match:
+        val = float(monthly_match.group(1).replace(",", ""))
+        if constraints["max_monthly"] is None or val < constraints["max_monthly"]:
+            constraints["max_monthly"] = val
+
+    # Parse "0% APR" or "zero apr" or "no interest"
+    if _ZERO_APR.search(query):
+        constraints["only_zero_apr"] = True
+
+    # Detect category from keywords
+    if constraints["category"] is None:
+        constraints["category"] = detect_category(query)
+
+    # Extract remaining keywords (non-stopword tokens)
+    constraints["raw_keywords"] = [t for t in _TOKENS.findall(query) if t not in STOPWORDS and len(t) > 2]
+
+    # Build human-readable applied constraints
+    applied: dict = {}
+    if constraints.get("max_price") is not None:
+        applied["budget"] = f"${constraints['max_price']:.0f}"
+    if constraints.get("max_monthly") is not None:
+        applied["maxMonthly"] = f"${constraints['max_monthly']:.0f}/mo"
+    if constraints.get("only_zero_apr"):
+        applied["zeroApr"] = True
+    if constraints.get("category"):
+        applied["category"] = constraints["category"]
+    if constraints.get("sort"):
+        applied["sort"] = constraints["sort"]
+    return constraints, applied
+
+
+def parse_constraints(
+    query: str,
+    only_zero_apr: Optional[bool] = None,
+    max_monthly: Optional[float] = None,
+    sort: Optional[str] = None,
+    category: Optional[str] = None,
+) -> tuple[dict, dict]:
+    """(parsed constraints, applied constraints) of a sanitized query under refine overrides.
+
+    Memoized; each call returns its own copies, so callers may modify them.
+    """
+    constraints, applied = _parse(query, bool(only_zero_apr), max_monthly, sort, category)
+    return {**constraints, "raw_keywords": list(constraints["raw_keywords"])}, dict(applied)
+
+
+def _cache_stats(cached) -> dict:
+    info = cached.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "size": info.currsize,
+        "capacity": info.maxsize,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hitRate": round(info.hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+def cache_stats() -> dict:
+    """Hit rates of the sanitize and parse memos (served at GET /v1/metrics)."""
+    return {"sanitize": _cache_stats(_scan), "parse": _cache_stats(_parse)}
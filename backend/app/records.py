@@ -0,0 +1,130 @@
+"""Compact, immutable offer records shared across requests.
+
+The store holds one OfferRecord per offer. Search results and pipeline
+candidates reference these records instead of copying them; per-request scores
+live in side arrays (see SearchState.candidate_scores), and only the final
+ranked results are materialized into response dicts.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping, Sequence
+from typing import Any, Callable, Iterator
+
+OFFER_FIELDS = (
+    "id",
+    "merchantName",
+    "productName",
+    "category",
+    "totalPrice",
+    "termMonths",
+    "apr",
+    "monthlyPayment",
+    "eligibilityConfidence",
+    "imageUrl",
+    "reason",
+    "disclosure",
+)
+_FIELD_SET = frozenset(OFFER_FIELDS)
+
+
+class OfferRecord(Mapping):
+    """Read-only offer with a fixed slot layout (no per-instance __dict__).
+
+    Behaves as a Mapping so code written against offer dicts (o["apr"],
+    o.get("imageUrl")) keeps working.
+    """
+
+    __slots__ = OFFER_FIELDS
+
+    def __init__(self, **fields: Any) -> None:
+        for name in OFFER_FIELDS:
+            object.__setattr__(self, name, fields.get(name))
+
+    @classmethod
+    def from_dict(cls, offer: Mapping) -> "OfferRecord":
+        """Build from an offer dict; keys outside OFFER_FIELDS (e.g. embedding) are dropped."""
+        return cls(**{name: offer.get(name) for name in OFFER_FIELDS})
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("OfferRecord is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("OfferRecord is immutable")
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(OFFER_FIELDS)
+
+    def __len__(self) -> int:
+        return len(OFFER_FIELDS)
+
+    def __reduce__(self):
+        return (self.__class__.from_dict, (self.to_dict(),))
+
+    def __repr__(self) -> str:
+        return f"OfferRecord(id={self.id!r}, productName={self.productName!r})"
+
+    def to_dict(self) -> dict:
+        """Fresh mutable dict (used only when building response items)."""
+        return {name: getattr(self, name) for name in OFFER_FIELDS}
+
+
+class Hit(Mapping):
+    """A search result: a shared record plus one score under score_key (e.g. "_similarity")."""
+
+    __slots__ = ("record", "score_key", "score")
+
+    def __init__(self, record: OfferRecord, score_key: str, score: float) -> None:
+        self.record = record
+        self.score_key = score_key
+        self.score = score
+
+    def __getitem__(self, key: str) -> Any:
+        if key == self.score_key:
+            return self.score
+        return self.record[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from OFFER_FIELDS
+        yield self.score_key
+
+    def __len__(self) -> int:
+        return len(OFFER_FIELDS) + 1
+
+    def __repr__(self) -> str:
+        return f"Hit({self.record.id!r}, {self.score_key}={self.score!r})"
+
+
+class LazyOffers(Sequence):
+    """catalog.offers of a database-backed version: rows are read on access through select(limit, offset).
+
+    limit -1 means all rows from offset; slices become one LIMIT / OFFSET query.
+    """
+
+    def __init__(self, select: Callable[[int, int], list[OfferRecord]], length: int) -> None:
+        self._select = select
+        self._len = length
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return list(self)[index]
+            return self._select(max(0, stop - start), start)
+        if index < 0:
+            index += len(self)
+        found = self._select(1, index) if 0 <= index < len(self) else []
+        if not found:
+            raise IndexError(index)
+        return found[0]
+
+    def __iter__(self) -> Iterator[OfferRecord]:
+        return iter(self._select(-1, 0))
@@ -0,0 +1,85 @@
+"""Admin catalog endpoints: incremental offer upsert / delete, index compaction and full reloads.
+
+Every endpoint requires the X-Admin-Token header to match ADMIN_TOKEN; with
+ADMIN_TOKEN unset the API is disabled (403). Store writes run in a worker
+thread: they rebuild indexes (in memory) or wait on the database (SQLite,
+Postgres), and must not hold up the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import logging
+import os
+import time
+
+from fastapi import APIRouter, Header, HTTPException
+
+from app.schemas import CatalogReloadRequest, CatalogUpdateResponse, OfferDeleteRequest, OfferUpsertRequest
+from app.store import get_store
+
+_ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/v1/admin", tags=["admin"])
+
+
+def _check_token(token: str | None) -> None:
+    """Require ADMIN_TOKEN in the X-Admin-Token header; fail closed when none is configured."""
+    if not _ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API disabled: ADMIN_TOKEN is not set")
+    if token is None or not hmac.compare_digest(token.encode(), _ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def _response(ids: list[str], t0: float) -> CatalogUpdateResponse:
+    snapshot = get_store().snapshot()
+    return CatalogUpdateResponse(
+        ids=ids,
+        version=snapshot.version,
+        offerCount=len(snapshot),
+        pendingRows=snapshot.pending_rows,
+        ms=round((time.perf_counter() - t0) * 1000, 3),
+    )
+
+
+@router.post("/offers", response_model=CatalogUpdateResponse)
+async def upsert_offers(req: OfferUpsertRequest, x_admin_token: str | None = Header(default=None)):
+    """Insert or replace offers; indexes are updated in place (no rebuild)."""
+    _check_token(x_admin_token)
+    t0 = time.perf_counter()
+    ids = await asyncio.to_thread(get_store().upsert_offers, [o.model_dump(exclude_none=True) for o in req.offers])
+    logger.info("admin.upsert", extra={"count": len(ids)})
+    return _response(ids, t0)
+
+
+@router.post("/offers/delete", response_model=CatalogUpdateResponse)
+async def delete_offers(req: OfferDeleteRequest, x_admin_token: str | None = Header(default=None)):
+    """Delete offers by id (tombstoned until the next compaction)."""
+    _check_token(x_admin_token)
+    t0 = time.perf_counter()
+    ids = await asyncio.to_thread(get_store().delete_offers, req.ids)
+    logger.info("admin.delete", extra={"requested": len(req.ids), "deleted": len(ids)})
+    return _response(ids, t0)
+
+
+@router.post("/compact", response_model=CatalogUpdateResponse)
+async def compact(x_admin_token: str | None = Header(default=None)):
+    """Rebuild the indexes from live offers, folding in appended rows and dropping tombstones."""
+    _check_token(x_admin_token)
+    t0 = time.perf_counter()
+    await asyncio.to_thread(get_store().compact)
+    return _response([], t0)
+
+
+@router.post("/reload", response_model=CatalogUpdateResponse)
+async def reload_catalog(req: CatalogReloadRequest | None = None, x_admin_token: str | None = Header(default=None)):
+    """Rebuild the catalog in the background and swap it in; searches are served from the old snapshot meanwhile."""
+    _check_token(x_admin_token)
+    t0 = time.perf_counter()
+    offers = None if req is None or req.offers is None else [o.model_dump(exclude_none=True) for o in req.offers]
+    version = await asyncio.wrap_future(get_store().reload(offers))
+    logger.info("admin.reload", extra={"version": version})
+    return _response([], t0)
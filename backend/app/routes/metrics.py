@@ -0,0 +1,31 @@
+"""Runtime metrics endpoint."""
+
+from __future__ import annotations
+
+from fastapi import APIRouter
+
+from app.embed_cache import get_embedding_cache
+from app.embedder import get_embedder
+from app.events import get_event_log
+from app.executors import get_executors
+from app.search_cache import get_search_cache
+from app.pipeline.understanding import cache_stats as query_cache_stats
+from app.store import get_store
+
+router = APIRouter(prefix="/v1", tags=["metrics"])
+
+
+@router.get("/metrics")
+async def metrics():
+    """Executor queue depths, event log, embedder batching, the embedding, search result and
+    query-understanding caches, and the catalog version this process serves."""
+    snapshot = get_store().snapshot()
+    return {
+        "executors": get_executors().stats(),
+        "events": get_event_log().stats(),
+        "embedder": get_embedder().stats(),
+        "embeddingCache": get_embedding_cache().stats(),
+        "queryUnderstanding": query_cache_stats(),
+        "searchCache": get_search_cache().stats(),
+        "catalog": {"version": snapshot.version, "offerCount": len(snapshot), "pendingRows": snapshot.pending_rows},
+    }
@@ -83,7 +83,7 @@ async def get_scorecard():
     for sq in SCORECARD_QUERIES:
         t0 = time.perf_counter()
         try:
-            result = await run_search(query=sq["query"])
+            result = await run_search(query=sq["query"], trace=True, cached=False)
             elapsed = round((time.perf_counter() - t0) * 1000, 1)
             ranked = result.get("ranked", [])
             trace = result.get("debug_trace", [])
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import hashlib
 import logging
 import os
 
@@ -18,6 +19,7 @@ from app.schemas import (
     FeedbackResponse,
     SuggestionsResponse,
 )
+from app.events import get_event_log
 from app.pipeline.orchestrator import run_search
 from app.store import get_store
 
@@ -28,6 +30,11 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/v1/search", tags=["search"])
 
 
+def _query_hash(query: str) -> str:
+    """Events carry this instead of the query, so repeats group without keeping the text."""
+    return hashlib.blake2b(query.encode(), digest_size=8).hexdigest()
+
+
 @router.post("/query", response_model=SearchQueryResponse)
 async def search_query(req: SearchQueryRequest):
     """Run the agentic search pipeline."""
@@ -38,12 +45,22 @@ async def search_query(req: SearchQueryRequest):
         user_id=req.user_id,
         refine=refine_dict,
         personalized=req.personalized,
+        trace=_DEV_MODE,
     )
 
     if result.get("error"):
         raise HTTPException(status_code=400, detail=result["error"])
 
     ranked = result.get("ranked", [])
+    # Search event for offline jobs (no query text, see _query_hash)
+    get_event_log().record("search", {
+        "queryHash": _query_hash(req.query),
+        "userId": req.user_id,
+        "constraints": result.get("applied_constraints", {}),
+        "resultIds": [o["id"] for o in ranked],
+        "steps": result.get("step_ms", {}),
+        "catalogVersion": result["catalog"].version if result.get("catalog") is not None else None,
+    })
     results = [
         DecisionItemResponse(
             id=o["id"],
@@ -120,7 +137,7 @@ async def search_feedback(req: FeedbackRequest):
     store = get_store()
     store.add_feedback({
         "itemId": req.item_id,
-        "query": req.query,
+        "queryHash": _query_hash(req.query),
         "rating": req.rating,
         "reason": req.reason,
     })
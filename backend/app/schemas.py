@@ -9,7 +9,7 @@ from __future__ import annotations
 import sys
 import os
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 # Ensure packages/shared is importable
 _packages_dir = os.path.join(os.path.dirname(__file__), "..", "..", "packages")
@@ -32,6 +32,9 @@ from shared.models import (
     ProfileSummary,
 )
 
+from app.config import get_settings
+from app.index.columns import MAX_AMOUNT
+
 # ── Re-export shared models under API-friendly names ──
 # These aliases keep existing imports working across the backend.
 
@@ -74,3 +77,49 @@ class SearchQueryResponse(BaseModel):
 
 class FeedbackResponse(BaseModel):
     status: str = "ok"
+
+
+# ── Admin catalog models (backend-only) ──
+
+class OfferUpsert(BaseModel):
+    """Offer as written by the admin catalog API (embedding optional; derived when omitted)."""
+    id: str
+    merchantName: str
+    productName: str
+    category: str
+    totalPrice: float = Field(ge=0, le=MAX_AMOUNT)
+    termMonths: int
+    apr: float
+    monthlyPayment: float = Field(ge=0, le=MAX_AMOUNT)
+    eligibilityConfidence: str = "med"
+    imageUrl: Optional[str] = None
+    embedding: Optional[list[float]] = None
+
+    @field_validator("embedding")
+    @classmethod
+    def _embedding_dim(cls, embedding: Optional[list[float]]) -> Optional[list[float]]:
+        dim = get_settings().EMBEDDING_DIM
+        if embedding is not None and len(embedding) != dim:
+            raise ValueError(f"embedding must have EMBEDDING_DIM={dim} values, got {len(embedding)}")
+        return embedding
+
+
+class OfferUpsertRequest(BaseModel):
+    offers: list[OfferUpsert]
+
+
+class OfferDeleteRequest(BaseModel):
+    ids: list[str]
+
+
+class CatalogReloadRequest(BaseModel):
+    """Full catalog replacement; omit offers to rebuild from the seed catalog."""
+    offers: Optional[list[OfferUpsert]] = None
+
+
+class CatalogUpdateResponse(BaseModel):
+    ids: list[str]
+    version: int
+    offerCount: int
+    pendingRows: int
+    ms: float
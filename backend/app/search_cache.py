@@ -0,0 +1,215 @@
+"""Search result cache: whole pipeline results for repeated searches, with TinyLFU admission.
+
+Search traffic repeats: "laptop under $800" from many users, the same refine
+chip tapped again. run_search looks each search up here before it invokes the
+graph, and a hit skips every node.
+
+The key is a canonical form of the search:
+
+  - the sanitized query's tokens, sorted, so word-order variants
+    ("under $800 laptop") share an entry. A variant is served the results of
+    the ordering seen first. The lexical leg and the constraints don't depend
+    on word order, and embeddings of short keyword queries barely do;
+  - the parsed constraints, so "$800 under" (no budget) can't collide with
+    "under $800";
+  - the refine overrides and the personalization flag.
+
+Sanitizing and parsing come from the memos in app/pipeline/understanding.py,
+which the ingress and intent nodes then reuse on a miss.
+
+Every entry belongs to an epoch: the catalog version and a fingerprint of the
+user profile and plans (the store serves a single profile). A lookup under a
+new epoch drops every entry, so a catalog update or a plan change
+invalidates the cache without anyone having to notify it. A result computed
+under an older epoch is not stored.
+
+Admission is TinyLFU. A count-min sketch estimates how often each key was
+looked up recently; it is halved every 10 × capacity lookups so old
+popularity fades. Once the cache is full, a new result replaces the least
+recently used entry only if its key is looked up more often. A one-off search
+therefore can't push out a popular one. SEARCH_CACHE_TTL_S expires entries
+by age. Errors (blocked or too-short queries) are never cached.
+
+Hits share the cached result (read-only) and report the pipeline time they
+saved; GET /v1/metrics serves both figures. Every process keeps its own cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Mapping
+from typing import Callable, Optional
+
+from app.config import get_settings
+from app.pipeline.understanding import parse_constraints, sanitize
+
+_MAX_COUNT = 15  # saturating counters, as in TinyLFU's 4-bit ones
+_HALVE = bytes(i >> 1 for i in range(256))
+_SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+_MASK64 = (1 << 64) - 1
+
+
+class FrequencySketch:
+    """Count-min sketch of recent key frequencies, aged by halving every sample_size additions."""
+
+    def __init__(self, capacity: int) -> None:
+        width = 16
+        while width < 2 * capacity:
+            width <<= 1
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in _SEEDS]
+        self.sample_size = 10 * max(capacity, 1)
+        self._additions = 0
+
+    def _slots(self, key: Hashable) -> list[int]:
+        h = hash(key) & _MASK64
+        return [((h * seed) & _MASK64) >> 32 & self._mask for seed in _SEEDS]
+
+    def add(self, key: Hashable) -> None:
+        for row, slot in zip(self._rows, self._slots(key)):
+            if row[slot] < _MAX_COUNT:
+                row[slot] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._rows = [row.translate(_HALVE) for row in self._rows]
+            self._additions //= 2
+
+    def estimate(self, key: Hashable) -> int:
+        return min(row[slot] for row, slot in zip(self._rows, self._slots(key)))
+
+
+def search_key(query: str, refine: Optional[Mapping] = None, personalized: bool = True) -> tuple:
+    """The canonical cache key of a search (see module docstring)."""
+    cleaned, _ = sanitize(query)
+    refine = refine or {}
+    constraints, _ = parse_constraints(
+        cleaned, refine.get("onlyZeroApr"), refine.get("maxMonthly"), refine.get("sort"), refine.get("category"),
+    )
+    return (
+        tuple(sorted(cleaned.split())),
+        tuple((k, constraints[k]) for k in sorted(constraints) if k != "raw_keywords"),  # raw_keywords: from the tokens
+        tuple(sorted(refine.items())),
+        personalized,
+    )
+
+
+def profile_version(store) -> str:
+    """Fingerprint of the user profile and plans a search is personalized and checked against."""
+    payload = json.dumps([store.user, store.plans], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+class SearchResultCache:
+    """Thread-safe LRU of search key → pipeline result, with TinyLFU admission, expiry and epochs."""
+
+    def __init__(self, capacity: int = 2048, ttl_s: float = 300.0, clock: Callable[[], float] = time.time) -> None:
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[dict, float, float]] = OrderedDict()
+        self._sketch = FrequencySketch(capacity)
+        self._epoch: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidated = 0
+        self.saved_ms = 0.0
+
+    @classmethod
+    def from_settings(cls) -> "SearchResultCache":
+        settings = get_settings()
+        return cls(settings.SEARCH_CACHE_SIZE, settings.SEARCH_CACHE_TTL_S)
+
+    def _expired(self, stamp: float, now: float) -> bool:
+        return self.ttl_s > 0 and now - stamp >= self.ttl_s
+
+    def get(self, key: Hashable, epoch: Hashable) -> Optional[tuple[dict, float]]:
+        """(cached result, pipeline ms it saves), or None (counted as a miss)."""
+        if self.capacity <= 0:
+            return None
+        with self._lock:
+            if epoch != self._epoch:
+                self.invalidated += len(self._entries)
+                self._entries.clear()
+                self._epoch = epoch
+            self._sketch.add(key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[2], self._clock()):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.saved_ms += entry[1]
+                    return entry[0], entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+        return None
+
+    def put(self, key: Hashable, epoch: Hashable, result: dict, cost_ms: float) -> bool:
+        """Offer a result computed under epoch in cost_ms; whether it was stored."""
+        if self.capacity <= 0:
+            return False
+        with self._lock:
+            if epoch != self._epoch:
+                return False  # the catalog or profile changed while it ran
+            now = self._clock()
+            if key not in self._entries and len(self._entries) >= self.capacity:
+                victim = next(iter(self._entries))
+                if (not self._expired(self._entries[victim][2], now)
+                        and self._sketch.estimate(key) <= self._sketch.estimate(victim)):
+                    self.rejected += 1
+                    return False
+                del self._entries[victim]
+                self.evictions += 1
+            self._entries[key] = (result, cost_ms, now)
+            self._entries.move_to_end(key)
+            self.admitted += 1
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "savedMs": round(self.saved_ms, 1),
+            "avgSavedMs": round(self.saved_ms / self.hits, 1) if self.hits else 0.0,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidated": self.invalidated,
+        }
+
+
+_cache: Optional[SearchResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchResultCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchResultCache.from_settings()
+    return _cache
+
+
+def close_search_cache() -> None:
+    """Drop the shared cache; the next get starts an empty one."""
+    global _cache
+    with _cache_lock:
+        _cache = None
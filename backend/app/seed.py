@@ -3,6 +3,9 @@
 from __future__ import annotations
 
 import hashlib
+from collections.abc import Iterator, Mapping, Sequence
+from typing import Callable, Optional
+
 import numpy as np
 
 from app.config import get_settings
@@ -64,33 +67,52 @@ def _deterministic_embedding(text: str, dim: int = 384) -> list[float]:
     return vec.tolist()
 
 
-def build_offers() -> list[dict]:
-    """Return fully-formed offer dicts with IDs, embeddings, disclosures, and reasons."""
-    settings = get_settings()
-    dim = settings.EMBEDDING_DIM
-    offers = []
+def offer_embed_text(raw: Mapping) -> str:
+    """The text an offer's embedding is computed from."""
+    return f"{raw['category']} {raw['merchantName']} {raw['productName']} ${raw['totalPrice']} {raw['apr']}% APR {raw['termMonths']} months"
+
+
+def build_offer(raw: dict, offer_id: str, dim: int = 384, embedding: Optional[Sequence[float]] = None) -> dict:
+    """One fully-formed offer dict (embedding, reason, disclosure) from raw offer fields.
+
+    The embedding is the hash embedding of offer_embed_text(raw) unless one is given.
+    """
+    if embedding is None:
+        embedding = _deterministic_embedding(offer_embed_text(raw), dim)
+
+    confidence = raw["eligibilityConfidence"]
+    if confidence == "high":
+        reason = "Strong match for your spending profile and payment history."
+    elif confidence == "med":
+        reason = "Good fit based on your eligibility estimate."
+    else:
+        reason = "Available option — final terms confirmed at checkout."
+
+    return {
+        **raw,
+        "id": offer_id,
+        "imageUrl": raw.get("imageUrl"),
+        "embedding": embedding,
+        "reason": reason,
+        "disclosure": "Final approval happens at checkout.",
+    }
+
+
+def build_offers(embed: Optional[Callable[[list[str]], Sequence[Sequence[float]]]] = None) -> list[dict]:
+    """Return fully-formed offer dicts with IDs, embeddings, disclosures, and reasons.
+
+    embed encodes all offer texts in one call (e.g. Embedder.embed_many); default: the hash embedding.
+    """
+    dim = get_settings().EMBEDDING_DIM
+    raws = list(raw_offers())
+    embeddings = embed([offer_embed_text(raw) for raw in raws]) if embed is not None else [None] * len(raws)
+    return [build_offer({k: v for k, v in raw.items() if k != "id"}, raw["id"], dim, e) for raw, e in zip(raws, embeddings)]
+
+
+def raw_offers() -> Iterator[dict]:
+    """The seed catalog's raw offer fields, with their ids."""
     for i, raw in enumerate(MOCK_OFFERS):
-        offer_id = f"offer-{i+1:03d}"
-        embed_text = f"{raw['category']} {raw['merchantName']} {raw['productName']} ${raw['totalPrice']} {raw['apr']}% APR {raw['termMonths']} months"
-        embedding = _deterministic_embedding(embed_text, dim)
-
-        confidence = raw["eligibilityConfidence"]
-        if confidence == "high":
-            reason = "Strong match for your spending profile and payment history."
-        elif confidence == "med":
-            reason = "Good fit based on your eligibility estimate."
-        else:
-            reason = "Available option — final terms confirmed at checkout."
-
-        offers.append({
-            **raw,
-            "id": offer_id,
-            "imageUrl": None,
-            "embedding": embedding,
-            "reason": reason,
-            "disclosure": "Final approval happens at checkout.",
-        })
-    return offers
+        yield {**raw, "id": f"offer-{i+1:03d}"}
 
 
 MOCK_PLANS = [
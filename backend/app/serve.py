@@ -0,0 +1,285 @@
+"""Pre-fork server: load the catalog once, share it, fork uvicorn workers.
+
+Running `uvicorn --workers N` starts N independent interpreters that each
+seed their own InMemoryStore, so index memory grows with the worker count.
+This entry point instead:
+
+  1. binds the listening socket and loads the store once in the parent
+     (memory-mapped from SNAPSHOT_DIR when set, otherwise built);
+  2. moves the large NumPy arrays of the catalog (embeddings, postings,
+     columns, index structures) into multiprocessing.shared_memory as
+     read-only views, leaving memory-mapped arrays on the page cache;
+  3. compiles the search graph and calls gc.freeze(), so the collector
+     never writes to the inherited objects and their pages stay shared;
+  4. forks the workers, which inherit the store and serve on the shared
+     socket. Dead workers are replaced after an exponential backoff
+     (SERVE_RESPAWN_BACKOFF_MS doubling up to SERVE_RESPAWN_MAX_MS); after
+     SERVE_MAX_CRASHES worker deaths within SERVE_CRASH_WINDOW_S the server
+     stops every worker and exits with status 1 instead of crash-looping.
+     SIGTERM / SIGINT stop all of them.
+
+Catalog writes (admin upserts, deletes, reloads) apply to the worker that
+receives them. Roll out fleet-wide catalog changes by writing a new snapshot
+and restarting, or by sending a reload to every worker. With
+STORE_BACKEND=sqlite the workers share the database, so every worker sees
+each write.
+
+Usage:
+    python -m app.serve --workers 16 --port 8000
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from collections import deque
+from collections.abc import Iterator
+from multiprocessing import shared_memory
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Arrays below this size are left in place (not worth a shared memory block)
+SHARE_MIN_BYTES = 1 << 16
+
+
+def _array_refs(root: Any) -> Iterator[tuple[Any, Any, np.ndarray]]:
+    """(container, key, array) for every ndarray reachable from root through app objects, lists and dicts."""
+    seen: set[int] = set()
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, list):
+            items = enumerate(obj)
+        elif isinstance(obj, dict):
+            items = obj.items()
+        elif hasattr(obj, "__dict__") and type(obj).__module__.startswith("app."):
+            items = vars(obj).items()
+        else:
+            continue
+        for key, value in items:
+            if isinstance(value, np.ndarray):
+                yield obj, key, value
+            elif isinstance(value, (list, dict)) or hasattr(value, "__dict__"):
+                stack.append(value)
+
+
+def _owner(array: np.ndarray) -> Any:
+    """The object ultimately holding an array's memory (an owning ndarray, mmap, ...)."""
+    while isinstance(array, np.ndarray) and array.base is not None:
+        array = array.base
+    return array
+
+
+def share_arrays(root: Any, min_bytes: int = SHARE_MIN_BYTES) -> list[shared_memory.SharedMemory]:
+    """Move large NumPy arrays reachable from root into shared memory, as read-only arrays.
+
+    Arrays are grouped by the buffer they view, so an array and its slices
+    move together and keep pointing at the same (now shared) bytes. Arrays
+    backed by a memory-mapped file already share pages and are left alone.
+    Returns the blocks; the caller unlinks them on shutdown.
+    """
+    groups: dict[int, tuple[np.ndarray, list[tuple[Any, Any, np.ndarray]]]] = {}
+    for container, key, array in _array_refs(root):
+        base = _owner(array)
+        if not isinstance(base, np.ndarray) or isinstance(base, np.memmap) or base.nbytes < min_bytes:
+            continue
+        groups.setdefault(id(base), (base, []))[1].append((container, key, array))
+
+    blocks = []
+    for base, refs in groups.values():
+        block = shared_memory.SharedMemory(create=True, size=max(base.nbytes, 1))
+        shared = np.ndarray(base.shape, dtype=base.dtype, buffer=block.buf, strides=base.strides)
+        shared[...] = base
+        start = base.__array_interface__["data"][0]
+        for container, key, array in refs:
+            offset = array.__array_interface__["data"][0] - start
+            view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf, offset=offset, strides=array.strides)
+            view.flags.writeable = False
+            if isinstance(container, (list, dict)):
+                container[key] = view
+            else:
+                vars(container)[key] = view
+        blocks.append(block)
+    return blocks
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, log_level: str) -> None:
+    import uvicorn
+
+    from app.main import app
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level, lifespan="on"))
+    server.run(sockets=[sock])
+
+
+def _fork_worker(sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, log_level)
+        except BaseException:
+            logger.exception("serve.worker_crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+class CrashBudget:
+    """When to replace a dead worker: backoff doubling per recent crash, and a limit on crashes per window."""
+
+    def __init__(
+        self, backoff_s: float, max_backoff_s: float, max_crashes: int, window_s: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.max_crashes = max_crashes
+        self.window_s = window_s
+        self._clock = clock
+        self._crashes: deque[float] = deque()
+
+    @classmethod
+    def from_settings(cls) -> "CrashBudget":
+        from app.config import get_settings
+        settings = get_settings()
+        return cls(
+            settings.SERVE_RESPAWN_BACKOFF_MS / 1000, settings.SERVE_RESPAWN_MAX_MS / 1000,
+            settings.SERVE_MAX_CRASHES, settings.SERVE_CRASH_WINDOW_S,
+        )
+
+    def crashed(self) -> Optional[float]:
+        """Record a worker death; seconds to wait before replacing it, or None once over budget."""
+        now = self._clock()
+        self._crashes.append(now)
+        while self._crashes[0] <= now - self.window_s:
+            self._crashes.popleft()
+        recent = len(self._crashes)
+        if self.max_crashes > 0 and recent >= self.max_crashes:
+            return None
+        return min(self.max_backoff_s, self.backoff_s * 2 ** (recent - 1))
+
+
+def serve(host: str, port: int, workers: int, log_level: str = "info") -> None:
+    # Import the app (and with it the store, routes and pipeline) before forking
+    from app.main import app  # noqa: F401
+    from app.pipeline.orchestrator import get_search_graph
+    from app.store import get_store
+
+    sock = _bind(host, port)
+    store = get_store()
+    blocks = share_arrays(store.snapshot())
+    get_search_graph()
+    gc.collect()
+    gc.freeze()
+    logger.info("serve.ready", extra={
+        "offers": len(store.snapshot()), "catalog_version": store.catalog_version, "workers": workers,
+        "shared_mb": round(sum(b.size for b in blocks) / 2**20, 1),
+    })
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    children: set[int] = set()
+    respawns: list[float] = []  # monotonic deadlines of workers waiting out their backoff
+    budget = CrashBudget.from_settings()
+    crash_loop = False
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        for _ in range(workers):
+            children.add(_fork_worker(sock, log_level))
+        while children or (respawns and not stopping):
+            if stopping:
+                respawns.clear()
+            if respawns:
+                now = time.monotonic()
+                due = [deadline for deadline in respawns if deadline <= now]
+                respawns = [deadline for deadline in respawns if deadline > now]
+                for _ in due:
+                    children.add(_fork_worker(sock, log_level))
+                # Poll, so a due respawn or a stop signal is not held up by a blocking wait
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    pid = 0
+                if pid == 0:
+                    time.sleep(min(0.05, max(0.0, min(respawns, default=now) - now)))
+                    continue
+            else:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+            children.discard(pid)
+            if stopping:
+                continue
+            delay = budget.crashed()
+            if delay is None:
+                logger.error("serve.crash_loop", extra={
+                    "pid": pid, "status": status, "crashes": budget.max_crashes, "window_s": budget.window_s,
+                })
+                crash_loop = True
+                stop(signal.SIGTERM, None)
+                continue
+            logger.warning("serve.worker_exited", extra={"pid": pid, "status": status, "respawn_in_s": delay})
+            respawns.append(time.monotonic() + delay)
+    finally:
+        sock.close()
+        for block in blocks:
+            block.close()
+            block.unlink()
+    if crash_loop:
+        sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-fork server sharing one catalog across uvicorn workers.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        sys.exit("app.serve needs os.fork(); use uvicorn directly on this platform")
+    from app.config import get_settings
+    if get_settings().STORE_SHARDS > 1:
+        # Shard connections are served by threads of the parent, which forked workers don't inherit
+        sys.exit("app.serve does not support STORE_SHARDS > 1; run uvicorn with a sharded store instead")
+    serve(args.host, args.port, args.workers, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
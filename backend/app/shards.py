@@ -0,0 +1,495 @@
+"""Sharded catalog: offers partitioned across local shard processes, searched scatter-gather.
+
+With STORE_SHARDS=N (N > 1) the store keeps the vector and BM25 indexes of its
+offers in N shard processes, each owning one partition as a CatalogSnapshot.
+A search fans out to the shards in parallel and the per-shard top-k lists
+are merged, so the scan per query shrinks with the number of cores.
+
+Placement (STORE_SHARD_PLACEMENT):
+  - "hash": by offer id (balanced shards; every search goes to every shard);
+  - "category": whole categories per shard, balanced by size. A search
+    constrained to one category then goes to a single shard.
+
+Results equal those of the single-process catalog (exactly so for the exact
+vector index): rows are numbered as in the unsharded catalog, and BM25 shards
+score with corpus-wide statistics gathered from all shards (cached per
+version), not with their own. Approximate vector indexes are built per shard.
+
+The coordinator (ShardedCatalog) keeps the offer records and attribute
+columns, so offers, filter_mask and row_of stay local; live_rows gathers the
+embeddings back from the shards (e.g. to write a snapshot). Versions behave as in
+CatalogSnapshot: each shard keeps the snapshot of every catalog version still
+referenced by the coordinator, so a request pinned to an older version keeps
+reading it, and releases it once that version is garbage collected.
+"""
+
+from __future__ import annotations
+
+import copy
+import itertools
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+import weakref
+import zlib
+from collections import Counter, deque
+from collections.abc import Mapping
+from concurrent.futures import Future
+from typing import Any, Optional
+
+import numpy as np
+
+from app.catalog import _DELETED, _NO_ROWS, CatalogSnapshot, _category_order
+from app.index.bm25 import CorpusStats
+from app.index.columns import OfferColumns
+from app.index.growable import GrowableArray
+from app.records import OfferRecord
+
+logger = logging.getLogger(__name__)
+
+PLACEMENTS = ("hash", "category")
+
+
+# ── Shard process ──
+
+
+class _Partition:
+    """Shard-side state: the catalog versions this shard serves, by key.
+
+    Each version is a CatalogSnapshot over this shard's offers plus the map
+    from its rows to catalog-wide rows. The map is append-only and shared
+    along a lineage of applies, like the snapshot's own buffers. Local rows
+    ascend with catalog rows, so ties break the same way as in the unsharded
+    catalog.
+    """
+
+    def __init__(self) -> None:
+        self._versions: dict[int, tuple[CatalogSnapshot, GrowableArray]] = {}
+
+    def build(self, key: int, records: list[OfferRecord], embeddings: np.ndarray, rows: np.ndarray) -> None:
+        # records arrive grouped by category, so build keeps their order
+        self._versions[key] = (CatalogSnapshot.build(records, embeddings, version=key), GrowableArray(rows))
+
+    def apply(
+        self, base: int, key: int, upserts: list[tuple[OfferRecord, np.ndarray]], deletes: list[str], rows: list[int],
+    ) -> None:
+        catalog, global_rows = self._versions[base]
+        if upserts or deletes:
+            catalog = catalog.apply(upserts, deletes, version=key)
+            if rows:
+                global_rows.append(np.asarray(rows, dtype=np.int64))
+        self._versions[key] = (catalog, global_rows)
+
+    def compact(self, base: int, key: int, new_rows: np.ndarray) -> None:
+        """Rebuild from the live rows; new_rows maps each old catalog row to its row after compaction."""
+        catalog, global_rows = self._versions[base]
+        records, embeddings = catalog.live_rows()
+        rows = new_rows[global_rows.view[np.flatnonzero(catalog._columns.alive)]]
+        order = np.argsort(rows, kind="stable")
+        self._versions[key] = (
+            CatalogSnapshot.build([records[i] for i in order.tolist()], embeddings[order], version=key),
+            GrowableArray(rows[order]),
+        )
+
+    def live_vectors(self, key: int) -> tuple[np.ndarray, np.ndarray]:
+        """Catalog-wide rows of this shard's live offers and their embeddings."""
+        catalog, global_rows = self._versions[key]
+        _, embeddings = catalog.live_rows()
+        return global_rows.view[np.flatnonzero(catalog._columns.alive)], embeddings
+
+    def drop(self, keys: list[int]) -> None:
+        for key in keys:
+            self._versions.pop(key, None)
+
+    def _global(self, key: int, result: tuple[np.ndarray, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        rows, scores = result
+        keep = rows >= 0  # padding from approximate indexes
+        return self._versions[key][1].view[rows[keep]], scores[keep]
+
+    def vector(self, key: int, query: np.ndarray, top_k: int, filters: Optional[dict]):
+        return self._global(key, self._versions[key][0].vector_rows(query, top_k, filters))
+
+    def vector_many(self, key: int, queries: np.ndarray, top_k: int):
+        return [self._global(key, r) for r in self._versions[key][0].vector_rows_many(queries, top_k)]
+
+    def corpus_stats(self, key: int, tokens: list[str]) -> CorpusStats:
+        return self._versions[key][0].corpus_stats(tokens)
+
+    def bm25(self, key: int, tokens: list[str], top_k: int, filters: Optional[dict], corpus: CorpusStats):
+        return self._global(key, self._versions[key][0].bm25_rows(tokens, top_k, filters, corpus))
+
+
+def _shard_main(conn) -> None:
+    """Shard process loop: (seq, op, args) requests in, (seq, ok, result) replies out, until None or EOF."""
+    # Shards stop with their parent (see _Shard.close; EOF if it dies), not on group-wide signals
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    partition = _Partition()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        seq, op, args = message
+        try:
+            reply = (seq, True, getattr(partition, op)(*args))
+        except Exception as e:
+            reply = (seq, False, RuntimeError(f"{op} failed: {type(e).__name__}: {e}"))
+        conn.send(reply)
+
+
+# ── Coordinator ──
+
+
+class _Shard:
+    """Client end of one shard process: numbered requests, replies matched up by a reader thread."""
+
+    def __init__(self, ctx, index: int) -> None:
+        self.index = index
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(
+            target=_shard_main, args=(child_conn,), name=f"catalog-shard-{index}", daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._lock = threading.Lock()
+        self._pending: dict[int, Future] = {}
+        self._seq = 0
+        self._error: Optional[Exception] = None
+        self._closing = False
+        self._reader = threading.Thread(target=self._read, name=f"catalog-shard-{index}-reader", daemon=True)
+        self._reader.start()
+
+    def call(self, op: str, args: tuple) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._error is not None:
+                future.set_exception(self._error)
+                return future
+            self._seq += 1
+            self._pending[self._seq] = future
+            try:
+                self._conn.send((self._seq, op, args))
+            except (OSError, ValueError) as e:
+                del self._pending[self._seq]
+                future.set_exception(RuntimeError(f"catalog shard {self.index} unavailable: {e}"))
+        return future
+
+    def _read(self) -> None:
+        while True:
+            try:
+                seq, ok, result = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._pending.pop(seq, None)
+            if future is not None:
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(result)
+        with self._lock:
+            self._error = RuntimeError(f"catalog shard {self.index} exited")
+            pending, self._pending = self._pending, {}
+        if not self._closing:
+            logger.error("shards.shard_exited", extra={"shard": self.index, "exitcode": self._process.exitcode})
+        for future in pending.values():
+            future.set_exception(self._error)
+
+    def close(self) -> None:
+        self._closing = True
+        with self._lock:
+            try:
+                self._conn.send(None)
+            except (OSError, ValueError):
+                pass
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._reader.join()  # sees EOF once the process is gone; later calls fail fast
+        self._conn.close()
+
+
+class ShardPool:
+    """N local shard processes serving the versions of a ShardedCatalog."""
+
+    def __init__(self, n_shards: int, placement: str = "hash", timeout_ms: int = 1000) -> None:
+        if placement not in PLACEMENTS:
+            raise ValueError(f"Unknown shard placement {placement!r} (expected one of {PLACEMENTS})")
+        self.placement = placement
+        self.timeout = timeout_ms / 1000
+        ctx = multiprocessing.get_context("spawn")  # no fork of a threaded server process
+        self._shards = [_Shard(ctx, i) for i in range(n_shards)]
+        self._keys = itertools.count(1)
+        self._released: deque[int] = deque()
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    def new_key(self) -> int:
+        return next(self._keys)
+
+    def release(self, key: int) -> None:
+        """Mark a version as unreferenced; shards drop it with the next request."""
+        self._released.append(key)  # may run inside a GC finalizer: no locks, no I/O
+
+    def gather(self, op: str, args: Mapping[int, tuple], timeout: Optional[float] = None) -> list[Any]:
+        """Run op on the given shards (index → args) in parallel; results in the same order.
+
+        With a timeout, raises TimeoutError when a shard has not answered by then.
+        """
+        released = []
+        while self._released:
+            released.append(self._released.popleft())
+        if released:
+            for shard in self._shards:
+                shard.call("drop", (released,))
+        futures = [self._shards[i].call(op, a) for i, a in args.items()]
+        if timeout is None:
+            return [f.result() for f in futures]
+        deadline = time.monotonic() + timeout
+        return [f.result(max(0.0, deadline - time.monotonic())) for f in futures]
+
+    def close(self) -> None:
+        for shard in self._shards:
+            shard.close()
+
+
+def _hash_shard(offer_id: str, n_shards: int) -> int:
+    return zlib.crc32(offer_id.encode()) % n_shards
+
+
+def _assign_categories(records: list[OfferRecord], n_shards: int, load: Optional[list[int]] = None) -> dict[str, int]:
+    """Category → shard: largest categories first, each onto the least-loaded shard."""
+    load = list(load or [0] * n_shards)
+    out = {}
+    sizes = Counter(r["category"].lower() for r in records)
+    for category, size in sorted(sizes.items(), key=lambda kv: (-kv[1], kv[0])):
+        shard = load.index(min(load))
+        out[category] = shard
+        load[shard] += size
+    return out
+
+
+def _merge(parts: list[tuple[np.ndarray, np.ndarray]], top_k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Top-k of per-shard results by score desc, then row."""
+    if not parts:
+        return _NO_ROWS
+    rows = np.concatenate([p[0] for p in parts])
+    scores = np.concatenate([p[1] for p in parts])
+    order = np.lexsort((rows, -scores))[:top_k]
+    return rows[order], scores[order]
+
+
+class ShardedCatalog(CatalogSnapshot):
+    """One immutable catalog version whose search indexes live in shard processes.
+
+    Offers, row bookkeeping and attribute columns are kept here as in
+    CatalogSnapshot, whose reads (offers, row_of, filter_mask, the *_search
+    methods) are inherited; only the row-level searches are sent to shards.
+    """
+
+    def __init__(
+        self,
+        pool: ShardPool,
+        version: int,
+        records: list[OfferRecord],
+        columns: OfferColumns,
+        shard_of: GrowableArray,
+        categories: dict[str, int],
+    ) -> None:
+        self.version = version
+        self._pool = pool
+        self._records = records  # append-only, shared across versions
+        self._columns = columns
+        self._shard_of = shard_of  # row → shard, append-only, shared across versions
+        self._categories = categories  # category → shard ("category" placement)
+        self.n_base = len(records)
+        self._n_tail = 0
+        self._base_rows = {r["id"]: i for i, r in enumerate(records)}
+        self._row_overlay: dict[str, int] = {}
+        self._live: Optional[list[OfferRecord]] = None
+        self._bind(pool.new_key())
+
+    def _bind(self, key: int) -> None:
+        """Attach this version to its shard-side key (released when this object is collected)."""
+        self._key = key
+        self._totals: Optional[tuple[int, int]] = None
+        self._df: dict[str, int] = {}  # corpus-wide df of terms queried so far
+        weakref.finalize(self, self._pool.release, key)
+
+    @classmethod
+    def build(
+        cls, pool: ShardPool, records: list[OfferRecord], embeddings: np.ndarray, version: int,
+    ) -> "ShardedCatalog":
+        """Partition records + embeddings across the pool's shards and build each shard's indexes."""
+        order = _category_order(records)
+        records = [records[i] for i in order]
+        embeddings = embeddings[np.asarray(order, dtype=np.int64)]
+        n = len(pool)
+        categories = _assign_categories(records, n) if pool.placement == "category" else {}
+        shard_of = np.array([cls._place(pool, categories, r) for r in records], dtype=np.int32).reshape(-1)
+        new = cls(pool, version, records, OfferColumns.from_offers(records), GrowableArray(shard_of), categories)
+        parts = {s: np.flatnonzero(shard_of == s) for s in range(n)}
+        pool.gather("build", {
+            s: (new._key, [records[i] for i in rows.tolist()], embeddings[rows], rows) for s, rows in parts.items()
+        })
+        return new
+
+    @staticmethod
+    def _place(pool: ShardPool, categories: dict[str, int], record: OfferRecord) -> int:
+        if pool.placement == "category":
+            return categories[record["category"].lower()]
+        return _hash_shard(record["id"], len(pool))
+
+    def _targets(self, filters: Optional[dict]) -> list[int]:
+        """Shards that can hold matches: one when category placement meets a category constraint."""
+        category = (filters or {}).get("category")
+        if self._pool.placement == "category" and category:
+            shard = self._categories.get(category.lower())
+            return [] if shard is None else [shard]
+        return list(range(len(self._pool)))
+
+    # ── Derived versions ──
+
+    def apply(
+        self,
+        upserts: list[tuple[OfferRecord, np.ndarray]],
+        deletes: list[str],
+        version: int,
+    ) -> "ShardedCatalog":
+        """Next version (see CatalogSnapshot.apply); each write goes to the shard that owns the offer.
+
+        An upsert that moves an offer to another shard (a category change under
+        category placement) deletes it from its old shard. A batch keeps the
+        last upsert of each id.
+        """
+        upserts = list({record["id"]: (record, emb) for record, emb in upserts}.values())
+        self._columns.check(record for record, _ in upserts)  # before any shard grows its buffers
+        n_shards = len(self._pool)
+        shard_of = self._shard_of.view
+        overlay = dict(self._row_overlay)
+        categories = self._categories
+        if self._pool.placement == "category" and any(r["category"].lower() not in categories for r, _ in upserts):
+            load = np.bincount(shard_of[:len(self._columns)][self._columns.alive], minlength=n_shards)
+            new_categories = _assign_categories(
+                [r for r, _ in upserts if r["category"].lower() not in categories], n_shards, load.tolist(),
+            )
+            categories = {**categories, **new_categories}
+
+        row = len(self._columns)
+        dead: list[int] = []
+        placed: list[int] = []
+        shard_upserts: dict[int, list] = {s: [] for s in range(n_shards)}
+        shard_rows: dict[int, list[int]] = {s: [] for s in range(n_shards)}
+        shard_deletes: dict[int, list[str]] = {s: [] for s in range(n_shards)}
+        for record, emb in upserts:
+            shard = self._place(self._pool, categories, record)
+            old = overlay.get(record["id"], self._base_rows.get(record["id"], _DELETED))
+            if old != _DELETED:
+                dead.append(old)
+                if shard_of[old] != shard:
+                    shard_deletes[int(shard_of[old])].append(record["id"])
+            overlay[record["id"]] = row
+            shard_upserts[shard].append((record, emb))
+            shard_rows[shard].append(row)
+            placed.append(shard)
+            row += 1
+        for offer_id in deletes:
+            old = overlay.get(offer_id, self._base_rows.get(offer_id, _DELETED))
+            if old != _DELETED:
+                dead.append(old)
+                overlay[offer_id] = _DELETED
+                shard = placed[old - len(self._columns)] if old >= len(self._columns) else int(shard_of[old])
+                shard_deletes[shard].append(offer_id)
+
+        new = copy.copy(self)
+        new._bind(self._pool.new_key())  # on failure, new is dropped and its finalizer releases the key
+        self._pool.gather("apply", {
+            s: (self._key, new._key, shard_upserts[s], shard_deletes[s], shard_rows[s]) for s in range(n_shards)
+        })
+        records = [r for r, _ in upserts]
+        new.version = version
+        new._columns = self._columns.apply(records, dead)
+        self._records.extend(records)
+        if placed:
+            self._shard_of.append(np.asarray(placed, dtype=np.int32))
+        new._n_tail = len(new._columns) - new.n_base
+        new._row_overlay = overlay
+        new._categories = categories
+        new._live = None
+        return new
+
+    def compact(self, version: int) -> "ShardedCatalog":
+        """Clean rebuild of every shard from its own live rows (offers keep their shard)."""
+        live = np.flatnonzero(self._columns.alive)
+        records = [self._records[i] for i in live.tolist()]
+        order = np.asarray(_category_order(records), dtype=np.int64)
+        new_rows = np.full(len(self._columns), -1, dtype=np.int64)
+        new_rows[live[order]] = np.arange(len(order))
+        records = [records[i] for i in order.tolist()]
+        shard_of = self._shard_of.view[live[order]]
+        new = ShardedCatalog(
+            self._pool, version, records, OfferColumns.from_offers(records), GrowableArray(shard_of), self._categories,
+        )
+        self._pool.gather("compact", {s: (self._key, new._key, new_rows) for s in range(len(self._pool))})
+        return new
+
+    def live_rows(self) -> tuple[list[OfferRecord], np.ndarray]:
+        """Live records and their embeddings, gathered from the shards back into catalog row order."""
+        live = np.flatnonzero(self._columns.alive)
+        parts = self._pool.gather("live_vectors", {s: (self._key,) for s in range(len(self._pool))})
+        rows = np.concatenate([r for r, _ in parts])
+        order = np.argsort(rows, kind="stable")
+        if not np.array_equal(rows[order], live):
+            raise RuntimeError(f"ShardedCatalog v{self.version}: shards and coordinator disagree on the live rows")
+        embeddings = np.concatenate([e for _, e in parts])[order]
+        return [self._records[i] for i in live.tolist()], embeddings
+
+    # ── Search (scatter-gather) ──
+
+    def vector_rows(
+        self, query: np.ndarray, top_k: int, filters: Optional[dict] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        parts = self._pool.gather(
+            "vector", {s: (self._key, query, top_k, filters) for s in self._targets(filters)}, self._pool.timeout,
+        )
+        return _merge(parts, top_k)
+
+    def vector_rows_many(self, queries: np.ndarray, top_k: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        parts = self._pool.gather(
+            "vector_many", {s: (self._key, queries, top_k) for s in range(len(self._pool))}, self._pool.timeout,
+        )
+        return [_merge([p[i] for p in parts], top_k) for i in range(len(queries))]
+
+    def corpus_stats(self, tokens: list[str]) -> CorpusStats:
+        """Corpus-wide BM25 statistics, gathered from every shard once per version and term."""
+        terms = set(tokens)
+        missing = [t for t in terms if t not in self._df]
+        if missing or self._totals is None:
+            parts = self._pool.gather(
+                "corpus_stats", {s: (self._key, missing) for s in range(len(self._pool))}, self._pool.timeout,
+            )
+            stats = CorpusStats.combine(parts)
+            self._df.update({t: stats.df.get(t, 0) for t in missing})
+            self._totals = (stats.n_docs, stats.total_len)
+        return CorpusStats(*self._totals, {t: self._df[t] for t in terms})
+
+    def bm25_rows(
+        self, tokens: list[str], top_k: int, filters: Optional[dict] = None, corpus: Optional[CorpusStats] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if not tokens:
+            return _NO_ROWS
+        targets = self._targets(filters)
+        if not targets:
+            return _NO_ROWS
+        corpus = corpus or self.corpus_stats(tokens)
+        parts = self._pool.gather(
+            "bm25", {s: (self._key, tokens, top_k, filters, corpus) for s in targets}, self._pool.timeout,
+        )
+        return _merge(parts, top_k)
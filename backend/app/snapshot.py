@@ -0,0 +1,252 @@
+"""On-disk catalog snapshots: build offline once, memory-map at startup.
+
+A snapshot directory holds one CatalogSnapshot in ready-to-serve form:
+
+    <SNAPSHOT_DIR>/CURRENT                  name of the live version directory
+    <SNAPSHOT_DIR>/catalog-v000001/
+        manifest.json                        format, catalog version, per-file byte size and SHA-256
+        offers.jsonl, offers_offsets.npy     one JSON offer per row + byte offsets
+        ids.npy, ids_rows.npy                sorted offer ids and their rows
+        embeddings.npy                       L2-normalized float32 (n, dim)
+        columns.json, col_*.npy              dictionary-encoded attribute columns, category
+                                             bitmaps and ranges, sorted price / monthly indexes
+        bm25_vocab.json, bm25_*.npy          CSR postings, document lengths, df, IDF and
+                                             per-term score bounds
+
+Arrays are loaded with np.load(mmap_mode="r") and wrapped as they are
+(OfferColumns.mapped, BM25Index.mapped), and offer records are decoded on
+first access, so startup skips embedding, tokenizing, parsing the catalog and
+rebuilding any derived array, and every worker mapping the same files shares
+their pages through the OS page cache. Version directories are never modified once
+written; a new snapshot goes into a fresh directory and CURRENT is replaced
+atomically, so running workers keep their mappings intact.
+
+Usage:
+    python -m app.snapshot                  # seed catalog → $SNAPSHOT_DIR (or ./snapshots)
+    python -m app.snapshot --out /var/lib/catalog
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from collections.abc import Iterator, Mapping
+from typing import Optional
+
+import numpy as np
+
+from app.catalog import CatalogSnapshot, build_vector_index
+from app.config import get_settings
+from app.index.bm25 import BM25Index
+from app.index.columns import COLUMNS, OfferColumns
+from app.index.growable import GrowableArray
+from app.records import OfferRecord
+
+FORMAT_VERSION = 2
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _manifest_checksum(files: dict[str, str]) -> str:
+    return hashlib.sha256("".join(f"{name}:{files[name]}\n" for name in sorted(files)).encode()).hexdigest()
+
+
+class MappedRecords:
+    """Offer records of a mapped snapshot, decoded from offers.jsonl on first access and cached.
+
+    Supports the list operations CatalogSnapshot uses on its records: len,
+    integer indexing and extend (for rows appended after load).
+    """
+
+    def __init__(self, path: Path, offsets: np.ndarray) -> None:
+        with open(path, "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+        self._offsets = offsets
+        self._n = len(offsets) - 1
+        self._cache: list[Optional[OfferRecord]] = [None] * self._n
+        self._appended: list[OfferRecord] = []
+
+    def __len__(self) -> int:
+        return self._n + len(self._appended)
+
+    def __getitem__(self, row: int) -> OfferRecord:
+        if row >= self._n:
+            return self._appended[row - self._n]
+        record = self._cache[row]
+        if record is None:
+            # Concurrent first reads may both decode; either (equal) record is fine to keep
+            lo, hi = int(self._offsets[row]), int(self._offsets[row + 1])
+            record = self._cache[row] = OfferRecord.from_dict(json.loads(self._buf[lo:hi]))
+        return record
+
+    def extend(self, records: list[OfferRecord]) -> None:
+        self._appended.extend(records)
+
+
+class MappedIds(Mapping):
+    """Offer id → row over sorted, memory-mapped id arrays (binary search, no dict to build)."""
+
+    def __init__(self, ids: np.ndarray, rows: np.ndarray) -> None:
+        self._ids = ids
+        self._rows = rows
+
+    def __getitem__(self, offer_id: str) -> int:
+        i = int(np.searchsorted(self._ids, offer_id))
+        if i == len(self._ids) or self._ids[i] != offer_id:
+            raise KeyError(offer_id)
+        return int(self._rows[i])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids.tolist())
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+def resolve(root: str | Path) -> Path:
+    """Version directory to load: root itself if it has a manifest, else the one named in root/CURRENT."""
+    root = Path(root)
+    if (root / "manifest.json").exists():
+        return root
+    return root / (root / "CURRENT").read_text().strip()
+
+
+def write_snapshot(catalog: CatalogSnapshot, root: str | Path) -> Path:
+    """Write catalog as a new version directory under root and point CURRENT at it."""
+    root = Path(root)
+    if catalog.pending_rows:
+        # Persist a clean base segment; tail rows and tombstones are folded in
+        catalog = CatalogSnapshot.build(*catalog.live_rows(), version=catalog.version)
+    directory = root / f"catalog-v{catalog.version:06d}"
+    directory.mkdir(parents=True, exist_ok=False)
+
+    columns, bm25 = catalog._columns, catalog._bm25
+    arrays = {
+        "embeddings.npy": np.ascontiguousarray(catalog._vectors.row_vectors(np.arange(catalog.n_base)), dtype=np.float32),
+        **{f"col_{name}.npy": getattr(columns, name) for name in COLUMNS},
+        **{f"col_{name}.npy": array for name, array in columns.derived_arrays().items()},
+        "bm25_indptr.npy": bm25.indptr,
+        "bm25_doc_ids.npy": bm25.doc_ids,
+        "bm25_tfs.npy": bm25.tfs,
+        "bm25_doc_len.npy": bm25.doc_len,
+        **{f"bm25_{name}.npy": array for name, array in bm25.derived_arrays().items()},
+    }
+    lines = [json.dumps(r.to_dict(), separators=(",", ":")).encode() + b"\n" for r in catalog.offers]
+    (directory / "offers.jsonl").write_bytes(b"".join(lines))
+    arrays["offers_offsets.npy"] = np.concatenate([[0], np.cumsum([len(line) for line in lines])]).astype(np.int64)
+    ids = np.array([r["id"] for r in catalog.offers], dtype=str)
+    order = np.argsort(ids, kind="stable")
+    arrays["ids.npy"], arrays["ids_rows.npy"] = ids[order], order.astype(np.int64)
+    for name, array in arrays.items():
+        np.save(directory / name, array)
+    documents = {
+        "columns.json": {"categories": columns.categories, "merchants": columns.merchants},
+        "bm25_vocab.json": sorted(bm25.vocab, key=bm25.vocab.get),
+    }
+    for name, doc in documents.items():
+        (directory / name).write_text(json.dumps(doc, separators=(",", ":")))
+
+    files = {name: _sha256(directory / name) for name in sorted([*arrays, *documents, "offers.jsonl"])}
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": catalog.version,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "offers": catalog.n_base,
+        "dim": int(arrays["embeddings.npy"].shape[1]),
+        "files": files,
+        "sizes": {name: (directory / name).stat().st_size for name in files},
+        "checksum": _manifest_checksum(files),
+    }
+    (directory / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+    current = root / "CURRENT.tmp"
+    current.write_text(directory.name)
+    os.replace(current, root / "CURRENT")
+    return directory
+
+
+def load_snapshot(root: str | Path, verify: bool = False, dim: Optional[int] = None) -> CatalogSnapshot:
+    """Map a snapshot written by write_snapshot (read-only; nothing is re-embedded or re-tokenized).
+
+    File sizes are always checked against the manifest (a stat per file,
+    which catches truncated copies). With verify, every file is also hashed
+    against the manifest's SHA-256; that reads the whole snapshot, so it is
+    opt-in. ValueError on a size or checksum mismatch, an unknown format, or
+    embeddings whose width differs from dim.
+    """
+    directory = resolve(root)
+    manifest = json.loads((directory / "manifest.json").read_text())
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')!r} in {directory}")
+    if dim is not None and manifest["dim"] != dim:
+        raise ValueError(f"Snapshot embeddings are {manifest['dim']}-d, expected {dim} in {directory}")
+    files = manifest["files"]
+    if _manifest_checksum(files) != manifest["checksum"]:
+        raise ValueError(f"Snapshot manifest checksum mismatch in {directory}")
+    for name, size in manifest.get("sizes", {}).items():
+        if (directory / name).stat().st_size != size:
+            raise ValueError(f"Snapshot file {name} is not {size} bytes in {directory}")
+    if verify:
+        for name, digest in files.items():
+            if _sha256(directory / name) != digest:
+                raise ValueError(f"Snapshot file {name} does not match its checksum in {directory}")
+
+    def array(name: str) -> np.ndarray:
+        return np.load(directory / name, mmap_mode="r")
+
+    def document(name: str):
+        return json.loads((directory / name).read_text())
+
+    def arrays(prefix: str) -> dict[str, np.ndarray]:
+        return {name[len(prefix):-len(".npy")]: array(name) for name in files if name.startswith(prefix) and name.endswith(".npy")}
+
+    embeddings = array("embeddings.npy")
+    names = document("columns.json")
+    vocab = document("bm25_vocab.json")
+    return CatalogSnapshot(
+        version=manifest["version"],
+        records=MappedRecords(directory / "offers.jsonl", array("offers_offsets.npy")),
+        vectors=build_vector_index(embeddings, normalized=True),
+        tail=GrowableArray(np.empty((0, manifest["dim"]), dtype=np.float32)),
+        bm25=BM25Index.mapped({term: i for i, term in enumerate(vocab)}, arrays("bm25_")),
+        columns=OfferColumns.mapped(names["categories"], names["merchants"], arrays("col_")),
+        base_rows=MappedIds(array("ids.npy"), array("ids_rows.npy")),
+    )
+
+
+def current_version(root: str | Path) -> Optional[int]:
+    """Catalog version of root's CURRENT snapshot, or None when there is none."""
+    try:
+        return json.loads((resolve(root) / "manifest.json").read_text())["version"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def main() -> None:
+    from app.store import InMemoryStore
+
+    parser = argparse.ArgumentParser(description="Build the catalog indexes and write a memory-mappable snapshot.")
+    parser.add_argument("--out", default=get_settings().SNAPSHOT_DIR or "snapshots")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    version = (current_version(args.out) or 0) + 1
+    catalog = CatalogSnapshot.build(*InMemoryStore._seed_catalog(), version=version)
+    directory = write_snapshot(catalog, args.out)
+    print(f"Wrote {len(catalog)} offers as catalog v{version} to {directory} in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,617 @@
+"""SQLite-backed catalog store: offer attributes in SQLite, FTS5 for BM25, embeddings in a memory-mapped file.
+
+A persistent single-node backend that needs no server (STORE_BACKEND=sqlite).
+SQLITE_DIR holds two files:
+
+  catalog.db    offers(row, id, category, price_cents, monthly_cents, apr, born, died, data),
+                indexed on category, price, monthly payment and APR; offers_fts, an
+                FTS5 table over the lexical fields the in-memory BM25 indexes
+                (rowid = row); meta (version, rows, dim).
+  vectors.f32   unit-length float32 embeddings, row r at byte r·dim·4, memory-mapped.
+
+Versions follow the in-memory tombstones. Each offer row records the catalog
+version that wrote it (born) and the version that replaced or deleted it
+(died). A SQLiteCatalog is a cheap handle on one version, and its queries see
+only rows with born <= version < died. A request pinned to a handle is
+therefore unaffected by later writes, and the store publishes new handles
+exactly as it publishes snapshots.
+
+Each write runs as one BEGIN IMMEDIATE transaction that writes vectors past
+meta.rows, inserts and retires rows, and bumps the version. compact() deletes
+retired rows that no live handle in this process can still see. The vector
+file is append-only, so replaced offers keep their vector rows until the
+database is rebuilt into a fresh SQLITE_DIR.
+
+Reads use a pool of read-only connections (SQLITE_READ_CONNECTIONS), which
+run concurrently because SQLite releases the GIL while a statement executes.
+WAL mode lets them proceed during a write. Several processes (app.serve
+workers) can share one directory. snapshot() does no I/O, so it is safe on the
+event loop: a watcher thread per process polls PRAGMA data_version every
+SQLITE_POLL_MS on a connection of its own and publishes versions committed by
+the others. A handle's offer count is read when it is created (a version's
+live rows never change), and pending_rows is a counter the database refreshes
+whenever it publishes a handle or purges.
+
+Vector scores match the exact in-memory index. BM25 scores come from FTS5,
+which uses k1 = 1.2 and counts retired rows in its statistics until
+compaction, so they differ slightly from app/index/bm25.py.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.catalog import _offer_text
+from app.config import get_settings
+from app.index.bm25 import tokenize
+from app.index.columns import cents_ceiling, to_cents
+from app.index.vector import normalize_rows, top_k_indices
+from app.records import Hit, LazyOffers, OfferRecord
+from app.store import InMemoryStore, _COMPACT_MIN_ROWS
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('version', 0), ('rows', 0), ('dim', 0);
+CREATE TABLE IF NOT EXISTS offers (
+    row INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    price_cents INTEGER NOT NULL,
+    monthly_cents INTEGER NOT NULL,
+    apr REAL NOT NULL,
+    born INTEGER NOT NULL,
+    died INTEGER,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS offers_live_id ON offers(id) WHERE died IS NULL;
+CREATE INDEX IF NOT EXISTS offers_id ON offers(id);
+CREATE INDEX IF NOT EXISTS offers_category ON offers(category, price_cents);
+CREATE INDEX IF NOT EXISTS offers_price ON offers(price_cents);
+CREATE INDEX IF NOT EXISTS offers_monthly ON offers(monthly_cents);
+CREATE INDEX IF NOT EXISTS offers_apr ON offers(apr);
+CREATE INDEX IF NOT EXISTS offers_retired ON offers(died) WHERE died IS NOT NULL;
+CREATE VIRTUAL TABLE IF NOT EXISTS offers_fts USING fts5(text);
+"""
+
+# Constrained vector searches score the eligible rows directly when at most this many
+# (or 1/64 of the catalog) qualify; broader constraints scan all rows and check the winners
+_PREFILTER_ROWS = 4096
+
+
+def _where(filters: Optional[dict], version: int) -> tuple[str, list]:
+    """SQL predicate over offers (aliased o) for one version and a constraint dict (row_filter keys)."""
+    clauses = ["o.born <= ?", "(o.died IS NULL OR o.died > ?)"]
+    params: list = [version, version]
+    filters = filters or {}
+    if filters.get("category"):
+        clauses.append("o.category = ?")
+        params.append(filters["category"].lower())
+    if filters.get("max_price") is not None:
+        clauses.append("o.price_cents <= ?")
+        params.append(cents_ceiling(filters["max_price"]))
+    if filters.get("max_monthly") is not None:
+        clauses.append("o.monthly_cents <= ?")
+        params.append(cents_ceiling(filters["max_monthly"]))
+    if filters.get("only_zero_apr"):
+        clauses.append("o.apr = 0")
+    return " AND ".join(clauses), params
+
+
+def _constrained(filters: Optional[dict]) -> bool:
+    filters = filters or {}
+    return bool(filters.get("category") or filters.get("only_zero_apr")
+                or filters.get("max_price") is not None or filters.get("max_monthly") is not None)
+
+
+def _record(data: str) -> OfferRecord:
+    return OfferRecord.from_dict(json.loads(data))
+
+
+class _ConnectionPool:
+    """Read-only connections to one database, opened on demand up to size and reused.
+
+    Connections never cross a fork: a child process starts with an empty pool
+    (the inherited connections are kept referenced, never used or closed).
+    """
+
+    def __init__(self, path: Path, size: int, mmap_bytes: int) -> None:
+        self._path = path
+        self._size = max(1, size)
+        self._mmap_bytes = mmap_bytes
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self._size)
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self._path}?mode=ro", uri=True, check_same_thread=False, isolation_level=None)
+        conn.execute(f"PRAGMA mmap_size = {int(self._mmap_bytes)}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            if self._pid != os.getpid():
+                _inherited.append(self._idle)
+                self._reset()
+            idle, slots = self._idle, self._slots
+        slots.acquire()
+        try:
+            try:
+                conn = idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            try:
+                yield conn
+            finally:
+                idle.put(conn)
+        finally:
+            slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# Connections inherited across a fork: referenced so they are never finalized in the child
+_inherited: list = []
+
+
+class CatalogDatabase:
+    """The files in one SQLITE_DIR: schema, the vector file, read pool and the writer connection."""
+
+    def __init__(self, directory: str | Path, dim: int, read_connections: int = 8, mmap_bytes: int = 256 << 20) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / "catalog.db"
+        self.vector_path = self.directory / "vectors.f32"
+        self.vector_path.touch()
+        self.dim = dim
+        self._write_conn: Optional[sqlite3.Connection] = None
+        self._writer_pid = 0
+        conn = self._writer()
+        conn.executescript(_SCHEMA)
+        stored_dim = conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()[0]
+        if stored_dim and stored_dim != dim:
+            raise ValueError(f"{self.path} holds {stored_dim}-dim embeddings, expected {dim}")
+        self._pool = _ConnectionPool(self.path, read_connections, mmap_bytes)
+        self._mapped = np.empty((0, dim), dtype=np.float32)
+        self._map_lock = threading.Lock()
+        self._handles: "weakref.WeakSet[SQLiteCatalog]" = weakref.WeakSet()
+        self._handles_lock = threading.Lock()
+        self.retired = 0  # retired rows not yet purged, as of the last catalog() / purge()
+        self._counts_lock = threading.Lock()  # so a stale count can't land after a purge's
+
+    def _writer(self) -> sqlite3.Connection:
+        if self._write_conn is None or self._writer_pid != os.getpid():
+            if self._write_conn is not None:
+                _inherited.append(self._write_conn)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._write_conn, self._writer_pid = conn, os.getpid()
+        return self._write_conn
+
+    def read(self):
+        """A pooled read-only connection (context manager)."""
+        return self._pool.connection()
+
+    def open_reader(self) -> sqlite3.Connection:
+        """A read-only connection of the caller's own, outside the pool (the version watcher's)."""
+        return self._pool._open()
+
+    def meta(self) -> dict[str, int]:
+        with self.read() as conn:
+            return dict(conn.execute("SELECT key, value FROM meta"))
+
+    def vectors(self, rows: int) -> np.ndarray:
+        """Read-only view of the first rows embeddings (remapped when the file has grown)."""
+        with self._map_lock:
+            if rows > len(self._mapped):
+                self._mapped = np.memmap(self.vector_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            return self._mapped[:rows]
+
+    def catalog(self) -> "SQLiteCatalog":
+        """A handle on the latest committed version (reads its counts: call it off the event loop)."""
+        with self._counts_lock, self.read() as conn:
+            conn.execute("BEGIN")  # one read transaction: the counts belong to the version
+            try:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+                where, params = _where(None, meta["version"])
+                count = conn.execute(f"SELECT count(*) FROM offers o WHERE {where}", params).fetchone()[0]
+                self.retired = conn.execute("SELECT count(*) FROM offers WHERE died IS NOT NULL").fetchone()[0]
+            finally:
+                conn.execute("COMMIT")
+        handle = SQLiteCatalog(self, meta["version"], meta["rows"], count)
+        with self._handles_lock:
+            self._handles.add(handle)
+        return handle
+
+    def oldest_pinned(self, default: int) -> int:
+        with self._handles_lock:
+            return min((h.version for h in self._handles), default=default)
+
+    # ── Writes ──
+
+    def write(
+        self, upserts: list[tuple[OfferRecord, np.ndarray]], deletes: Iterable[str] = (), replace: bool = False,
+    ) -> tuple[int, list[str]]:
+        """Commit one new version: upserts (last write of an id wins), then deletes; replace retires every
+        other offer first. Returns the version and the deleted ids that existed (no new version when
+        nothing changed)."""
+        latest = {record["id"]: (record, embedding) for record, embedding in upserts}
+        conn = self._writer()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            version, rows = meta["version"] + 1, meta["rows"]
+            if replace:
+                conn.execute("UPDATE offers SET died = ? WHERE died IS NULL", (version,))
+            if latest:
+                conn.executemany(
+                    "UPDATE offers SET died = ? WHERE id = ? AND died IS NULL", [(version, i) for i in latest],
+                )
+                self._write_vectors(rows, [e for _, e in latest.values()])
+                records = [r for r, _ in latest.values()]
+                conn.executemany("INSERT INTO offers VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?)", [
+                    (rows + i, r["id"], r["category"].lower(), to_cents(r["totalPrice"]), to_cents(r["monthlyPayment"]),
+                     r["apr"], version, json.dumps(r.to_dict(), separators=(",", ":")))
+                    for i, r in enumerate(records)
+                ])
+                conn.executemany("INSERT INTO offers_fts(rowid, text) VALUES (?, ?)", [
+                    (rows + i, " ".join(tokenize(_offer_text(r)))) for i, r in enumerate(records)
+                ])
+            deleted = [
+                i for i in dict.fromkeys(deletes)
+                if conn.execute("UPDATE offers SET died = ? WHERE id = ? AND died IS NULL", (version, i)).rowcount
+            ]
+            if not latest and not deleted and not replace:
+                conn.execute("ROLLBACK")
+                return meta["version"], []
+            conn.executemany("UPDATE meta SET value = ? WHERE key = ?", [
+                (version, "version"), (rows + len(latest), "rows"), (self.dim, "dim"),
+            ])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return version, deleted
+
+    def _write_vectors(self, start: int, embeddings: list[np.ndarray]) -> None:
+        """Unit-length vectors at rows [start, ...), durable before the rows that point at them commit."""
+        vectors = normalize_rows(np.array(embeddings, dtype=np.float32).reshape(len(embeddings), self.dim))
+        with open(self.vector_path, "r+b") as f:
+            f.seek(start * self.dim * 4)
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def retired_rows(self) -> int:
+        with self.read() as conn:
+            return conn.execute("SELECT count(*) FROM offers WHERE died IS NOT NULL").fetchone()[0]
+
+    def purge(self, before: int) -> int:
+        """Delete rows retired at or before a version (invisible to every handle from that version on)."""
+        conn = self._writer()
+        with self._counts_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM offers_fts WHERE rowid IN (SELECT row FROM offers WHERE died <= ?)", (before,))
+                purged = conn.execute("DELETE FROM offers WHERE died <= ?", (before,)).rowcount
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self.retired = self.retired_rows()
+        return purged
+
+    def close(self) -> None:
+        self._pool.close()
+        if self._write_conn is not None and self._writer_pid == os.getpid():
+            self._write_conn.close()
+        self._write_conn = None
+
+
+class SQLiteCatalog:
+    """One committed version of a SQLite catalog: the CatalogSnapshot read interface, served by SQL."""
+
+    def __init__(self, db: CatalogDatabase, version: int, rows: int, count: int) -> None:
+        self.version = version
+        self._db = db
+        self._vectors = db.vectors(rows)
+        self._len = count
+
+    def _visible(self, filters: Optional[dict] = None) -> tuple[str, list]:
+        return _where(filters, self.version)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, offer_id: object) -> bool:
+        where, params = self._visible()
+        with self._db.read() as conn:
+            return conn.execute(f"SELECT 1 FROM offers o WHERE o.id = ? AND {where}", [offer_id, *params]).fetchone() is not None
+
+    @property
+    def offers(self) -> Sequence[OfferRecord]:
+        """Live offer records in row order (read lazily; slice rather than iterate large catalogs)."""
+        return LazyOffers(self._select, len(self))
+
+    @property
+    def pending_rows(self) -> int:
+        """Retired rows not yet purged by compaction (the database's last count; no query)."""
+        return self._db.retired
+
+    def _select(self, limit: int, offset: int, filters: Optional[dict] = None) -> list[OfferRecord]:
+        where, params = self._visible(filters)
+        with self._db.read() as conn:
+            rows = conn.execute(
+                f"SELECT o.data FROM offers o WHERE {where} ORDER BY o.row LIMIT ? OFFSET ?", [*params, limit, offset],
+            ).fetchall()
+        return [_record(data) for data, in rows]
+
+    def _fetch(self, rows: np.ndarray) -> dict[int, OfferRecord]:
+        """Records of the given (visible) rows."""
+        with self._db.read() as conn:
+            found = conn.execute(
+                "SELECT o.row, o.data FROM json_each(?) j CROSS JOIN offers o ON o.row = j.value",
+                [json.dumps(rows.tolist())],
+            ).fetchall()
+        return {row: _record(data) for row, data in found}
+
+    def _keep(self, rows: np.ndarray, filters: Optional[dict]) -> set[int]:
+        """The given rows that are visible and satisfy filters."""
+        where, params = self._visible(filters)
+        with self._db.read() as conn:
+            return {row for row, in conn.execute(
+                f"SELECT o.row FROM json_each(?) j CROSS JOIN offers o ON o.row = j.value WHERE {where}",
+                [json.dumps(rows.tolist()), *params],
+            )}
+
+    def live_rows(self) -> tuple[list[OfferRecord], np.ndarray]:
+        """Live records and their embeddings (e.g. to build an in-memory catalog from this one)."""
+        where, params = self._visible()
+        with self._db.read() as conn:
+            found = conn.execute(f"SELECT o.row, o.data FROM offers o WHERE {where} ORDER BY o.row", params).fetchall()
+        rows = np.array([row for row, _ in found], dtype=np.int64)
+        return [_record(data) for _, data in found], np.array(self._vectors[rows])
+
+    # ── Search ──
+
+    def bm25_search(self, query: str, top_k: int = 20, filters: Optional[dict] = None) -> list[Hit]:
+        """FTS5 BM25 over offer text (merchantName + productName + category), top-k among eligible offers."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or top_k <= 0:
+            return []
+        where, params = self._visible(filters)
+        with self._db.read() as conn:
+            found = conn.execute(
+                "SELECT o.data, -bm25(offers_fts) AS score FROM offers_fts JOIN offers o ON o.row = offers_fts.rowid"
+                f" WHERE offers_fts MATCH ? AND {where} ORDER BY score DESC, o.row LIMIT ?",
+                [" OR ".join(f'"{t}"' for t in tokens), *params, top_k],
+            ).fetchall()
+        return [Hit(_record(data), "_bm25_score", score) for data, score in found]
+
+    def vector_search(
+        self, query_embedding: list[float], top_k: int = 20, filters: Optional[dict] = None,
+    ) -> list[Hit]:
+        """Cosine similarity over the mapped embeddings, top-k among eligible offers."""
+        query = normalize_rows(np.asarray(query_embedding, dtype=np.float32))
+        n = len(self._vectors)
+        if not n or top_k <= 0:
+            return []
+        if _constrained(filters):
+            where, params = self._visible(filters)
+            cap = max(_PREFILTER_ROWS, n // 64)
+            with self._db.read() as conn:
+                count = conn.execute(f"SELECT count(*) FROM (SELECT 1 FROM offers o WHERE {where} LIMIT ?)", [*params, cap + 1]).fetchone()[0]
+                eligible = [row for row, in conn.execute(f"SELECT o.row FROM offers o WHERE {where}", params)] if count <= cap else None
+            if eligible is not None:
+                rows = np.array(eligible, dtype=np.int64)
+                scores = self._vectors[rows] @ query
+                top = top_k_indices(scores, top_k)
+                records = self._fetch(rows[top])
+                return [Hit(records[r], "_similarity", s) for r, s in zip(rows[top].tolist(), scores[top].tolist())]
+        return self._scan(self._vectors @ query, top_k, filters)
+
+    def _scan(self, scores: np.ndarray, top_k: int, filters: Optional[dict]) -> list[Hit]:
+        """Top-k of all-row scores, skipping rows this version can't see or filters exclude."""
+        want = top_k * 4
+        while True:
+            top = top_k_indices(scores, want)
+            keep = self._keep(top, filters)
+            top = np.array([r for r in top.tolist() if r in keep][:top_k], dtype=np.int64)
+            if len(top) == top_k or want >= len(scores):
+                records = self._fetch(top)
+                return [Hit(records[r], "_similarity", s) for r, s in zip(top.tolist(), scores[top].tolist())]
+            want *= 4
+
+    def vector_search_many(self, queries: list[list[float]], top_k: int = 20) -> list[list[Hit]]:
+        """Batched unconstrained vector_search: one matrix-matrix product for a block of queries."""
+        if not len(queries) or not len(self._vectors):
+            return [[] for _ in queries]
+        scores = self._vectors @ normalize_rows(np.asarray(queries, dtype=np.float32)).T
+        return [self._scan(np.ascontiguousarray(column), top_k, None) for column in scores.T]
+
+    def filter_offers(
+        self,
+        category: Optional[str] = None,
+        max_price: Optional[float] = None,
+        max_monthly: Optional[float] = None,
+        only_zero_apr: bool = False,
+    ) -> list[OfferRecord]:
+        """SQL filter on offers (indexed on category, price, monthly payment and APR), in row order."""
+        filters = {"category": category, "max_price": max_price, "max_monthly": max_monthly, "only_zero_apr": only_zero_apr}
+        return self._select(-1, 0, filters)
+
+    def eligible(self, offer_ids: list[str], filters: Optional[dict]) -> list[bool]:
+        """Whether each offer satisfies the constraint dict (same keys as row_filter)."""
+        where, params = self._visible(filters)
+        with self._db.read() as conn:
+            found = {i for i, in conn.execute(
+                f"SELECT o.id FROM json_each(?) j CROSS JOIN offers o ON o.id = j.value WHERE {where}",
+                [json.dumps(list(offer_ids)), *params],
+            )}
+        return [i in found for i in offer_ids]
+
+    def filter_mask(self, *args, **kwargs) -> np.ndarray:
+        raise NotImplementedError("SQLite catalogs have no row-indexed masks; use eligible() or filter_offers()")
+
+    def row_of(self, offer_id: str) -> int:
+        raise NotImplementedError("SQLite catalogs have no row-indexed masks; use eligible() or filter_offers()")
+
+
+class SQLiteStore(InMemoryStore):
+    """The store API over a SQLite catalog (STORE_BACKEND=sqlite); profile fixtures stay in memory."""
+
+    _instance: Optional["SQLiteStore"] = None
+
+    def _seed(self) -> None:
+        settings = get_settings()
+        self._db = CatalogDatabase(
+            settings.SQLITE_DIR, settings.EMBEDDING_DIM, settings.SQLITE_READ_CONNECTIONS, settings.SQLITE_MMAP_BYTES,
+        )
+        if self._db.meta()["version"] == 0:
+            # Empty database: import the configured catalog (SNAPSHOT_DIR, else the seed offers)
+            records, embeddings = self._load_catalog().live_rows()
+            self._db.write(list(zip(records, embeddings)), replace=True)
+        self._snapshot = self._db.catalog()
+        self._watch_lock = threading.Lock()
+        self._watch_stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_pid = 0
+        self._start_watcher()
+
+    def snapshot(self) -> SQLiteCatalog:
+        """The latest version this process has published; no I/O.
+
+        Versions committed by other processes are published by the watcher
+        thread within SQLITE_POLL_MS.
+        """
+        if self._watcher_pid != os.getpid():
+            self._start_watcher()  # after a fork: the parent's thread is not in this process
+        return self._snapshot
+
+    def _start_watcher(self) -> None:
+        with self._watch_lock:
+            if self._watcher_pid != os.getpid():
+                self._watch_stop = threading.Event()
+                self._watcher = threading.Thread(target=self._watch, name="sqlite-watch", daemon=True)
+                self._watcher_pid = os.getpid()
+                self._watcher.start()
+
+    def _watch(self) -> None:
+        """Publish a new handle whenever another connection commits (PRAGMA data_version changes)."""
+        interval, stop = get_settings().SQLITE_POLL_MS / 1000, self._watch_stop
+        conn = self._db.open_reader()
+        try:
+            seen = None
+            while True:
+                changed = conn.execute("PRAGMA data_version").fetchone()[0]
+                if changed != seen:
+                    seen = changed
+                    self._publish()
+                if stop.wait(interval):
+                    return
+        except Exception as e:
+            logger.warning("sqlite_store.watch_failed", extra={"error": str(e)})
+        finally:
+            conn.close()
+
+    def _publish(self) -> None:
+        """Publish the latest committed version if it is newer (a discarded handle pins nothing)."""
+        catalog = self._db.catalog()
+        with self._write_lock:
+            if catalog.version > self._snapshot.version:
+                self._snapshot = catalog
+
+    def close(self) -> None:
+        super().close()
+        if self._watcher is not None and self._watcher_pid == os.getpid():
+            self._watch_stop.set()
+            self._watcher.join()
+        self._watcher, self._watcher_pid = None, 0
+        self._db.close()
+
+    # ── Catalog mutations ──
+
+    def upsert_offers(self, offers: Iterable[Mapping]) -> list[str]:
+        """Insert or replace offers by id; returns the ids written (see InMemoryStore.upsert_offers)."""
+        dim = get_settings().EMBEDDING_DIM
+        upserts = self._prepare(offers, dim)
+        with self._write_lock:
+            self._db.write(upserts)
+            self._snapshot = self._db.catalog()
+            self._maybe_compact()
+        return [record["id"] for record, _ in upserts]
+
+    def delete_offers(self, offer_ids: Iterable[str]) -> list[str]:
+        """Retire offers by id; returns the ids that existed."""
+        with self._write_lock:
+            _, deleted = self._db.write([], offer_ids)
+            if deleted:
+                self._snapshot = self._db.catalog()
+                self._maybe_compact()
+        return deleted
+
+    def _maybe_compact(self) -> None:
+        threshold = max(_COMPACT_MIN_ROWS, get_settings().STORE_COMPACT_RATIO * len(self._snapshot))
+        if self._db.retired_rows() > threshold:
+            self._compact()
+
+    def _compact(self) -> None:
+        t0 = time.perf_counter()
+        purged = self._db.purge(self._db.oldest_pinned(default=self._snapshot.version))
+        logger.info("store.compacted", extra={
+            "purged": purged, "ms": round((time.perf_counter() - t0) * 1000, 1),
+        })
+
+    def reload(self, offers: Optional[Iterable[Mapping]] = None) -> Future:
+        """Replace the catalog with offers in a background thread; None re-reads the database
+        (picking up versions other processes committed). The Future resolves to the new version."""
+        if offers is None:
+            return self._submit_reload(self._db.catalog)
+        offers = list(offers)
+
+        def replace() -> SQLiteCatalog:
+            records, embeddings = self._prepare_catalog(offers)
+            with self._write_lock:
+                self._db.write(list(zip(records, embeddings)), replace=True)
+            return self._db.catalog()
+
+        return self._submit_reload(replace)
+
+    def _reload(self, source: Callable[[], SQLiteCatalog]) -> int:
+        t0 = time.perf_counter()
+        catalog = source()
+        with self._write_lock:
+            # Versions are assigned by the database; never publish an older one
+            if catalog.version >= self._snapshot.version:
+                self._snapshot = catalog
+            catalog = self._snapshot
+        logger.info("store.reloaded", extra={
+            "offers": len(catalog), "version": catalog.version, "ms": round((time.perf_counter() - t0) * 1000, 1),
+        })
+        return catalog.version
@@ -1,22 +1,50 @@
 """In-memory data store. Used when USE_MOCK_DB=true (default).
 Drop-in replacement for Postgres queries — same interface, backed by Python lists.
 Includes BM25-style lexical search alongside vector search for hybrid retrieval.
+
+Offers and their indexes live in an immutable CatalogSnapshot (app/catalog.py).
+Reads never take a lock: each search runs against the snapshot published when
+it started (requests pin one via snapshot()). Writers serialize on a lock and
+publish a new snapshot with one reference assignment:
+  - upsert_offers / delete_offers derive the next version incrementally
+    (appended tail rows + tombstones);
+  - compact() rebuilds a clean base once tail + tombstones outgrow
+    STORE_COMPACT_RATIO of the base;
+  - reload() rebuilds the whole catalog in a background thread.
+
+With SNAPSHOT_DIR set, the catalog is memory-mapped from a snapshot written by
+`python -m app.snapshot` instead of being embedded and indexed at startup, and
+reload() re-reads that directory's CURRENT snapshot.
+
+With STORE_SHARDS > 1, catalog versions are ShardedCatalogs (app/shards.py):
+the same interface, with the indexes partitioned across shard processes.
 """
 
 from __future__ import annotations
 
-import math
-import re
+import logging
+import threading
+import time
 import numpy as np
-from collections import Counter
-from typing import Optional
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
 
-from app.seed import build_offers, MOCK_PLANS, MOCK_INSIGHTS, MOCK_USER, MOCK_ELIGIBILITY, _deterministic_embedding
+from app.catalog import CatalogSnapshot
+from app.config import get_settings
+from app.embed_cache import get_embedding_cache, normalize_query
+from app.embed_catalog import offer_embedder
+from app.embedder import get_embedder
+from app.events import get_event_log
+from app import snapshot as snapshot_files
+from app.records import Hit, OfferRecord
+from app.shards import ShardedCatalog, ShardPool
+from app.seed import build_offer, build_offers, offer_embed_text, MOCK_PLANS, MOCK_INSIGHTS, MOCK_USER, MOCK_ELIGIBILITY
 
+logger = logging.getLogger(__name__)
 
-def _tokenize(text: str) -> list[str]:
-    """Lowercase, strip punctuation, split on whitespace."""
-    return re.findall(r"[a-z0-9]+", text.lower())
+# Compaction never triggers before this many tail + tombstoned rows
+_COMPACT_MIN_ROWS = 256
 
 
 class InMemoryStore:
@@ -25,17 +53,14 @@ class InMemoryStore:
     _instance: Optional["InMemoryStore"] = None
 
     def __init__(self) -> None:
-        self.offers: list[dict] = []
         self.plans: list[dict] = list(MOCK_PLANS)
         self.insights: list[dict] = list(MOCK_INSIGHTS)
         self.user: dict = dict(MOCK_USER)
         self.eligibility: dict = dict(MOCK_ELIGIBILITY)
-        self.feedback: list[dict] = []
-        self._embeddings: Optional[np.ndarray] = None
-        # BM25 index
-        self._doc_tokens: list[list[str]] = []
-        self._doc_freqs: Counter = Counter()
-        self._avg_dl: float = 0.0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._write_lock = threading.Lock()
+        self._reloader: Optional[ThreadPoolExecutor] = None
+        self._shards: Optional[ShardPool] = None
 
     @classmethod
     def get(cls) -> "InMemoryStore":
@@ -44,74 +69,188 @@ class InMemoryStore:
             cls._instance._seed()
         return cls._instance
 
+    def snapshot(self) -> CatalogSnapshot:
+        """The current catalog version. Pin it for the duration of a request."""
+        return self._snapshot
+
+    @property
+    def catalog_version(self) -> int:
+        return self._snapshot.version
+
+    @property
+    def offers(self) -> list[OfferRecord]:
+        """Live offer records in row order."""
+        return self._snapshot.offers
+
+    @staticmethod
+    def _seed_catalog() -> tuple[list[OfferRecord], np.ndarray]:
+        offers = build_offers(offer_embedder())
+        # Embeddings live only in the vector index; offers become shared immutable records
+        embeddings = np.array([o.pop("embedding") for o in offers], dtype=np.float32)
+        return [OfferRecord.from_dict(o) for o in offers], embeddings
+
+    def _build(self, records: list[OfferRecord], embeddings: np.ndarray, version: int) -> CatalogSnapshot:
+        """A clean catalog version, partitioned across the shard processes when sharding is on."""
+        if self._shards is not None:
+            return ShardedCatalog.build(self._shards, records, embeddings, version)
+        return CatalogSnapshot.build(records, embeddings, version)
+
+    def _load_catalog(self) -> CatalogSnapshot:
+        """The catalog from SNAPSHOT_DIR when configured, else built from the seed offers."""
+        settings = get_settings()
+        if settings.SNAPSHOT_DIR:
+            try:
+                t0 = time.perf_counter()
+                catalog = snapshot_files.load_snapshot(
+                    settings.SNAPSHOT_DIR, verify=settings.SNAPSHOT_VERIFY, dim=settings.EMBEDDING_DIM,
+                )
+                logger.info("store.snapshot_loaded", extra={
+                    "version": catalog.version, "offers": len(catalog),
+                    "ms": round((time.perf_counter() - t0) * 1000, 1),
+                })
+                if self._shards is not None:
+                    return self._build(*catalog.live_rows(), version=catalog.version)
+                return catalog
+            except (OSError, ValueError) as e:
+                logger.error("store.snapshot_failed", extra={"dir": settings.SNAPSHOT_DIR, "error": str(e)})
+        return self._build(*self._seed_catalog(), version=1)
+
     def _seed(self) -> None:
-        self.offers = build_offers()
-        emb_list = [o["embedding"] for o in self.offers]
-        self._embeddings = np.array(emb_list, dtype=np.float32)
-        self._build_bm25_index()
-
-    def _build_bm25_index(self) -> None:
-        """Build in-memory BM25 index over offer text fields."""
-        self._doc_tokens = []
-        self._doc_freqs = Counter()
-        for o in self.offers:
-            text = f"{o.get('merchantName', '')} {o.get('productName', '')} {o.get('category', '')}"
-            tokens = _tokenize(text)
-            self._doc_tokens.append(tokens)
-            unique = set(tokens)
-            for t in unique:
-                self._doc_freqs[t] += 1
-        total_len = sum(len(dt) for dt in self._doc_tokens)
-        self._avg_dl = total_len / max(len(self._doc_tokens), 1)
-
-    def bm25_search(self, query: str, top_k: int = 20) -> list[dict]:
-        """BM25 scoring over offer text (merchantName + productName + category)."""
-        query_tokens = _tokenize(query)
-        if not query_tokens:
-            return []
-
-        n = len(self.offers)
-        k1 = 1.5
-        b = 0.75
-        scores: list[float] = []
-
-        for i, doc_tokens in enumerate(self._doc_tokens):
-            dl = len(doc_tokens)
-            tf_map = Counter(doc_tokens)
-            score = 0.0
-            for qt in query_tokens:
-                df = self._doc_freqs.get(qt, 0)
-                if df == 0:
-                    continue
-                idf = math.log((n - df + 0.5) / (df + 0.5) + 1.0)
-                tf = tf_map.get(qt, 0)
-                tf_norm = (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * dl / self._avg_dl))
-                score += idf * tf_norm
-            scores.append(score)
-
-        top_idx = sorted(range(n), key=lambda i: scores[i], reverse=True)[:top_k]
-        results = []
-        for idx in top_idx:
-            if scores[idx] > 0:
-                offer = dict(self.offers[idx])
-                offer["_bm25_score"] = scores[idx]
-                results.append(offer)
-        return results
-
-    def vector_search(self, query_embedding: list[float], top_k: int = 20) -> list[dict]:
-        """Cosine similarity search over offer embeddings."""
-        q = np.array(query_embedding, dtype=np.float32)
-        q = q / (np.linalg.norm(q) + 1e-9)
-        norms = np.linalg.norm(self._embeddings, axis=1, keepdims=True) + 1e-9
-        normed = self._embeddings / norms
-        scores = normed @ q
-        top_idx = np.argsort(scores)[::-1][:top_k]
-        results = []
-        for idx in top_idx:
-            offer = dict(self.offers[int(idx)])
-            offer["_similarity"] = float(scores[int(idx)])
-            results.append(offer)
-        return results
+        settings = get_settings()
+        if settings.STORE_SHARDS > 1:
+            self._shards = ShardPool(
+                settings.STORE_SHARDS, settings.STORE_SHARD_PLACEMENT, settings.STORE_SHARD_TIMEOUT_MS,
+            )
+        self._snapshot = self._load_catalog()
+
+    def close(self) -> None:
+        """Stop the background reloader and shard processes."""
+        if self._reloader is not None:
+            self._reloader.shutdown(wait=True)
+            self._reloader = None
+        if self._shards is not None:
+            self._shards.close()
+
+    @staticmethod
+    def _prepare(offers: Iterable[Mapping], dim: int) -> list[tuple[OfferRecord, np.ndarray]]:
+        """Records + embeddings for written offers (derived as in seeding unless "embedding" is given).
+
+        Offers without an embedding are encoded in one embed_many call. A supplied
+        embedding must have dim dimensions (ValueError otherwise, before anything is encoded).
+        """
+        offers = list(offers)
+        for raw in offers:
+            if raw.get("embedding") and len(raw["embedding"]) != dim:
+                raise ValueError(f"offer {raw['id']}: embedding has {len(raw['embedding'])} dimensions, EMBEDDING_DIM is {dim}")
+        encoded = iter(get_embedder().embed_many(offer_embed_text(raw) for raw in offers if not raw.get("embedding")))
+        prepared = []
+        for raw in offers:
+            embedding = np.asarray(raw.get("embedding") or next(encoded), dtype=np.float32)
+            offer = build_offer({k: v for k, v in raw.items() if k not in ("id", "embedding")}, raw["id"], dim, embedding)
+            prepared.append((OfferRecord.from_dict(offer), embedding))
+        return prepared
+
+    # ── Catalog mutations ──
+
+    def upsert_offers(self, offers: Iterable[Mapping]) -> list[str]:
+        """Insert or replace offers by id; returns the ids written.
+
+        Each offer needs the raw offer fields plus "id"; the embedding, reason and
+        disclosure are derived as in seeding unless an "embedding" is supplied.
+        Replacing an offer tombstones its old row and appends the new version.
+        """
+        dim = get_settings().EMBEDDING_DIM
+        upserts = self._prepare(offers, dim)
+        with self._write_lock:
+            current = self._snapshot
+            self._snapshot = current.apply(upserts, [], current.version + 1)
+            self._maybe_compact()
+        return [record["id"] for record, _ in upserts]
+
+    def delete_offers(self, offer_ids: Iterable[str]) -> list[str]:
+        """Tombstone offers by id; returns the ids that existed."""
+        with self._write_lock:
+            current = self._snapshot
+            deleted = list(dict.fromkeys(i for i in offer_ids if i in current))
+            if deleted:
+                self._snapshot = current.apply([], deleted, current.version + 1)
+                self._maybe_compact()
+        return deleted
+
+    @property
+    def pending_rows(self) -> int:
+        """Tail + tombstoned rows accumulated since the last compaction."""
+        return self._snapshot.pending_rows
+
+    def _maybe_compact(self) -> None:
+        snapshot = self._snapshot
+        threshold = max(_COMPACT_MIN_ROWS, get_settings().STORE_COMPACT_RATIO * snapshot.n_base)
+        if snapshot.pending_rows > threshold:
+            self._compact()
+
+    def compact(self) -> None:
+        """Fold the tail and drop tombstones: rebuild the base from live rows."""
+        with self._write_lock:
+            self._compact()
+
+    def _compact(self) -> None:
+        t0 = time.perf_counter()
+        current = self._snapshot
+        self._snapshot = current.compact(current.version + 1)
+        logger.info("store.compacted", extra={
+            "offers": len(self._snapshot), "ms": round((time.perf_counter() - t0) * 1000, 1),
+        })
+
+    def reload(self, offers: Optional[Iterable[Mapping]] = None) -> Future:
+        """Rebuild the whole catalog in a background thread, then publish it atomically.
+
+        offers replaces the catalog (same fields as upsert_offers); None re-reads
+        the catalog source (SNAPSHOT_DIR, else the seed offers). Searches keep
+        using the current snapshot until the swap, and writes made during the
+        rebuild are superseded by it. The returned Future resolves to the new
+        catalog version.
+        """
+        if offers is None:
+            return self._submit_reload(self._load_catalog)
+        offers = list(offers)
+        return self._submit_reload(lambda: self._build(*self._prepare_catalog(offers), version=0))
+
+    def _submit_reload(self, source: Callable[[], CatalogSnapshot]) -> Future:
+        with self._write_lock:
+            if self._reloader is None:
+                self._reloader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="catalog-reload")
+        return self._reloader.submit(self._reload, source)
+
+    def _prepare_catalog(self, offers: list[Mapping]) -> tuple[list[OfferRecord], np.ndarray]:
+        dim = get_settings().EMBEDDING_DIM
+        prepared = self._prepare(offers, dim)
+        embeddings = np.array([e for _, e in prepared], dtype=np.float32).reshape(len(prepared), dim)
+        return [r for r, _ in prepared], embeddings
+
+    def _reload(self, source: Callable[[], CatalogSnapshot]) -> int:
+        t0 = time.perf_counter()
+        snapshot = source()
+        with self._write_lock:
+            # Not yet published, so still ours to label; versions never go backwards
+            snapshot.version = max(snapshot.version, self._snapshot.version + 1)
+            self._snapshot = snapshot
+        logger.info("store.reloaded", extra={
+            "offers": len(snapshot), "version": snapshot.version, "ms": round((time.perf_counter() - t0) * 1000, 1),
+        })
+        return snapshot.version
+
+    # ── Reads (against the current snapshot; see CatalogSnapshot) ──
+
+    def bm25_search(self, query: str, top_k: int = 20, filters: Optional[dict] = None) -> list[Hit]:
+        return self._snapshot.bm25_search(query, top_k, filters)
+
+    def vector_search(
+        self, query_embedding: list[float], top_k: int = 20, filters: Optional[dict] = None,
+    ) -> list[Hit]:
+        return self._snapshot.vector_search(query_embedding, top_k, filters)
+
+    def vector_search_many(self, queries: list[list[float]], top_k: int = 20) -> list[list[Hit]]:
+        return self._snapshot.vector_search_many(queries, top_k)
 
     def filter_offers(
         self,
@@ -119,26 +258,44 @@ class InMemoryStore:
         max_price: Optional[float] = None,
         max_monthly: Optional[float] = None,
         only_zero_apr: bool = False,
-    ) -> list[dict]:
-        """SQL-like filter on offers."""
-        results = list(self.offers)
-        if category:
-            results = [o for o in results if o["category"] == category.lower()]
-        if max_price is not None:
-            results = [o for o in results if o["totalPrice"] <= max_price]
-        if max_monthly is not None:
-            results = [o for o in results if o["monthlyPayment"] <= max_monthly]
-        if only_zero_apr:
-            results = [o for o in results if o["apr"] == 0]
-        return results
-
-    def get_embedding(self, text: str) -> list[float]:
-        """Generate query embedding (deterministic hash-based or real model)."""
-        return _deterministic_embedding(text)
+    ) -> list[OfferRecord]:
+        return self._snapshot.filter_offers(category, max_price, max_monthly, only_zero_apr)
+
+    def filter_mask(
+        self,
+        category: Optional[str] = None,
+        max_price: Optional[float] = None,
+        max_monthly: Optional[float] = None,
+        only_zero_apr: bool = False,
+    ) -> np.ndarray:
+        return self._snapshot.filter_mask(category, max_price, max_monthly, only_zero_apr)
+
+    def row_of(self, offer_id: str) -> int:
+        return self._snapshot.row_of(offer_id)
+
+    def get_embedding(self, text: str) -> np.ndarray:
+        """Query embedding (app/embedder.py), cached by normalized query (app/embed_cache.py).
+
+        The returned vector is shared and read-only.
+        """
+        query = normalize_query(text)
+        embedder = get_embedder()
+        cache = get_embedding_cache()
+        embedding = cache.get(embedder.model_id, query)
+        if embedding is None:
+            embedding = cache.put(embedder.model_id, query, embedder.embed(query))
+        return embedding
 
     def add_feedback(self, feedback: dict) -> None:
-        self.feedback.append(feedback)
+        get_event_log().record("feedback", feedback)
 
 
 def get_store() -> InMemoryStore:
+    backend = get_settings().STORE_BACKEND
+    if backend == "sqlite":
+        from app.sqlite_store import SQLiteStore
+        return SQLiteStore.get()
+    if backend == "postgres":
+        from app.pg_store import PgStore
+        return PgStore.get()
     return InMemoryStore.get()
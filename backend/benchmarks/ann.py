@@ -0,0 +1,98 @@
+"""Recall-vs-latency benchmark: IVF index vs exact cosine search.
+
+Generates synthetic clustered catalogs (384-dim, like bge-small) and reports,
+per catalog size and nprobe, recall@20 against the exact path plus p50/p95
+query latency, flagging operating points that fit RETRIEVE_TIMEOUT_MS.
+
+Usage:
+    python -m benchmarks.ann
+    python -m benchmarks.ann --sizes 10000 100000 --nprobe 4 8 16 32
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+_backend_root = str(Path(__file__).resolve().parent.parent)
+if _backend_root not in sys.path:
+    sys.path.insert(0, _backend_root)
+
+from app.config import get_settings
+from app.index.ivf import IVFVectorIndex
+from app.index.vector import ExactVectorIndex, normalize_rows
+
+TOP_K = 20
+
+
+def synthetic_catalog(n: int, dim: int, n_topics: int = 512, seed: int = 0) -> np.ndarray:
+    """Gaussian mixture around random topic centres — real embeddings cluster, uniform noise doesn't."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    chunk = 100_000
+    for start in range(0, n, chunk):
+        m = min(chunk, n - start)
+        out[start:start + m] = topics[rng.integers(0, n_topics, m)] + 0.6 * rng.standard_normal((m, dim)).astype(np.float32)
+    return normalize_rows(out)
+
+
+def synthetic_queries(catalog: np.ndarray, n: int, seed: int = 1) -> np.ndarray:
+    """Perturbed catalog vectors, so every query has a meaningful neighbourhood."""
+    rng = np.random.default_rng(seed)
+    base = catalog[rng.integers(0, len(catalog), n)]
+    return normalize_rows(base + 0.3 * rng.standard_normal(base.shape).astype(np.float32) / np.sqrt(base.shape[1]))
+
+
+def _timed(fn, queries: np.ndarray) -> tuple[list[np.ndarray], np.ndarray]:
+    ids, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        top, _ = fn(q)
+        lat.append((time.perf_counter() - t0) * 1000)
+        ids.append(top)
+    return ids, np.array(lat)
+
+
+def run(sizes: list[int], nprobes: list[int], n_queries: int, dim: int) -> None:
+    budget_ms = get_settings().RETRIEVE_TIMEOUT_MS
+    print(f"  top_k={TOP_K}, dim={dim}, queries={n_queries}, RETRIEVE_TIMEOUT_MS={budget_ms}")
+    for n in sizes:
+        catalog = synthetic_catalog(n, dim)
+        queries = synthetic_queries(catalog, n_queries)
+
+        exact = ExactVectorIndex(catalog)
+        truth, exact_lat = _timed(lambda q: exact.search(q, TOP_K), queries)
+
+        t0 = time.perf_counter()
+        ivf = IVFVectorIndex(catalog)
+        build_s = time.perf_counter() - t0
+
+        print(f"\n  n={n:,}  nlist={ivf.nlist}  build={build_s:.1f}s")
+        print(f"    {'path':<14}{'recall@20':>10}{'p50 ms':>10}{'p95 ms':>10}  fits budget")
+        print(f"    {'exact':<14}{1.0:>10.3f}{np.percentile(exact_lat, 50):>10.2f}{np.percentile(exact_lat, 95):>10.2f}"
+              f"  {'yes' if np.percentile(exact_lat, 95) <= budget_ms else 'no'}")
+        for nprobe in nprobes:
+            found, lat = _timed(lambda q: ivf.search(q, TOP_K, nprobe=nprobe), queries)
+            recall = np.mean([len(np.intersect1d(f, t)) / len(t) for f, t in zip(found, truth)])
+            p95 = np.percentile(lat, 95)
+            print(f"    {'ivf/' + str(nprobe):<14}{recall:>10.3f}{np.percentile(lat, 50):>10.2f}{p95:>10.2f}"
+                  f"  {'yes' if p95 <= budget_ms else 'no'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=get_settings().EMBEDDING_DIM)
+    args = parser.parse_args()
+    run(args.sizes, args.nprobe, args.queries, args.dim)
+
+
+if __name__ == "__main__":
+    main()
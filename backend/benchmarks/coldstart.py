@@ -0,0 +1,76 @@
+"""Cold start benchmark: embed + index the catalog at boot vs mapping a snapshot.
+
+Writes a synthetic catalog snapshot to a temp directory, then times the three
+ways a worker can come up: building everything from offer dicts (embedding
+included), building indexes from precomputed embeddings, and load_snapshot
+(with and without checksum verification), plus the first query after load.
+
+Usage:
+    python -m benchmarks.coldstart
+    python -m benchmarks.coldstart --sizes 100000 500000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_backend_root = str(Path(__file__).resolve().parent.parent)
+if _backend_root not in sys.path:
+    sys.path.insert(0, _backend_root)
+
+from app.catalog import CatalogSnapshot
+from app.config import get_settings
+from app.seed import build_offer
+from app.snapshot import load_snapshot, write_snapshot
+from benchmarks.ann import synthetic_catalog, synthetic_queries
+from benchmarks.updates import synthetic_offers
+
+
+def run(sizes: list[int], dim: int) -> None:
+    for n in sizes:
+        offers = synthetic_offers(n)
+        catalog = synthetic_catalog(n, dim)
+        print(f"\n  n={n:,}  dim={dim}")
+
+        # Per-offer embedding cost at boot, extrapolated from a sample
+        sample = offers[:2000]
+        t0 = time.perf_counter()
+        for o in sample:
+            build_offer({k: o[k] for k in o if k != "id"}, o["id"], dim)
+        embed_s = (time.perf_counter() - t0) * n / len(sample)
+
+        t0 = time.perf_counter()
+        built = CatalogSnapshot.build(offers, catalog, version=1)
+        build_s = time.perf_counter() - t0
+        print(f"    boot: embed + index      {embed_s + build_s:>8.2f}s  (embedding ~{embed_s:.2f}s, extrapolated)")
+        print(f"    boot: index only         {build_s:>8.2f}s")
+
+        with tempfile.TemporaryDirectory() as root:
+            t0 = time.perf_counter()
+            write_snapshot(built, root)
+            print(f"    offline snapshot write   {time.perf_counter() - t0:>8.2f}s")
+            for verify in (True, False):
+                t0 = time.perf_counter()
+                loaded = load_snapshot(root, verify=verify)
+                print(f"    boot: load (verify={verify!s:<5}) {time.perf_counter() - t0:>8.2f}s")
+            query = synthetic_queries(catalog, 1)[0]
+            t0 = time.perf_counter()
+            loaded.vector_search(query, 20)
+            loaded.bm25_search("nike running laptop", 20)
+            print(f"    first query after load   {(time.perf_counter() - t0) * 1000:>8.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--dim", type=int, default=get_settings().EMBEDDING_DIM)
+    args = parser.parse_args()
+    run(args.sizes, args.dim)
+
+
+if __name__ == "__main__":
+    main()
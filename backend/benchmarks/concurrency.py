@@ -0,0 +1,115 @@
+"""Pipeline concurrency benchmark: search latency and event-loop stalls under concurrent searches.
+
+Runs N concurrent clients, each calling run_search back to back on one event
+loop (as uvicorn would; the result cache is off, so every search runs the
+graph), while a probe task sleeps 1ms in a loop and records how late it wakes
+up (what /healthz would see as extra latency). It compares two graph wirings:
+
+  - threaded: every node a plain function, so LangGraph hands each one to the
+              loop's default thread pool (the pipeline before async nodes;
+              retrieve/rerank are driven to completion inside that thread);
+  - async:    the served graph, with cheap nodes inline on the loop and
+              retrieve/rerank awaiting the bounded executor pools.
+
+Reports per-search p50/p95/p99, searches/s and the probe's p99 loop lag.
+
+Usage:
+    python -m benchmarks.concurrency
+    python -m benchmarks.concurrency --clients 1 50 --seconds 5
+    RERANKER_MODEL=BAAI/bge-reranker-base EMBEDDING_MODEL=BAAI/bge-small-en-v1.5 python -m benchmarks.concurrency
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+_backend_root = str(Path(__file__).resolve().parent.parent)
+if _backend_root not in sys.path:
+    sys.path.insert(0, _backend_root)
+
+from app.embedder import get_embedder
+from app.executors import shutdown_executors
+from app.pipeline import orchestrator
+from app.store import get_store
+
+QUERIES = [
+    "laptop under $800 with 0% apr", "ps5", "running shoes under $150", "macbook air",
+    "standing desk under $40/mo", "noise cancelling headphones", "flights to tokyo", "washer dryer",
+    "gaming chair", "espresso machine only 0% apr", "4k tv", "nike sneakers", "peloton bike", "sofa",
+]
+
+
+def _sync(node):
+    return lambda state: asyncio.run(node(state))
+
+
+def use_wiring(mode: str) -> None:
+    """Compile the served graph ("async") or the thread-per-node one ("threaded")."""
+    orchestrator.reset_graph()
+    if mode == "async":
+        return
+    saved = orchestrator._inline, orchestrator.retrieve_node, orchestrator.rerank_node
+    orchestrator._inline = lambda node: node
+    orchestrator.retrieve_node, orchestrator.rerank_node = _sync(saved[1]), _sync(saved[2])
+    try:
+        orchestrator._compiled_graph = orchestrator.build_search_graph().compile()
+    finally:
+        orchestrator._inline, orchestrator.retrieve_node, orchestrator.rerank_node = saved
+
+
+async def measure(clients: int, seconds: float, trace: bool = False) -> tuple[list[float], list[float]]:
+    latencies: list[float] = []
+    lags: list[float] = []
+    deadline = time.perf_counter() + seconds
+
+    async def client(c: int) -> None:
+        i = c
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            await orchestrator.run_search(QUERIES[i % len(QUERIES)], trace=trace, cached=False)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            i += clients
+
+    async def probe() -> None:
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append((time.perf_counter() - t0) * 1000 - 1.0)
+
+    await asyncio.gather(probe(), *(client(c) for c in range(clients)))
+    return latencies, lags
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 50])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--trace", action="store_true", help="build the debug trace (off, as with DEBUG=false)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # per-node log lines would dominate the timings
+    get_store()
+    get_embedder().warmup()
+    print(f"  {len(get_store().offers)} offers, embedder {get_embedder().model_id}")
+    for clients in args.clients:
+        print(f"\n  {clients} concurrent searches")
+        for mode in ("threaded", "async"):
+            use_wiring(mode)
+            asyncio.run(measure(clients, min(args.seconds, 0.5), args.trace))  # warm pools and caches
+            lat, lag = asyncio.run(measure(clients, args.seconds, args.trace))
+            p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+            print(f"    {mode:<9} p50={p50:8.2f}ms p95={p95:8.2f}ms p99={p99:8.2f}ms  {len(lat) / args.seconds:7.0f} searches/s"
+                  f"  loop lag p99={np.percentile(lag, 99):7.2f}ms")
+    orchestrator.reset_graph()
+    shutdown_executors()
+
+
+if __name__ == "__main__":
+    main()
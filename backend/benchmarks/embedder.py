@@ -0,0 +1,121 @@
+"""Embedder benchmark: CPU forward-pass throughput by batch size, and micro-batching under concurrency.
+
+Reports, for the configured (or --runtime) embedder:
+  - per batch size (1–64): encode() calls' p50/p95 latency and texts/s;
+  - concurrent clients embedding one query each through BatchingEmbedder,
+    with batching off (max batch 1) and on: per-query p50/p95 and queries/s,
+    plus the mean batch actually formed.
+
+Usage:
+    python -m benchmarks.embedder                                   # EMBEDDING_MODEL / EMBEDDING_RUNTIME
+    python -m benchmarks.embedder --model BAAI/bge-small-en-v1.5 --runtime torch
+    python -m benchmarks.embedder --model BAAI/bge-small-en-v1.5 --runtime onnx --onnx-dir models/bge-small
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+_backend_root = str(Path(__file__).resolve().parent.parent)
+if _backend_root not in sys.path:
+    sys.path.insert(0, _backend_root)
+
+from app.config import get_settings
+from app.embedder import BatchingEmbedder, Embedder, HashEmbedder, OnnxEmbedder, SentenceTransformerEmbedder
+
+QUERIES = [
+    "laptop", "ps5", "only 0% apr", "running shoes under $150", "macbook air", "standing desk",
+    "noise cancelling headphones", "flights to tokyo", "washer dryer", "gaming chair", "yoga mat",
+    "espresso machine", "4k tv under $50/mo", "nike sneakers", "peloton bike", "sofa",
+]
+
+
+def _pct(lat: list[float]) -> str:
+    return f"p50={np.percentile(lat, 50):8.2f}ms p95={np.percentile(lat, 95):8.2f}ms"
+
+
+def _embedder(args) -> Embedder:
+    settings = get_settings()
+    if args.runtime == "hash":
+        return HashEmbedder(settings.EMBEDDING_DIM)
+    if args.runtime == "onnx":
+        return OnnxEmbedder(args.model, settings.EMBEDDING_DIM, args.onnx_dir, int8=not args.fp32,
+                            pooling=settings.EMBEDDING_POOLING, threads=args.threads)
+    return SentenceTransformerEmbedder(args.model, settings.EMBEDDING_DIM, args.threads)
+
+
+def batch_sizes(embedder: Embedder, sizes: list[int], seconds: float) -> None:
+    print(f"\n  {embedder.model_id}: encode() by batch size")
+    for size in sizes:
+        texts = [QUERIES[i % len(QUERIES)] + f" {i}" for i in range(size)]
+        lat = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline or len(lat) < 5:
+            t0 = time.perf_counter()
+            embedder.encode(texts)
+            lat.append((time.perf_counter() - t0) * 1000)
+        rate = size * len(lat) / (sum(lat) / 1000)
+        print(f"    batch={size:<3} {_pct(lat)}  {rate:9.0f} texts/s")
+
+
+def concurrent(embedder: Embedder, clients: int, max_batch: int, window_ms: float, seconds: float) -> None:
+    batching = BatchingEmbedder(embedder, max_batch=max_batch, window_ms=window_ms)
+    batching.warmup()
+    lat: list[list[float]] = [[] for _ in range(clients)]
+    deadline = time.perf_counter() + seconds
+
+    def client(c: int) -> None:
+        i = c
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            batching.embed(f"{QUERIES[i % len(QUERIES)]} {i}")  # distinct texts: no dedup help
+            lat[c].append((time.perf_counter() - t0) * 1000)
+            i += clients
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = batching.stats()
+    batching.close()
+    merged = [x for per in lat for x in per]
+    label = "off" if max_batch == 1 else f"max={max_batch}"
+    print(f"    {clients} clients  batching {label:<7} {_pct(merged)}  {len(merged) / seconds:8.0f} queries/s"
+          f"  mean batch {stats['meanBatch']:.1f}")
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--runtime", choices=["hash", "torch", "onnx"],
+                        default="hash" if settings.EMBEDDING_MODEL.lower() == "none" else settings.EMBEDDING_RUNTIME)
+    parser.add_argument("--onnx-dir", default=settings.EMBEDDING_ONNX_DIR)
+    parser.add_argument("--fp32", action="store_true", help="ONNX: serve the fp32 export instead of int8")
+    parser.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--window-ms", type=float, default=settings.EMBEDDING_BATCH_WINDOW_MS)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    embedder = _embedder(args)
+    t0 = time.perf_counter()
+    embedder.warmup()
+    print(f"  loaded {embedder.model_id} in {time.perf_counter() - t0:.1f}s")
+    batch_sizes(embedder, args.sizes, args.seconds)
+    print(f"\n  micro-batching (window {args.window_ms}ms)")
+    for clients in args.clients:
+        for max_batch in (1, 32):
+            concurrent(embedder, clients, max_batch, args.window_ms, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
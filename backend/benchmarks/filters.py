@@ -0,0 +1,107 @@
+"""Columnar constraint filtering benchmark (OfferColumns.mask) and filtered vector search.
+
+The search section compares top-20 with constraints pushed into the scan
+(category partition + mask) against scanning every row and filtering after.
+
+Usage:
+    python -m benchmarks.filters
+    python -m benchmarks.filters --sizes 1000000 --repeat 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+_backend_root = str(Path(__file__).resolve().parent.parent)
+if _backend_root not in sys.path:
+    sys.path.insert(0, _backend_root)
+
+from app.index.columns import OfferColumns
+from app.index.vector import ExactVectorIndex, top_k_indices
+from app.seed import CATEGORIES
+from benchmarks.ann import TOP_K, synthetic_catalog, synthetic_queries
+
+QUERIES = [
+    {"category": "electronics"},
+    {"only_zero_apr": True},
+    {"category": "sneakers", "max_price": 200, "only_zero_apr": True},
+    {"category": "electronics", "max_price": 800, "max_monthly": 75, "only_zero_apr": True},
+    {"max_monthly": 50},
+]
+
+
+def synthetic_columns(n: int, seed: int = 0, clustered: bool = False) -> OfferColumns:
+    """Random offer attributes; clustered=True groups rows by category like the store does."""
+    rng = np.random.default_rng(seed)
+    price_cents = rng.integers(5_000, 300_000, n).astype(np.int32)
+    term = rng.choice([4, 6, 12, 18, 24], n)
+    category_code = rng.integers(0, len(CATEGORIES), n).astype(np.int32)
+    if clustered:
+        category_code.sort()
+    return OfferColumns(
+        categories=list(CATEGORIES),
+        category_code=category_code,
+        merchants=[f"merchant-{i}" for i in range(5000)],
+        merchant_code=rng.integers(0, 5000, n).astype(np.int32),
+        price_cents=price_cents,
+        monthly_cents=(price_cents // term).astype(np.int32),
+        apr=np.where(rng.random(n) < 0.5, 0.0, rng.choice([5.99, 9.99, 15.99], n)),
+        term_months=term.astype(np.int32),
+    )
+
+
+def run(sizes: list[int], repeat: int) -> None:
+    for n in sizes:
+        t0 = time.perf_counter()
+        columns = synthetic_columns(n)
+        print(f"\n  n={n:,}  build={time.perf_counter() - t0:.2f}s")
+        for q in QUERIES:
+            lat = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                mask = columns.mask(**q)
+                lat.append((time.perf_counter() - t0) * 1000)
+            print(f"    {str(q):<90} p50={np.percentile(lat, 50):.3f}ms  p95={np.percentile(lat, 95):.3f}ms  rows={int(mask.sum()):,}")
+
+
+def run_search(n: int, n_queries: int, dim: int) -> None:
+    columns = synthetic_columns(n, clustered=True)
+    catalog = synthetic_catalog(n, dim)
+    queries = synthetic_queries(catalog, n_queries)
+    index = ExactVectorIndex(catalog)
+    print(f"\n  filtered vector search  n={n:,}  dim={dim}  top_k={TOP_K}")
+    print(f"    {'constraints':<90}{'post-filter':>12}{'pushdown':>10}{'speedup':>9}")
+    for q in QUERIES:
+        post, push = [], []
+        for vec in queries:
+            t0 = time.perf_counter()
+            mask = columns.mask(**q)
+            scores = np.where(mask, index.vectors @ (vec / np.linalg.norm(vec)), -np.inf)
+            top_k_indices(scores, TOP_K)
+            post.append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            index.search(vec, TOP_K, columns.row_filter(**q))
+            push.append((time.perf_counter() - t0) * 1000)
+        p_post, p_push = np.percentile(post, 50), np.percentile(push, 50)
+        print(f"    {str(q):<90}{p_post:>10.2f}ms{p_push:>8.2f}ms{p_post / p_push:>8.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--search-size", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=128)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
+    run_search(args.search_size, args.queries, args.dim)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Pre-fork memory benchmark: per-worker catalogs vs one shared, frozen catalog.
+
+Starts N worker processes the three ways a multi-worker deployment can hold
+the catalog, lets every worker serve the same queries, then reads each
+worker's /proc/self/smaps_rollup while all of them are alive:
+
+  private   each worker builds its own catalog (uvicorn --workers N)
+  fork      the parent builds it and forks (copy-on-write, no sharing step)
+  shared    the parent builds it, moves the arrays to shared memory,
+            gc.freeze()s and forks (python -m app.serve)
+
+PSS splits shared pages evenly across the processes mapping them, so the
+PSS sum over the parent and its workers approximates their real memory
+footprint together. Private_Dirty is what each worker has copied or
+allocated for itself.
+Linux only.
+
+Usage:
+    python -m benchmarks.prefork
+    python -m benchmarks.prefork --size 200000 --workers 16
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import gc
+import os
+import sys
+from pathlib import Path
+
+_backend_root = str(Path(__file__).resolve().parent.parent)
+if _backend_root not in sys.path:
+    sys.path.insert(0, _backend_root)
+
+from app.catalog import CatalogSnapshot
+from app.config import get_settings
+from app.serve import share_arrays
+from benchmarks.ann import synthetic_catalog, synthetic_queries
+from benchmarks.updates import synthetic_offers
+
+
+def _memory_kb() -> dict[str, int]:
+    """Pss / Rss / Private_Dirty of this process, in kB."""
+    out = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss", "Private_Dirty"):
+                out[key] = int(value.split()[0])
+    return out
+
+
+def _serve(catalog: CatalogSnapshot | None, build, queries) -> None:
+    if catalog is None:
+        catalog = build()
+    for q in queries:
+        catalog.vector_search(q, 20, filters={"max_price": 1500})
+        catalog.bm25_search("nike running laptop", 20)
+        gc.collect()  # what a long-running worker's collector does eventually
+
+
+def _run_workers(
+    workers: int, catalog: CatalogSnapshot | None, build, queries,
+) -> tuple[dict[str, int], list[dict[str, int]]]:
+    """Fork workers that serve queries; parent and worker memory once all of them are up."""
+    children = []
+    for _ in range(workers):
+        ready_r, ready_w = os.pipe()
+        go_r, go_w = os.pipe()
+        report_r, report_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve(catalog, build, queries)
+                os.write(ready_w, b"1")
+                os.read(go_r, 1)
+                os.write(report_w, json.dumps(_memory_kb()).encode())
+            finally:
+                os._exit(0)
+        for fd in (ready_w, go_r, report_w):
+            os.close(fd)
+        children.append((pid, ready_r, go_w, report_r))
+
+    for _, ready_r, _, _ in children:
+        os.read(ready_r, 1)
+    parent = _memory_kb()
+    stats = []
+    for pid, ready_r, go_w, report_r in children:
+        os.write(go_w, b"1")
+        stats.append(json.loads(os.read(report_r, 4096)))
+        for fd in (ready_r, go_w, report_r):
+            os.close(fd)
+        os.waitpid(pid, 0)
+    return parent, stats
+
+
+def run(size: int, workers: int, dim: int) -> None:
+    offers = synthetic_offers(size)
+    embeddings = synthetic_catalog(size, dim)
+    queries = synthetic_queries(embeddings, 20)
+
+    def build() -> CatalogSnapshot:
+        return CatalogSnapshot.build(offers, embeddings, version=1)
+
+    print(f"\n  n={size:,}  dim={dim}  workers={workers}")
+    print(f"    {'mode':<9} {'PSS total':>11} {'PSS parent':>11} {'PSS/worker':>11} {'private dirty/worker':>21}")
+    for mode in ("private", "fork", "shared"):
+        catalog = None if mode == "private" else build()
+        blocks = share_arrays(catalog) if mode == "shared" else []
+        if mode == "shared":
+            gc.collect()
+            gc.freeze()
+        parent, stats = _run_workers(workers, catalog, build, queries)
+        if mode == "shared":
+            gc.unfreeze()
+        del catalog
+        for block in blocks:
+            block.close()
+            block.unlink()
+        gc.collect()
+
+        pss = sum(s["Pss"] for s in stats) / 1024
+        dirty = sum(s["Private_Dirty"] for s in stats) / 1024 / workers
+        total = pss + parent["Pss"] / 1024
+        print(f"    {mode:<9} {total:>9.0f}MB {parent['Pss'] / 1024:>9.0f}MB {pss / workers:>9.0f}MB {dirty:>19.0f}MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--dim", type=int, default=get_settings().EMBEDDING_DIM)
+    args = parser.parse_args()
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("benchmarks.prefork needs Linux (/proc/self/smaps_rollup)")
+    run(args.size, args.workers, args.dim)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Quantized embedding storage benchmark: resident memory, recall@20, latency.
+
+Compares int8 / float16 first-pass scans (with full-precision rescoring of the
+top VECTOR_RESCORE_K rows) against the exact float32 index.
+
+Usage:
+    python -m benchmarks.quant
+    python -m benchmarks.quant --sizes 100000 --rescore 50 200 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+_backend_root = str(Path(__file__).resolve().parent.parent)
+if _backend_root not in sys.path:
+    sys.path.insert(0, _backend_root)
+
+from app.config import get_settings
+from app.index.quant import QUANTIZATION_MODES, QuantizedVectorIndex
+from app.index.vector import ExactVectorIndex
+from benchmarks.ann import TOP_K, synthetic_catalog, synthetic_queries
+
+
+def _run_queries(index, queries: np.ndarray) -> tuple[list[np.ndarray], np.ndarray]:
+    ids, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        top, _ = index.search(q, TOP_K)
+        lat.append((time.perf_counter() - t0) * 1000)
+        ids.append(top)
+    return ids, np.array(lat)
+
+
+def run(sizes: list[int], rescore_ks: list[int], n_queries: int, dim: int) -> None:
+    print(f"  top_k={TOP_K}, dim={dim}, queries={n_queries}")
+    for n in sizes:
+        catalog = synthetic_catalog(n, dim)
+        queries = synthetic_queries(catalog, n_queries)
+        exact = ExactVectorIndex(catalog)
+        truth, exact_lat = _run_queries(exact, queries)
+        float_mb = exact.vectors.nbytes / 2**20
+
+        print(f"\n  n={n:,}")
+        print(f"    {'path':<18}{'resident MB':>12}{'shrink':>8}{'recall@20':>11}{'p50 ms':>9}{'p95 ms':>9}")
+        print(f"    {'float32 exact':<18}{float_mb:>12.1f}{1.0:>7.1f}x{1.0:>11.3f}"
+              f"{np.percentile(exact_lat, 50):>9.2f}{np.percentile(exact_lat, 95):>9.2f}")
+        for mode in QUANTIZATION_MODES:
+            for rescore_k in rescore_ks:
+                index = QuantizedVectorIndex(catalog, mode=mode, rescore_k=rescore_k)
+                found, lat = _run_queries(index, queries)
+                recall = np.mean([len(np.intersect1d(f, t)) / len(t) for f, t in zip(found, truth)])
+                mb = index.resident_bytes / 2**20
+                print(f"    {mode + '/' + str(rescore_k):<18}{mb:>12.1f}{float_mb / mb:>7.1f}x{recall:>11.3f}"
+                      f"{np.percentile(lat, 50):>9.2f}{np.percentile(lat, 95):>9.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--rescore", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=get_settings().EMBEDDING_DIM)
+    args = parser.parse_args()
+    run(args.sizes, args.rescore, args.queries, args.dim)
+
+
+if __name__ == "__main__":
+    main()
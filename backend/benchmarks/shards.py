@@ -0,0 +1,81 @@
+"""Sharded store benchmark: scatter-gather latency vs one in-process catalog.
+
+Builds the same synthetic catalog as a single CatalogSnapshot and as
+ShardedCatalogs over 2..N local shard processes, then times vector and BM25
+searches, unfiltered and constrained to one category. The speedup needs
+free cores: on a machine with fewer cores than shards the scatter-gather
+only adds IPC overhead.
+
+Usage:
+    python -m benchmarks.shards
+    python -m benchmarks.shards --size 500000 --shards 2 4 8 --placement category
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+_backend_root = str(Path(__file__).resolve().parent.parent)
+if _backend_root not in sys.path:
+    sys.path.insert(0, _backend_root)
+
+from app.catalog import CatalogSnapshot
+from app.config import get_settings
+from app.shards import ShardedCatalog, ShardPool
+from benchmarks.ann import synthetic_catalog, synthetic_queries
+from benchmarks.updates import synthetic_offers
+
+
+def _latency(catalog: CatalogSnapshot, queries: np.ndarray, filters: dict | None) -> str:
+    vector, bm25 = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        catalog.vector_search(q, 20, filters)
+        t1 = time.perf_counter()
+        catalog.bm25_search("nike running laptop", 20, filters)
+        t2 = time.perf_counter()
+        vector.append((t1 - t0) * 1000)
+        bm25.append((t2 - t1) * 1000)
+    return f"vector p50={np.percentile(vector, 50):6.2f}ms  bm25 p50={np.percentile(bm25, 50):6.2f}ms"
+
+
+def run(size: int, shard_counts: list[int], placement: str, dim: int) -> None:
+    offers = synthetic_offers(size)
+    embeddings = synthetic_catalog(size, dim)
+    queries = synthetic_queries(embeddings, 50)
+    category = {"category": offers[0]["category"]}
+    print(f"\n  n={size:,}  dim={dim}  placement={placement}  cores={os.cpu_count()}")
+
+    single = CatalogSnapshot.build(offers, embeddings, version=1)
+    print(f"    {'1 process':<10} all       {_latency(single, queries, None)}")
+    print(f"    {'':<10} category  {_latency(single, queries, category)}")
+    for n in shard_counts:
+        pool = ShardPool(n, placement, timeout_ms=60_000)
+        try:
+            t0 = time.perf_counter()
+            sharded = ShardedCatalog.build(pool, offers, embeddings, version=1)
+            label = f"{n} shards"
+            print(f"    {label:<10} all       {_latency(sharded, queries, None)}  (build {time.perf_counter() - t0:.1f}s)")
+            print(f"    {'':<10} category  {_latency(sharded, queries, category)}")
+        finally:
+            pool.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--placement", choices=["hash", "category"], default="hash")
+    parser.add_argument("--dim", type=int, default=get_settings().EMBEDDING_DIM)
+    args = parser.parse_args()
+    run(args.size, args.shards, args.placement, args.dim)
+
+
+if __name__ == "__main__":
+    main()
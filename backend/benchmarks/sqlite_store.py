@@ -0,0 +1,122 @@
+"""SQLite store benchmark: SQLite + FTS5 + mapped vectors vs the in-memory catalog.
+
+Loads the same synthetic catalog into a CatalogSnapshot and into a SQLite
+directory, then reports, per catalog size:
+  - load time and resident index memory (in-memory) vs on-disk size (SQLite);
+  - p50/p95 latency of vector and BM25 searches, unconstrained, with a
+    category and with a price cap;
+  - throughput of a mixed search workload from concurrent threads with
+    one read connection vs a pool (SQLite releases the GIL inside a
+    statement, so a pool lets reads overlap).
+
+Usage:
+    python -m benchmarks.sqlite_store
+    python -m benchmarks.sqlite_store --sizes 100000 1000000 --threads 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+_backend_root = str(Path(__file__).resolve().parent.parent)
+if _backend_root not in sys.path:
+    sys.path.insert(0, _backend_root)
+
+from app.catalog import CatalogSnapshot
+from app.config import get_settings
+from app.sqlite_store import CatalogDatabase
+from benchmarks.ann import synthetic_catalog, synthetic_queries
+from benchmarks.updates import synthetic_offers
+
+FILTERS = {"all": None, "category": {"category": "electronics"}, "max_price": {"max_price": 200}}
+
+
+def _p50(lat: list[float]) -> str:
+    return f"p50={np.percentile(lat, 50):7.2f}ms p95={np.percentile(lat, 95):7.2f}ms"
+
+
+def _latency(catalog, queries: np.ndarray, filters: dict | None) -> tuple[list[float], list[float]]:
+    vector, bm25 = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        catalog.vector_search(q, 20, filters)
+        t1 = time.perf_counter()
+        catalog.bm25_search("nike running laptop", 20, filters)
+        t2 = time.perf_counter()
+        vector.append((t1 - t0) * 1000)
+        bm25.append((t2 - t1) * 1000)
+    return vector, bm25
+
+
+def _throughput(catalog, queries: np.ndarray, threads: int, seconds: float) -> float:
+    """Searches per second from concurrent threads (vector + BM25 per query, rotating filters)."""
+    done = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(t: int) -> None:
+        i = t
+        while time.perf_counter() < deadline:
+            filters = list(FILTERS.values())[i % len(FILTERS)]
+            catalog.vector_search(queries[i % len(queries)], 20, filters)
+            catalog.bm25_search("nike running laptop", 20, filters)
+            done[t] += 1
+            i += threads
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for th in pool:
+        th.start()
+    for th in pool:
+        th.join()
+    return sum(done) / seconds
+
+
+def run(sizes: list[int], threads: int, dim: int, seconds: float) -> None:
+    for n in sizes:
+        offers = synthetic_offers(n)
+        embeddings = synthetic_catalog(n, dim)
+        queries = synthetic_queries(embeddings, 50)
+
+        t0 = time.perf_counter()
+        memory = CatalogSnapshot.build(offers, embeddings, version=1)
+        build_s = time.perf_counter() - t0
+        with tempfile.TemporaryDirectory() as tmp:
+            t0 = time.perf_counter()
+            db = CatalogDatabase(tmp, dim, read_connections=threads)
+            db.write(list(zip(offers, embeddings)), replace=True)
+            load_s = time.perf_counter() - t0
+            sqlite = db.catalog()
+            disk_mb = sum(p.stat().st_size for p in Path(tmp).iterdir()) / 2**20
+            print(f"\n  n={n:,}  dim={dim}  in-memory build={build_s:.1f}s  sqlite load={load_s:.1f}s ({disk_mb:.0f}MB on disk)")
+
+            for label, filters in FILTERS.items():
+                for name, catalog in (("memory", memory), ("sqlite", sqlite)):
+                    vector, bm25 = _latency(catalog, queries, filters)
+                    print(f"    {label:<10} {name:<7} vector {_p50(vector)}   bm25 {_p50(bm25)}")
+
+            single = CatalogDatabase(tmp, dim, read_connections=1).catalog()
+            print(f"    {threads} threads  memory           {_throughput(memory, queries, threads, seconds):8.0f} searches/s")
+            print(f"    {threads} threads  sqlite 1 conn    {_throughput(single, queries, threads, seconds):8.0f} searches/s")
+            print(f"    {threads} threads  sqlite {threads} conns   {_throughput(sqlite, queries, threads, seconds):8.0f} searches/s")
+            single._db.close()
+            db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--dim", type=int, default=get_settings().EMBEDDING_DIM)
+    args = parser.parse_args()
+    run(args.sizes, args.threads, args.dim, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
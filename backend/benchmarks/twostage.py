@@ -0,0 +1,67 @@
+"""Two-stage (coarse prefix / PCA → full-dim rescoring) vector search benchmark.
+
+Reports the calibrated shortlist, top-20 overlap with exact search and query
+latency for each coarse dimension and projection.
+
+Usage:
+    python -m benchmarks.twostage
+    python -m benchmarks.twostage --sizes 100000 --coarse-dims 32 64 128 --min-overlap 0.95
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+_backend_root = str(Path(__file__).resolve().parent.parent)
+if _backend_root not in sys.path:
+    sys.path.insert(0, _backend_root)
+
+from app.config import get_settings
+from app.index.twostage import PROJECTIONS, TwoStageVectorIndex
+from app.index.vector import ExactVectorIndex
+from benchmarks.ann import TOP_K, synthetic_catalog, synthetic_queries
+from benchmarks.quant import _run_queries
+
+
+def run(sizes: list[int], coarse_dims: list[int], shortlist: int, min_overlap: float, n_queries: int, dim: int) -> None:
+    print(f"  top_k={TOP_K}, dim={dim}, queries={n_queries}, min_overlap={min_overlap}")
+    for n in sizes:
+        catalog = synthetic_catalog(n, dim)
+        queries = synthetic_queries(catalog, n_queries)
+        exact = ExactVectorIndex(catalog)
+        truth, exact_lat = _run_queries(exact, queries)
+        exact_p50 = np.percentile(exact_lat, 50)
+
+        print(f"\n  n={n:,}")
+        print(f"    {'path':<16}{'shortlist':>10}{'overlap':>9}{'p50 ms':>9}{'p95 ms':>9}{'speedup':>9}")
+        print(f"    {'exact':<16}{'-':>10}{1.0:>9.3f}{exact_p50:>9.2f}{np.percentile(exact_lat, 95):>9.2f}{1.0:>8.1f}x")
+        for projection in PROJECTIONS:
+            for coarse_dim in coarse_dims:
+                index = TwoStageVectorIndex(catalog, coarse_dim=coarse_dim, shortlist=shortlist,
+                                            projection=projection, min_overlap=min_overlap)
+                found, lat = _run_queries(index, queries)
+                overlap = np.mean([len(np.intersect1d(f, t)) / len(t) for f, t in zip(found, truth)])
+                p50 = np.percentile(lat, 50)
+                print(f"    {projection + '/' + str(coarse_dim):<16}{index.shortlist:>10}{overlap:>9.3f}"
+                      f"{p50:>9.2f}{np.percentile(lat, 95):>9.2f}{exact_p50 / p50:>8.1f}x")
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--coarse-dims", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--shortlist", type=int, default=settings.VECTOR_SHORTLIST)
+    parser.add_argument("--min-overlap", type=float, default=settings.VECTOR_MIN_OVERLAP)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM)
+    args = parser.parse_args()
+    run(args.sizes, args.coarse_dims, args.shortlist, args.min_overlap, args.queries, args.dim)
+
+
+if __name__ == "__main__":
+    main()
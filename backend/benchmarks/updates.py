@@ -0,0 +1,122 @@
+"""Incremental catalog update benchmark: upsert / delete latency vs a full rebuild.
+
+Builds an InMemoryStore over a synthetic catalog, then times single-offer
+reprices (tombstone + append), inserts and deletes, query latency with a
+pending tail, the compaction that folds the tail back into the base, and
+query latency while a full reload is rebuilt in the background and swapped in.
+
+Usage:
+    python -m benchmarks.updates
+    python -m benchmarks.updates --sizes 100000 --updates 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+_backend_root = str(Path(__file__).resolve().parent.parent)
+if _backend_root not in sys.path:
+    sys.path.insert(0, _backend_root)
+
+import app.store as store_module
+from app.catalog import CatalogSnapshot
+from app.config import get_settings
+from app.records import OfferRecord
+from app.seed import MOCK_OFFERS
+from app.store import InMemoryStore
+from benchmarks.ann import synthetic_catalog, synthetic_queries
+
+
+def synthetic_offers(n: int, seed: int = 0) -> list[OfferRecord]:
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(MOCK_OFFERS), n)
+    prices = rng.integers(50, 3000, n)
+    return [
+        OfferRecord.from_dict({
+            **MOCK_OFFERS[p], "id": f"offer-{i:07d}", "productName": f"{MOCK_OFFERS[p]['productName']} #{i}",
+            "totalPrice": float(prices[i]), "monthlyPayment": round(prices[i] / 12, 2),
+            "reason": "", "disclosure": "",
+        })
+        for i, p in enumerate(picks.tolist())
+    ]
+
+
+def _p50(lat: list[float]) -> str:
+    return f"p50={np.percentile(lat, 50):.3f}ms p95={np.percentile(lat, 95):.3f}ms"
+
+
+def _query_latency(store: InMemoryStore, queries: np.ndarray) -> list[float]:
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        snapshot = store.snapshot()
+        snapshot.vector_search(q, 20)
+        snapshot.bm25_search("nike running laptop", 20)
+        lat.append((time.perf_counter() - t0) * 1000)
+    return lat
+
+
+def run(sizes: list[int], n_updates: int, dim: int) -> None:
+    # Measure the steady state between compactions
+    store_module._COMPACT_MIN_ROWS = 10 ** 9
+    for n in sizes:
+        store = InMemoryStore()
+        offers = synthetic_offers(n)
+        catalog = synthetic_catalog(n, dim)
+        t0 = time.perf_counter()
+        store._snapshot = CatalogSnapshot.build(offers, catalog, version=1)
+        print(f"\n  n={n:,}  full build={time.perf_counter() - t0:.2f}s")
+
+        rng = np.random.default_rng(1)
+        queries = synthetic_queries(catalog, 50)
+        print(f"    query (clean)          {_p50(_query_latency(store, queries))}")
+
+        reprice, insert, delete = [], [], []
+        live = store.offers
+        targets = [{**live[row].to_dict(), "totalPrice": 99.0} for row in rng.integers(0, n, n_updates).tolist()]
+        for i, offer in enumerate(targets):
+            t0 = time.perf_counter()
+            store.upsert_offers([offer])
+            reprice.append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            store.upsert_offers([{**offer, "id": f"new-{i}"}])
+            insert.append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            store.delete_offers([f"new-{i}"])
+            delete.append((time.perf_counter() - t0) * 1000)
+        print(f"    reprice (upsert)       {_p50(reprice)}")
+        print(f"    insert                 {_p50(insert)}")
+        print(f"    delete                 {_p50(delete)}")
+
+        print(f"    query ({store.pending_rows:,} pending)  {_p50(_query_latency(store, queries))}")
+        t0 = time.perf_counter()
+        store.compact()
+        print(f"    compaction             {(time.perf_counter() - t0) * 1000:.0f}ms")
+
+        # Queries keep running against the old snapshot while the reload builds
+        lat, versions = [], set()
+        reload = store._submit_reload(lambda: CatalogSnapshot.build(offers, catalog, version=0))
+        while not reload.done():
+            lat.extend(_query_latency(store, queries[:5]))
+            versions.add(store.catalog_version)
+        lat.extend(_query_latency(store, queries[:5]))
+        versions.add(store.catalog_version)
+        print(f"    query (during reload)  {_p50(lat)} max={max(lat):.1f}ms  versions={sorted(versions)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=get_settings().EMBEDDING_DIM)
+    args = parser.parse_args()
+    run(args.sizes, args.updates, args.dim)
+
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,50 @@ def test_ingress_blocks_disallowed():
     assert result["error"] is not None
 
 
+def test_huge_budget_matches_everything_instead_of_overflowing():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    store = get_store()
+    assert len(store.filter_offers(max_price=25_000_000)) == len(store.filter_offers())
+    # Pushed-down filters over a category partition clamp the same way
+    sneakers = store.snapshot().row_filter({"category": "sneakers", "max_price": 25e6, "max_monthly": 25e6})
+    assert sneakers.count == len(store.filter_offers(category="sneakers"))
+    with TestClient(app) as client:
+        for query in ["laptop under $25000000", "sneakers under $25000000"]:
+            response = client.post("/v1/search/query", json={"query": query})
+            assert response.status_code == 200 and response.json()["results"]
+
+
+def test_column_apply_with_an_unrepresentable_value_leaves_the_columns_intact():
+    from app.index.columns import OfferColumns
+
+    offers = [o.to_dict() for o in _fresh_store().offers]
+    columns = OfferColumns.from_offers(offers)
+    with pytest.raises(OverflowError):
+        columns.apply([{**offers[0], "id": "offer-huge", "totalPrice": 30_000_000}])
+    # No column grew, so the version can still be extended
+    new = columns.apply([{**offers[0], "id": "offer-mug", "totalPrice": 10}])
+    assert len(new) == len(offers) + 1 and new.price_cents[-1] == 1000
+    assert len(new.category_code) == len(new.merchant_code) == len(new.term_months) == len(new)
+
+
+def test_search_and_feedback_events_keep_no_query_text():
+    from fastapi.testclient import TestClient
+    from app.events import get_event_log
+    from app.main import app
+
+    query = "laptop under $800 for jane"
+    with TestClient(app) as client:
+        assert client.post("/v1/search/query", json={"query": query}).status_code == 200
+        feedback = {"itemId": "offer-001", "query": query, "rating": "up"}
+        assert client.post("/v1/search/feedback", json=feedback).status_code == 200
+        events = [e for e in get_event_log().recent() if e["type"] in ("search", "feedback")][-2:]
+    assert [e["type"] for e in events] == ["search", "feedback"]
+    assert events[0]["queryHash"] == events[1]["queryHash"]  # feedback groups with its search
+    assert all("query" not in e and query not in str(e) for e in events)
+
+
 def test_intent_parses_price():
     state = {"sanitized_query": "laptop under $800", "request_id": "test"}
     result = intent_node(state)
@@ -72,6 +116,19 @@ def test_store_vector_search():
     results = store.vector_search(emb, top_k=5)
     assert len(results) == 5
     assert all("_similarity" in r for r in results)
+    sims = [r["_similarity"] for r in results]
+    assert sims == sorted(sims, reverse=True)
+
+
+def test_store_vector_search_many_matches_single():
+    store = get_store()
+    queries = ["laptop electronics", "beach vacation", "running shoes"]
+    batched = store.vector_search_many([store.get_embedding(q) for q in queries], top_k=10)
+    assert len(batched) == len(queries)
+    for q, results in zip(queries, batched):
+        single = store.vector_search(store.get_embedding(q), top_k=10)
+        assert [r["id"] for r in results] == [r["id"] for r in single]
+        assert [r["_similarity"] for r in results] == pytest.approx([r["_similarity"] for r in single], abs=1e-6)
 
 
 def test_store_filter():
@@ -81,13 +138,62 @@ def test_store_filter():
     assert all(o["apr"] == 0 for o in filtered)
 
 
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"category": "Electronics"},
+    {"category": "unknown"},
+    {"max_price": 899},
+    {"max_monthly": 54.13, "only_zero_apr": True},
+    {"category": "sneakers", "max_price": 200, "only_zero_apr": True},
+])
+def test_store_filter_matches_row_predicates(kwargs):
+    """Columnar mask agrees with the plain per-offer predicates."""
+    store = get_store()
+    expected = [
+        o["id"] for o in store.offers
+        if (not kwargs.get("category") or o["category"] == kwargs["category"].lower())
+        and (kwargs.get("max_price") is None or o["totalPrice"] <= kwargs["max_price"])
+        and (kwargs.get("max_monthly") is None or o["monthlyPayment"] <= kwargs["max_monthly"])
+        and (not kwargs.get("only_zero_apr") or o["apr"] == 0)
+    ]
+    assert [o["id"] for o in store.filter_offers(**kwargs)] == expected
+
+
+@pytest.mark.parametrize("filters", [
+    {"category": "sneakers"},
+    {"category": "electronics", "max_price": 800, "only_zero_apr": True},
+    {"max_monthly": 60},
+])
+def test_store_filtered_search_matches_filter_then_rank(filters):
+    """Filters pushed into search give the eligible prefix of the unfiltered ranking."""
+    store = get_store()
+    allowed = store.filter_mask(**filters)
+    n = len(store.offers)
+
+    emb = store.get_embedding("running shoes laptop")
+    ranking = store.vector_search(emb, top_k=n)
+    expected = [r["id"] for r in ranking if allowed[store.row_of(r["id"])]][:10]
+    assert [r["id"] for r in store.vector_search(emb, top_k=10, filters=filters)] == expected
+
+    ranking = store.bm25_search("nike best buy laptop", top_k=n)
+    expected = [(r["id"], r["_bm25_score"]) for r in ranking if allowed[store.row_of(r["id"])]][:10]
+    got = store.bm25_search("nike best buy laptop", top_k=10, filters=filters)
+    assert [(r["id"], r["_bm25_score"]) for r in got] == expected
+
+
 def test_rank_produces_ordered_results():
-    mock_reranked = [
-        {"id": "a", "monthlyPayment": 100, "totalPrice": 1000, "apr": 10, "termMonths": 12, "eligibilityConfidence": "med", "productName": "A", "_rerank_score": 0.5},
-        {"id": "b", "monthlyPayment": 40, "totalPrice": 400, "apr": 0, "termMonths": 12, "eligibilityConfidence": "high", "productName": "B", "_rerank_score": 0.8},
-        {"id": "c", "monthlyPayment": 200, "totalPrice": 2000, "apr": 15, "termMonths": 24, "eligibilityConfidence": "low", "productName": "C", "_rerank_score": 0.3},
+    candidates = [
+        {"id": "a", "monthlyPayment": 100, "totalPrice": 1000, "apr": 10, "termMonths": 12, "eligibilityConfidence": "med", "productName": "A"},
+        {"id": "b", "monthlyPayment": 40, "totalPrice": 400, "apr": 0, "termMonths": 12, "eligibilityConfidence": "high", "productName": "B"},
+        {"id": "c", "monthlyPayment": 200, "totalPrice": 2000, "apr": 15, "termMonths": 24, "eligibilityConfidence": "low", "productName": "C"},
     ]
-    state = {"reranked": mock_reranked, "parsed_constraints": {}, "request_id": "test"}
+    state = {
+        "candidates": candidates,
+        "candidate_scores": {"rerank": [0.5, 0.8, 0.3]},
+        "reranked": [0, 1, 2],
+        "parsed_constraints": {},
+        "request_id": "test",
+    }
     result = rank_node(state)
     ranked = result["ranked"]
     assert len(ranked) == 3
@@ -95,9 +201,132 @@ def test_rank_produces_ordered_results():
     assert ranked[0]["id"] == "b"
 
 
+def test_ivf_index_recall_against_exact():
+    import numpy as np
+    from app.index.ivf import IVFVectorIndex
+    from app.index.vector import ExactVectorIndex
+
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((20, 32)).astype(np.float32)
+    catalog = centres[rng.integers(0, 20, 2000)] + 0.3 * rng.standard_normal((2000, 32)).astype(np.float32)
+    exact = ExactVectorIndex(catalog)
+    ivf = IVFVectorIndex(catalog, nlist=16, nprobe=4)
+
+    queries = catalog[:50]
+    truth, _ = exact.search_many(queries, 10)
+    found, _ = ivf.search_many(queries, 10)
+    recall = np.mean([len(np.intersect1d(f, t)) / 10 for f, t in zip(found, truth)])
+    assert recall >= 0.9
+    # Probing every list degenerates to exact search
+    all_ids, _ = ivf.search(queries[0], 10, nprobe=ivf.nlist)
+    assert set(all_ids.tolist()) == set(truth[0].tolist())
+
+
+
+@pytest.mark.parametrize("mode", ["int8", "float16"])
+def test_quantized_index_rescoring_matches_exact(mode):
+    import numpy as np
+    from app.index.quant import QuantizedVectorIndex
+    from app.index.vector import ExactVectorIndex
+
+    rng = np.random.default_rng(1)
+    catalog = rng.standard_normal((1500, 64)).astype(np.float32)
+    exact = ExactVectorIndex(catalog)
+    quant = QuantizedVectorIndex(catalog, mode=mode, rescore_k=100)
+    assert quant.resident_bytes * 1.9 < exact.vectors.nbytes
+
+    queries = catalog[:20] + 0.1 * rng.standard_normal((20, 64)).astype(np.float32)
+    truth_ids, truth_scores = exact.search_many(queries, 10)
+    ids, scores = quant.search_many(queries, 10)
+    recall = np.mean([len(np.intersect1d(f, t)) / 10 for f, t in zip(ids, truth_ids)])
+    assert recall >= 0.95
+    # Returned scores come from the full-precision rescoring pass
+    np.testing.assert_allclose(scores[:, 0], truth_scores[:, 0], rtol=1e-5)
+
+
+@pytest.mark.parametrize("projection", ["prefix", "pca"])
+def test_two_stage_index_meets_overlap_target(projection):
+    import numpy as np
+    from app.index.twostage import TwoStageVectorIndex
+
+    rng = np.random.default_rng(2)
+    centres = rng.standard_normal((30, 96)).astype(np.float32)
+    catalog = centres[rng.integers(0, 30, 3000)] + 0.5 * rng.standard_normal((3000, 96)).astype(np.float32)
+    index = TwoStageVectorIndex(catalog, coarse_dim=16, shortlist=25, projection=projection, min_overlap=0.95)
+    assert index.overlap >= 0.95
+    assert index.coarse.shape == (3000, 16)
+    ids, scores = index.search(catalog[0], 5)
+    assert ids[0] == 0
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_quantization_with_a_non_exact_index_is_rejected(monkeypatch):
+    import numpy as np
+    from app.catalog import build_vector_index
+    from app.config import get_settings
+
+    monkeypatch.setattr(get_settings(), "VECTOR_QUANTIZATION", "int8")
+    for kind in ("two_stage", "ivf"):
+        monkeypatch.setattr(get_settings(), "VECTOR_INDEX", kind)
+        with pytest.raises(ValueError, match="VECTOR_INDEX=exact only"):
+            build_vector_index(np.ones((4, 8), dtype=np.float32))
+
+
+@pytest.mark.parametrize("kind", ["exact", "ivf", "int8", "two_stage"])
+def test_vector_indexes_search_only_eligible_rows(kind):
+    import numpy as np
+    from app.index.columns import RowFilter
+    from app.index.ivf import IVFVectorIndex
+    from app.index.quant import QuantizedVectorIndex
+    from app.index.twostage import TwoStageVectorIndex
+    from app.index.vector import ExactVectorIndex
+
+    rng = np.random.default_rng(3)
+    centres = rng.standard_normal((20, 32)).astype(np.float32)
+    catalog = centres[rng.integers(0, 20, 2000)] + 0.3 * rng.standard_normal((2000, 32)).astype(np.float32)
+    index = {
+        "exact": lambda: ExactVectorIndex(catalog),
+        "ivf": lambda: IVFVectorIndex(catalog, nlist=16, nprobe=4),
+        "int8": lambda: QuantizedVectorIndex(catalog, mode="int8", rescore_k=100),
+        "two_stage": lambda: TwoStageVectorIndex(catalog, coarse_dim=16, shortlist=100),
+    }[kind]()
+    exact = ExactVectorIndex(catalog)
+
+    # A category-sized window, and a sparse mask over every row
+    for where in [RowFilter(500, 1200, rng.random(700) < 0.3), RowFilter(0, 2000, rng.random(2000) < 0.4)]:
+        eligible = where.rows()
+        for q in catalog[1500:1510]:
+            ids, scores = index.search(q, 10, where)
+            assert len(ids) == 10
+            assert where.allows(ids).all()
+            sims = exact.vectors[eligible] @ (q / np.linalg.norm(q))
+            truth = eligible[np.argsort(-sims)[:10]]
+            assert len(np.intersect1d(ids, truth)) >= 9
+
+
+def test_store_offers_do_not_carry_embeddings():
+    store = get_store()
+    assert all("embedding" not in o for o in store.offers)
+
+
+def test_offer_records_are_shared_and_immutable():
+    from app.records import OfferRecord
+
+    store = get_store()
+    record = store.offers[0]
+    assert isinstance(record, OfferRecord)
+    assert not hasattr(record, "__dict__")
+    with pytest.raises(AttributeError):
+        record.apr = 99
+    # Search hits are views over the same records, not copies
+    hits = store.bm25_search(record["productName"], top_k=3)
+    assert hits[0].record is record
+    assert "_bm25_score" in hits[0] and "_bm25_score" not in record
+
 # ── Pipeline stage: retrieve ──
 
-def test_retrieve_returns_candidates():
+@pytest.mark.asyncio
+async def test_retrieve_returns_candidates():
     store = get_store()
     state = {
         "sanitized_query": "laptop",
@@ -105,20 +334,22 @@ def test_retrieve_returns_candidates():
         "request_id": "test",
         "debug_trace": [],
     }
-    result = retrieve_node(state)
+    result = await retrieve_node(state)
     assert "candidates" in result
     assert len(result["candidates"]) >= 1
     assert all("id" in c for c in result["candidates"])
+    assert result["debug_trace"][-1]["notes"].endswith(f"catalog v{store.catalog_version}")
 
 
-def test_retrieve_respects_price_filter():
+@pytest.mark.asyncio
+async def test_retrieve_respects_price_filter():
     state = {
         "sanitized_query": "laptop",
         "parsed_constraints": {"max_price": 500, "category": None},
         "request_id": "test",
         "debug_trace": [],
     }
-    result = retrieve_node(state)
+    result = await retrieve_node(state)
     # With relaxation, we may get some above threshold; but first few should respect it
     strict = [c for c in result["candidates"] if c["totalPrice"] <= 500]
     assert len(strict) >= 1
@@ -126,49 +357,119 @@ def test_retrieve_respects_price_filter():
 
 # ── Pipeline stage: rerank ──
 
-def test_rerank_scores_candidates():
+@pytest.mark.asyncio
+async def test_rerank_scores_candidates():
     candidates = [
         {"id": "x", "merchantName": "Apple", "productName": "MacBook", "category": "electronics",
          "totalPrice": 1200, "apr": 0, "termMonths": 12, "monthlyPayment": 100,
-         "eligibilityConfidence": "high", "_similarity": 0.9},
+         "eligibilityConfidence": "high"},
         {"id": "y", "merchantName": "Sony", "productName": "TV OLED", "category": "electronics",
          "totalPrice": 800, "apr": 5, "termMonths": 6, "monthlyPayment": 140,
-         "eligibilityConfidence": "med", "_similarity": 0.4},
+         "eligibilityConfidence": "med"},
     ]
     state = {
         "sanitized_query": "macbook laptop",
         "candidates": candidates,
+        "candidate_scores": {"similarity": [0.9, 0.4]},
         "parsed_constraints": {"category": "electronics", "raw_keywords": ["macbook"]},
         "request_id": "test",
         "debug_trace": [],
     }
-    result = rerank_node(state)
+    result = await rerank_node(state)
     assert len(result["reranked"]) == 2
-    assert all("_rerank_score" in c for c in result["reranked"])
+    assert len(result["candidate_scores"]["rerank"]) == 2
+    assert result["candidate_scores"]["similarity"] == [0.9, 0.4]
     # MacBook should score higher (keyword match + category match)
-    assert result["reranked"][0]["id"] == "x"
+    assert candidates[result["reranked"][0]]["id"] == "x"
+    # Scores live in side arrays; candidate records are left untouched
+    assert all("_rerank_score" not in c for c in candidates)
 
 
-def test_rerank_category_preference_boost():
+@pytest.mark.asyncio
+async def test_rerank_category_preference_boost():
     """Verify category preference boost differentiates two otherwise-similar items."""
     candidates = [
         {"id": "a", "merchantName": "Store", "productName": "Widget", "category": "travel",
          "totalPrice": 500, "apr": 0, "termMonths": 6, "monthlyPayment": 83,
-         "eligibilityConfidence": "high", "_similarity": 0.5},
+         "eligibilityConfidence": "high"},
         {"id": "b", "merchantName": "Store", "productName": "Widget", "category": "electronics",
          "totalPrice": 500, "apr": 0, "termMonths": 6, "monthlyPayment": 83,
-         "eligibilityConfidence": "high", "_similarity": 0.5},
+         "eligibilityConfidence": "high"},
     ]
     state = {
         "sanitized_query": "widget",
         "candidates": candidates,
+        "candidate_scores": {"similarity": [0.5, 0.5]},
         "parsed_constraints": {"category": "electronics", "raw_keywords": []},
         "request_id": "test",
         "debug_trace": [],
     }
-    result = rerank_node(state)
+    result = await rerank_node(state)
     # Electronics item should rank higher due to category boost
-    assert result["reranked"][0]["id"] == "b"
+    assert candidates[result["reranked"][0]]["id"] == "b"
+
+
+@pytest.mark.asyncio
+async def test_rerank_process_pool_matches_inline(monkeypatch):
+    from app.config import get_settings
+    from app import executors
+
+    retrieved = await retrieve_node({"sanitized_query": "nike running shoes", "parsed_constraints": {}, "request_id": "test"})
+    state = {
+        "sanitized_query": "nike running shoes",
+        "candidates": retrieved["candidates"],
+        "candidate_scores": retrieved["candidate_scores"],
+        "parsed_constraints": {"category": "sneakers", "raw_keywords": ["nike"]},
+        "request_id": "test",
+        "debug_trace": [],
+    }
+    inline = await rerank_node(state)
+    monkeypatch.setattr(executors, "_executors", executors.Executors(process_workers=2))
+    monkeypatch.setattr(get_settings(), "EXEC_PROCESS_MIN_ITEMS", 1)
+    try:
+        pooled = await rerank_node(state)
+        stats = executors.get_executors().stats()
+    finally:
+        executors.shutdown_executors()
+    assert pooled["reranked"] == inline["reranked"]
+    assert list(pooled["candidate_scores"]["rerank"]) == pytest.approx(list(inline["candidate_scores"]["rerank"]), nan_ok=True)
+    assert stats["pools"]["process"]["started"] and stats["stages"]["rerank"]["completed"] == 1
+
+
+def test_executor_stage_limit_queues_and_reports():
+    import threading
+    from app.executors import Executors, parse_stage_limits
+
+    assert parse_stage_limits("rerank=2, retrieve=16") == {"rerank": 2, "retrieve": 16}
+    with pytest.raises(ValueError):
+        parse_stage_limits("rerank=0")
+    ex = Executors(thread_workers=4, stage_limits={"rerank": 1})
+    release = threading.Event()
+    try:
+        first = ex.submit("rerank", "thread", release.wait, 5)
+        waiter = threading.Thread(target=ex.run, args=("rerank", "thread", sum, [1, 2]))
+        waiter.start()
+        for _ in range(200):
+            if ex.stats()["stages"]["rerank"]["waiting"] == 1:
+                break
+            threading.Event().wait(0.01)
+        stats = ex.stats()
+        # One call admitted and running, the second held back by the stage limit
+        assert stats["stages"]["rerank"]["waiting"] == 1 and stats["stages"]["rerank"]["active"] == 1
+        release.set()
+        waiter.join(5)
+        assert first.result() is True
+        with pytest.raises(ZeroDivisionError):
+            ex.run("score", "inline", lambda: 1 / 0)
+        stats = ex.stats()
+        assert stats["stages"]["rerank"] | {"waitMs": 0, "runMs": 0} == {
+            "limit": 1, "waiting": 0, "active": 0, "completed": 2, "failed": 0, "waitMs": 0, "runMs": 0,
+        }
+        assert stats["stages"]["score"]["failed"] == 1 and stats["pools"]["thread"]["inflight"] == 0
+        assert not stats["pools"]["process"]["started"]
+    finally:
+        release.set()
+        ex.close()
 
 
 # ── Pipeline stage: summarize ──
@@ -247,6 +548,667 @@ def test_bm25_search_prefers_exact_match():
     assert results[0]["merchantName"] == "Peloton"
 
 
+def _reference_bm25(doc_tokens: list[list[str]], query_tokens: list[str], top_k: int) -> list[tuple[int, float]]:
+    """Original per-document BM25 scorer, kept as the ground truth for the index."""
+    import math
+    from collections import Counter
+
+    n = len(doc_tokens)
+    k1, b = 1.5, 0.75
+    doc_freqs = Counter(t for dt in doc_tokens for t in set(dt))
+    avg_dl = sum(len(dt) for dt in doc_tokens) / max(n, 1)
+    scores = []
+    for dt in doc_tokens:
+        tf_map = Counter(dt)
+        score = 0.0
+        for qt in query_tokens:
+            df = doc_freqs.get(qt, 0)
+            if df == 0:
+                continue
+            idf = math.log((n - df + 0.5) / (df + 0.5) + 1.0)
+            tf = tf_map.get(qt, 0)
+            tf_norm = (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * len(dt) / avg_dl))
+            score += idf * tf_norm
+        scores.append(score)
+    top = sorted(range(n), key=lambda i: scores[i], reverse=True)[:top_k]
+    return [(i, scores[i]) for i in top if scores[i] > 0]
+
+
+def test_bm25_index_matches_reference_scorer():
+    """Inverted index + MaxScore pruning returns exactly the brute-force top-k."""
+    import random
+    from app.index.bm25 import BM25Index
+
+    rng = random.Random(7)
+    vocab = [f"w{i}" for i in range(300)]
+    weights = [1.0 / (i + 1) for i in range(len(vocab))]  # Zipf-ish, so pruning kicks in
+    docs = [rng.choices(vocab, weights, k=rng.randint(1, 12)) for _ in range(3000)]
+    index = BM25Index.build(docs)
+
+    queries = [rng.choices(vocab, weights, k=rng.randint(1, 4)) for _ in range(60)]
+    queries += [["w0", "w0", "w5"], ["unknown"], ["w299", "unknown", "w1"]]
+    for q in queries:
+        ids, scores = index.search(q, 20)
+        assert list(zip(ids.tolist(), scores.tolist())) == _reference_bm25(docs, q, 20), q
+
+
+def test_bm25_store_matches_reference_scorer():
+    from app.index.bm25 import tokenize
+    from app.catalog import _offer_text
+
+    store = get_store()
+    docs = [tokenize(_offer_text(o)) for o in store.offers]
+    for q in ["macbook laptop", "best buy best buy", "nike air max sneakers", "home"]:
+        expected = [(store.offers[i]["id"], s) for i, s in _reference_bm25(docs, tokenize(q), 20)]
+        got = [(r["id"], r["_bm25_score"]) for r in store.bm25_search(q, top_k=20)]
+        assert got == expected
+
+
+# ── Catalog updates ──
+
+def _fresh_store():
+    from app.store import InMemoryStore
+
+    store = InMemoryStore()
+    store._seed()
+    return store
+
+
+NEW_OFFER = {
+    "id": "offer-new", "merchantName": "Nike", "productName": "Pegasus 41 Running Shoe", "category": "sneakers",
+    "totalPrice": 140, "termMonths": 4, "apr": 0, "monthlyPayment": 35.0, "eligibilityConfidence": "high",
+}
+
+
+def test_store_upsert_and_delete_update_indexes_in_place():
+    from app.index.bm25 import tokenize
+    from app.catalog import _offer_text
+
+    store = _fresh_store()
+    repriced = {**store.offers[0].to_dict(), "totalPrice": 99.0, "monthlyPayment": 9.9}
+    removed = store.offers[5]["id"]
+    store.upsert_offers([repriced, NEW_OFFER])
+    store.delete_offers([removed])
+    assert store.pending_rows == 4  # two appended rows + two tombstones
+    live_ids = [o["id"] for o in store.offers]
+    assert removed not in live_ids and live_ids.count(repriced["id"]) == 1
+
+    # BM25 over the live catalog (df, avg length, postings) matches a from-scratch scorer
+    docs = [tokenize(_offer_text(o)) for o in store.offers]
+    for q in ["nike running shoe", "best buy", "macbook air"]:
+        expected = [(store.offers[i]["id"], sc) for i, sc in _reference_bm25(docs, tokenize(q), 20)]
+        assert [(r["id"], r["_bm25_score"]) for r in store.bm25_search(q, top_k=20)] == expected
+
+    # Attribute columns and filtered search see the new values, never the tombstones
+    assert [o["id"] for o in store.filter_offers(max_price=100)] == [repriced["id"]]
+    filtered = store.bm25_search("nike", top_k=10, filters={"category": "sneakers", "max_price": 150})
+    assert [r["id"] for r in filtered][:1] == ["offer-new"]
+    emb = store.get_embedding("running shoe")
+    assert removed not in {r["id"] for r in store.vector_search(emb, top_k=len(store.offers))}
+
+    # Compaction rebuilds a clean base with identical scores
+    before = sorted((-r["_bm25_score"], r["id"]) for r in store.bm25_search("nike best buy", top_k=50))
+    store.compact()
+    assert store.pending_rows == 0
+    after = sorted((-r["_bm25_score"], r["id"]) for r in store.bm25_search("nike best buy", top_k=50))
+    assert after == before
+
+
+def test_wrong_dimension_embedding_is_rejected_without_touching_the_store():
+    import numpy as np
+    from pydantic import ValidationError
+    from app.config import get_settings
+    from app.records import OfferRecord
+    from app.schemas import OfferUpsert
+
+    store = _fresh_store()
+    dim = get_settings().EMBEDDING_DIM
+    with pytest.raises(ValueError):
+        store.upsert_offers([{**NEW_OFFER, "embedding": [0.1] * (dim + 1)}])
+    snapshot = store.snapshot()
+    bad = OfferRecord.from_dict({**store.offers[0].to_dict(), "id": "offer-bad"})
+    with pytest.raises(ValueError):
+        snapshot.apply([(bad, np.ones(dim - 1, dtype=np.float32))], [], snapshot.version + 1)
+    # So is a price the int32 cents columns can't hold (checked before BM25 or the columns grow)
+    with pytest.raises(ValueError, match="out of range"):
+        store.upsert_offers([{**NEW_OFFER, "id": "offer-huge", "totalPrice": 30_000_000}])
+    # Nothing was half-applied: later writes still work
+    store.upsert_offers([NEW_OFFER])
+    store.delete_offers([store.offers[0]["id"]])
+    assert "offer-new" in store.snapshot() and len(store.snapshot()) == len(snapshot)
+    with pytest.raises(ValidationError):
+        OfferUpsert(**NEW_OFFER, embedding=[0.1] * (dim - 1))
+    with pytest.raises(ValidationError):
+        OfferUpsert(**{**NEW_OFFER, "monthlyPayment": 30_000_000})
+
+
+def test_store_compacts_after_many_updates(monkeypatch):
+    import app.store as store_module
+
+    monkeypatch.setattr(store_module, "_COMPACT_MIN_ROWS", 8)
+    store = _fresh_store()
+    for i in range(20):
+        store.upsert_offers([{**NEW_OFFER, "totalPrice": 100 + i}])
+    assert store.pending_rows <= 9
+    assert [o["totalPrice"] for o in store.offers if o["id"] == "offer-new"] == [119]
+
+
+def test_pinned_snapshot_is_unaffected_by_updates_and_reloads():
+    store = _fresh_store()
+    pinned = store.snapshot()
+    emb = store.get_embedding("running shoe")
+
+    def view(snapshot):
+        return (
+            [(r["id"], r["_similarity"]) for r in snapshot.vector_search(emb, top_k=10)],
+            [(r["id"], r["_bm25_score"]) for r in snapshot.bm25_search("nike running", top_k=10)],
+            [o["id"] for o in snapshot.filter_offers(max_price=200)],
+        )
+
+    before = view(pinned)
+    store.upsert_offers([{**store.offers[0].to_dict(), "totalPrice": 10.0}, NEW_OFFER])
+    store.delete_offers([before[1][0][0]])
+    assert store.reload().result(timeout=30) == pinned.version + 3
+    store.upsert_offers([{**NEW_OFFER, "id": "offer-new-2"}])
+    assert view(pinned) == before and len(pinned) == 34
+    assert store.catalog_version == pinned.version + 4
+    assert "offer-new-2" in store.snapshot() and "offer-new-2" not in pinned
+
+
+def test_reload_is_atomic_under_concurrent_queries():
+    import threading
+
+    store = _fresh_store()
+    reloaded = [{**o.to_dict(), "id": f"v2-{o['id']}"} for o in store.offers[:20]]
+    emb = store.get_embedding("laptop")
+    errors: list[str] = []
+    stop = threading.Event()
+
+    def query():
+        while not stop.is_set():
+            snapshot = store.snapshot()
+            ids = {o["id"] for o in snapshot.offers}
+            hits = snapshot.vector_search(emb, top_k=50) + snapshot.bm25_search("apple laptop", top_k=50)
+            # Every hit must come from the snapshot the query pinned, never a mix of catalogs
+            if not {h["id"] for h in hits} <= ids:
+                errors.append(f"torn read at v{snapshot.version}")
+
+    readers = [threading.Thread(target=query) for _ in range(4)]
+    for t in readers:
+        t.start()
+    for i in range(6):
+        store.reload(reloaded if i % 2 == 0 else None).result(timeout=30)
+        store.upsert_offers([{**NEW_OFFER, "totalPrice": 100 + i}])
+    stop.set()
+    for t in readers:
+        t.join()
+    assert not errors
+    assert store.catalog_version == 13 and len(store.offers) == 35
+
+
+def test_snapshot_round_trip_is_memory_mapped_and_identical(tmp_path, monkeypatch):
+    import numpy as np
+    from app.config import get_settings
+    from app.snapshot import load_snapshot, write_snapshot
+
+    store = _fresh_store()
+    store.upsert_offers([NEW_OFFER])
+    store.compact()
+    built = store.snapshot()
+    directory = write_snapshot(built, tmp_path)
+    assert (tmp_path / "CURRENT").read_text() == directory.name
+
+    loaded = load_snapshot(tmp_path)
+    assert loaded.version == built.version and loaded.pending_rows == 0
+    if get_settings().VECTOR_INDEX == "exact" and get_settings().VECTOR_QUANTIZATION == "none":
+        assert isinstance(loaded._vectors.vectors, np.memmap)  # served straight from the mapped file
+    # Columns, bitmaps, sorted indexes, postings and IDF are the mapped arrays, not rebuilt copies
+    for mapped_array in [loaded._columns.price_cents, loaded._columns.category_masks[0], loaded._columns.zero_apr,
+                         loaded._columns._price_index.order, loaded._bm25.doc_len, loaded._bm25._idf,
+                         loaded._bm25._upper, loaded._bm25.df]:
+        assert isinstance(mapped_array, np.memmap)
+    assert loaded._columns.category_ranges == built._columns.category_ranges
+    assert np.array_equal(loaded._bm25._upper, built._bm25._upper) and loaded._bm25.avg_dl == built._bm25.avg_dl
+    emb = store.get_embedding("running shoe")
+    for filters in [None, {"category": "sneakers"}, {"max_price": 900, "only_zero_apr": True}]:
+        assert [(r["id"], r["_similarity"]) for r in loaded.vector_search(emb, top_k=10, filters=filters)] == \
+            [(r["id"], r["_similarity"]) for r in built.vector_search(emb, top_k=10, filters=filters)]
+        assert [(r["id"], r["_bm25_score"]) for r in loaded.bm25_search("nike running", top_k=10, filters=filters)] == \
+            [(r["id"], r["_bm25_score"]) for r in built.bm25_search("nike running", top_k=10, filters=filters)]
+
+    # The store maps the snapshot at startup and keeps updating it incrementally
+    monkeypatch.setattr(get_settings(), "SNAPSHOT_DIR", str(tmp_path))
+    from app.store import InMemoryStore
+    mapped = InMemoryStore()
+    mapped._seed()
+    assert mapped.catalog_version == built.version and len(mapped.offers) == 35
+    mapped.upsert_offers([{**NEW_OFFER, "totalPrice": 120}])
+    assert [o["totalPrice"] for o in mapped.offers if o["id"] == "offer-new"] == [120]
+
+    # Corrupted files are rejected by the manifest checksums (opt-in: hashing reads every file)
+    with open(directory / "bm25_tfs.npy", "r+b") as f:
+        f.seek(-1, 2)
+        f.write(b"\x7f")
+    load_snapshot(tmp_path)
+    with pytest.raises(ValueError, match="checksum"):
+        load_snapshot(tmp_path, verify=True)
+    # ...while truncated files are always caught by their size
+    with open(directory / "offers.jsonl", "r+b") as f:
+        f.truncate(10)
+    with pytest.raises(ValueError, match="bytes"):
+        load_snapshot(tmp_path)
+
+
+@pytest.mark.parametrize("placement", ["hash", "category"])
+def test_sharded_store_matches_single_process(monkeypatch, placement):
+    from app.config import get_settings
+
+    settings = get_settings()
+    monkeypatch.setattr(settings, "STORE_SHARDS", 3)
+    monkeypatch.setattr(settings, "STORE_SHARD_PLACEMENT", placement)
+    sharded = _fresh_store()
+    monkeypatch.setattr(settings, "STORE_SHARDS", 0)
+    single = _fresh_store()
+    exact = settings.VECTOR_INDEX == "exact" and settings.VECTOR_QUANTIZATION == "none"
+
+    def assert_same(a, b):
+        emb = single.get_embedding("running shoe laptop")
+        for filters in [None, {"category": "sneakers"}, {"category": "unknown"}, {"max_price": 900, "only_zero_apr": True}]:
+            got, want = a.bm25_search("nike running laptop", 10, filters), b.bm25_search("nike running laptop", 10, filters)
+            assert [(r["id"], r.score) for r in got] == [(r["id"], r.score) for r in want]
+            if exact:
+                got, want = a.vector_search(emb, 10, filters), b.vector_search(emb, 10, filters)
+                assert [r["id"] for r in got] == [r["id"] for r in want]
+                assert [r.score for r in got] == pytest.approx([r.score for r in want], abs=1e-6)
+        if exact:
+            assert [[r["id"] for r in hits] for hits in a.vector_search_many([emb, emb[::-1]], 5)] == \
+                [[r["id"] for r in hits] for hits in b.vector_search_many([emb, emb[::-1]], 5)]
+        assert [o["id"] for o in a.offers] == [o["id"] for o in b.offers]
+        assert (a.filter_mask(max_monthly=60) == b.filter_mask(max_monthly=60)).all()
+
+    try:
+        assert_same(sharded.snapshot(), single.snapshot())
+        pinned = sharded.snapshot()
+        moved = {**single.offers[0].to_dict(), "category": "sneakers", "totalPrice": 99.0}
+        removed = single.offers[3]["id"]
+        for store in (sharded, single):
+            store.upsert_offers([NEW_OFFER, moved, {**NEW_OFFER, "id": "offer-new-2", "category": "kayaks"}])
+            store.delete_offers([removed, "offer-new-2"])
+        assert_same(sharded.snapshot(), single.snapshot())
+        assert "offer-new" not in pinned and len(pinned.bm25_search("pegasus", 5)) == 0
+        # Live rows (what snapshots and compactions are built from) are gathered back from the shards
+        (got_records, got_emb), (want_records, want_emb) = sharded.snapshot().live_rows(), single.snapshot().live_rows()
+        assert [r["id"] for r in got_records] == [r["id"] for r in want_records]
+        assert got_emb == pytest.approx(want_emb, abs=1e-6)
+        for store in (sharded, single):
+            store.compact()
+        assert_same(sharded.snapshot(), single.snapshot())
+    finally:
+        sharded.close()
+    with pytest.raises(RuntimeError, match="exited"):
+        sharded.snapshot().bm25_search("nike", 5)
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_matches_in_memory_and_pins_versions(tmp_path, monkeypatch):
+    import time
+    from app.config import get_settings
+    from app.sqlite_store import SQLiteStore
+
+    monkeypatch.setattr(get_settings(), "SQLITE_DIR", str(tmp_path))
+    memory = _fresh_store()
+    store = SQLiteStore()
+    store._seed()
+    emb = memory.get_embedding("running shoe laptop")
+    exact = get_settings().VECTOR_INDEX == "exact" and get_settings().VECTOR_QUANTIZATION == "none"
+    try:
+        for filters in [None, {"category": "sneakers"}, {"category": "unknown"}, {"max_price": 900, "only_zero_apr": True}]:
+            if exact:
+                got, want = store.vector_search(emb, 10, filters), memory.vector_search(emb, 10, filters)
+                assert [r["id"] for r in got] == [r["id"] for r in want]
+                assert [r.score for r in got] == pytest.approx([r.score for r in want], abs=1e-5)
+            # FTS5 scores differ from ours (k1), the matches do not
+            got, want = store.bm25_search("nike running laptop", 34, filters), memory.bm25_search("nike running laptop", 34, filters)
+            assert {r["id"] for r in got} == {r["id"] for r in want}
+        assert [o["id"] for o in store.filter_offers(max_monthly=60)] == [o["id"] for o in memory.filter_offers(max_monthly=60)]
+
+        pinned = store.snapshot()
+        removed = memory.offers[3]["id"]
+        store.upsert_offers([NEW_OFFER, {**memory.offers[0].to_dict(), "totalPrice": 1.0}])
+        store.delete_offers([removed, "missing"])
+        current = store.snapshot()
+        assert "offer-new" in current and removed not in current and len(current) == 34
+        assert current.filter_offers(max_price=1)[0]["id"] == memory.offers[0]["id"]
+        # The pinned version still sees its rows, also after a compaction
+        store.compact()
+        assert "offer-new" not in pinned and removed in pinned and len(pinned.filter_offers(max_price=1)) == 0
+        assert current.pending_rows == 2
+        result = await retrieve_node({"sanitized_query": "running shoe", "parsed_constraints": {"category": "sneakers"},
+                                      "request_id": "test", "catalog": current})
+        assert "offer-new" in [c["id"] for c in result["candidates"]]
+        del pinned
+        store.compact()
+        assert current.pending_rows == 0
+
+        # Another store (process) on the same directory reuses the data and sees later writes
+        other = SQLiteStore()
+        other._seed()
+        assert other.snapshot().version == current.version
+        store.delete_offers(["offer-new"])
+        deadline = time.monotonic() + 5
+        while other.snapshot().version == current.version and time.monotonic() < deadline:
+            time.sleep(0.01)  # published by other's watcher thread; snapshot() itself runs no query
+        assert "offer-new" not in other.snapshot() and len(other.snapshot()) == 33
+        other.close()
+
+        # The version, count and pending rows a search or /v1/metrics reads on the event loop cost no query
+        def no_query(*args, **kwargs):
+            raise AssertionError("SQL on the event loop")
+        monkeypatch.setattr(store._db, "read", no_query)
+        monkeypatch.setattr(store._db, "meta", no_query)
+        monkeypatch.setattr(store._db, "retired_rows", no_query)
+        latest = store.snapshot()
+        assert latest.version > current.version and len(latest) == 33 and latest.pending_rows >= 0
+    finally:
+        store.close()
+
+
+@pytest.mark.asyncio
+async def test_startup_seeds_postgres_store_off_the_event_loop(monkeypatch):
+    import app.pg_store as pg_store
+    from app.config import get_settings
+    from app.main import startup
+
+    class FakeDatabase:
+        def __init__(self, *args, **kwargs) -> None:
+            pass
+
+        async def connect(self) -> None:
+            pass
+
+        async def listen(self, callback) -> None:
+            pass
+
+        async def meta(self) -> tuple[int, int]:
+            return 7, 34
+
+        async def close(self) -> None:
+            pass
+
+    monkeypatch.setattr(pg_store, "PgDatabase", FakeDatabase)
+    monkeypatch.setattr(pg_store.PgStore, "_instance", None)
+    monkeypatch.setattr(get_settings(), "STORE_BACKEND", "postgres")
+    await startup()
+    store = pg_store.PgStore._instance
+    try:
+        assert store.catalog_version == 7 and len(store.snapshot()) == 34
+    finally:
+        store.close()
+
+
+def test_pg_store_matches_in_memory(monkeypatch):
+    """Against a real Postgres + pgvector (docker compose up -d postgres), in a throwaway schema."""
+    import asyncio
+    import os
+    import uuid
+
+    pytest.importorskip("asyncpg")
+    pytest.importorskip("pgvector")
+    dsn = os.getenv("PG_TEST_DSN")
+    if not dsn:
+        pytest.skip("set PG_TEST_DSN to run against Postgres")
+    from app.config import get_settings
+    from app.pg_store import PgStore
+
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    monkeypatch.setattr(get_settings(), "DATABASE_URL", dsn)
+    monkeypatch.setattr(get_settings(), "PG_SCHEMA", schema)
+    memory = _fresh_store()
+    store = PgStore()
+    store._seed()
+    emb = memory.get_embedding("running shoe laptop")
+    try:
+        catalog = store.snapshot()
+        assert len(catalog) == len(memory.snapshot()) and catalog.version == 1
+        for filters in [None, {"category": "sneakers"}, {"category": "unknown"}, {"max_price": 900, "only_zero_apr": True}]:
+            # 34 offers with ef_search 100: the HNSW scan visits everything, so the order is exact
+            got, want = store.vector_search(emb, 10, filters), memory.vector_search(emb, 10, filters)
+            assert [r["id"] for r in got] == [r["id"] for r in want]
+            assert [r.score for r in got] == pytest.approx([r.score for r in want], abs=1e-5)
+            # ts_rank scores differ from BM25, the matches do not
+            got, want = store.bm25_search("nike running laptop", 34, filters), memory.bm25_search("nike running laptop", 34, filters)
+            assert {r["id"] for r in got} == {r["id"] for r in want}
+            vector, lexical = catalog.hybrid_search(emb, "nike running laptop", 10, filters)
+            assert [r["id"] for r in vector] == [r["id"] for r in store.vector_search(emb, 10, filters)]
+            assert [r["id"] for r in lexical] == [r["id"] for r in store.bm25_search("nike running laptop", 10, filters)]
+        assert {o["id"] for o in store.filter_offers(max_monthly=60)} == {o["id"] for o in memory.filter_offers(max_monthly=60)}
+
+        removed = memory.offers[3]["id"]
+        store.upsert_offers([NEW_OFFER, {**memory.offers[0].to_dict(), "totalPrice": 1.0}])
+        assert store.delete_offers([removed, "missing"]) == [removed]
+        assert store.delete_offers(["missing"]) == []
+        current = store.snapshot()
+        assert current.version == 3 and len(current) == 34
+        assert "offer-new" in current and removed not in current
+        assert current.filter_offers(max_price=1)[0]["id"] == memory.offers[0]["id"]
+        result = asyncio.run(retrieve_node({"sanitized_query": "running shoe", "parsed_constraints": {"category": "sneakers"},
+                                            "request_id": "test", "catalog": current}))
+        assert "offer-new" in [c["id"] for c in result["candidates"]]
+
+        # Sync calls refuse to block an event loop; async code awaits the database directly
+        async def on_loop():
+            with pytest.raises(RuntimeError):
+                current.vector_search(emb, 5)
+            return await store.run(store.database.vector_search(emb, 5))
+
+        assert [r["id"] for r in asyncio.run(on_loop())] == [r["id"] for r in current.vector_search(emb, 5)]
+        assert store.reload([NEW_OFFER]).result() == 4 and len(store.snapshot()) == 1
+    finally:
+        store.call(store.database.pool.execute(f"DROP SCHEMA {schema} CASCADE"))
+        store.close()
+
+
+def test_crash_budget_backs_off_and_gives_up_on_a_crash_loop():
+    from app.serve import CrashBudget
+
+    now = [0.0]
+    budget = CrashBudget(backoff_s=0.1, max_backoff_s=0.5, max_crashes=5, window_s=60, clock=lambda: now[0])
+    assert [budget.crashed() for _ in range(4)] == [0.1, 0.2, 0.4, 0.5]
+    # Crashes age out of the window, and the backoff resets with them
+    now[0] = 61.0
+    assert budget.crashed() == 0.1
+    assert [budget.crashed() for _ in range(3)] == [0.2, 0.4, 0.5]
+    assert budget.crashed() is None  # 5 deaths within 60s: stop instead of respawning
+    assert CrashBudget(0.1, 1, max_crashes=0, window_s=60).crashed() == 0.1  # 0 = never give up
+
+
+def test_shared_arrays_serve_identical_results_read_only():
+    from app.serve import share_arrays
+
+    store = _fresh_store()
+    snapshot = store.snapshot()
+    emb = store.get_embedding("running shoe")
+    filters = {"max_price": 900, "only_zero_apr": True}
+    before = (snapshot.vector_search(emb, top_k=10, filters=filters), snapshot.bm25_search("nike running", top_k=10))
+
+    blocks = share_arrays(snapshot, min_bytes=0)
+    try:
+        assert blocks
+        assert not snapshot._bm25.doc_ids.flags.writeable and not snapshot._columns.price_cents.flags.writeable
+        after = (snapshot.vector_search(emb, top_k=10, filters=filters), snapshot.bm25_search("nike running", top_k=10))
+        for old, new in zip(before, after):
+            assert [(r["id"], r.score) for r in old] == [(r["id"], r.score) for r in new]
+        # Workers can still apply updates: appends move shared buffers to private memory
+        store.upsert_offers([NEW_OFFER])
+        assert "offer-new" in store.snapshot() and len(store.snapshot()) == len(snapshot) + 1
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def test_admin_offer_endpoints(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.store import InMemoryStore
+
+    from app.config import get_settings
+    from app.routes import admin
+
+    monkeypatch.setattr(InMemoryStore, "_instance", _fresh_store())
+    client = TestClient(app)
+    # Fail closed: no token configured disables the API; a wrong or missing header is refused
+    assert client.post("/v1/admin/compact", headers={"X-Admin-Token": ""}).status_code == 403
+    monkeypatch.setattr(admin, "_ADMIN_TOKEN", "s3cret")
+    assert client.post("/v1/admin/compact").status_code == 403
+    assert client.post("/v1/admin/compact", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    client.headers["X-Admin-Token"] = "s3cret"
+    short = [0.1] * (get_settings().EMBEDDING_DIM - 1)
+    assert client.post("/v1/admin/offers", json={"offers": [{**NEW_OFFER, "embedding": short}]}).status_code == 422
+    assert client.post("/v1/admin/offers", json={"offers": [{**NEW_OFFER, "totalPrice": 3e7}]}).status_code == 422
+    resp = client.post("/v1/admin/offers", json={"offers": [NEW_OFFER]})
+    assert resp.status_code == 200
+    assert resp.json()["ids"] == ["offer-new"] and resp.json()["offerCount"] == 35
+    resp = client.post("/v1/admin/offers/delete", json={"ids": ["offer-new", "missing"]})
+    assert resp.json()["ids"] == ["offer-new"]
+    assert client.post("/v1/admin/compact").json()["pendingRows"] == 0
+    resp = client.post("/v1/admin/reload", json={"offers": [NEW_OFFER]})
+    assert resp.json()["offerCount"] == 1 and resp.json()["version"] == 5
+
+
+def test_event_log_batches_rotates_and_streams_back(tmp_path):
+    from app.events import EventLog, iter_events, segments
+
+    # No directory: a bounded ring of the most recent events
+    ring = EventLog(capacity=3)
+    for i in range(5):
+        ring.record("search", {"i": i})
+    assert [e["i"] for e in ring.recent()] == [2, 3, 4] and ring.dropped == 2
+
+    log = EventLog(tmp_path, flush_ms=60_000, segment_bytes=200, max_segments=3)
+    try:
+        for i in range(4):
+            log.record("feedback" if i % 2 else "search", {"i": i, "resultIds": ["offer-001"]})
+        assert log.flush() == 4 and log.flushes == 1  # one batch, one commit
+        assert [e["i"] for e in iter_events(tmp_path)] == [0, 1, 2, 3]
+        for i in range(4, 40):
+            log.record("search", {"i": i})
+            log.flush()
+    finally:
+        log.close()
+    # Rotated by size, pruned to the newest segments; what is left streams back in order
+    assert len(segments(tmp_path)) == 3
+    kept = [e["i"] for e in iter_events(tmp_path, types={"search"})]
+    assert kept == list(range(kept[0], 40)) and log.written == 40
+    # A torn final line (crash mid-write) is skipped
+    with open(segments(tmp_path)[-1], "a") as f:
+        f.write('{"type": "search", "i": 4')
+    assert [e["i"] for e in iter_events(tmp_path)][-1] == 39
+
+    # Workers sharing a directory never prune each other's open segment
+    shared = tmp_path / "shared"
+    first = EventLog(shared, flush_ms=60_000, max_segments=2)
+    second = EventLog(shared, flush_ms=60_000, segment_bytes=1, max_segments=2)
+    try:
+        first.record("search", {"log": 1})
+        first.flush()
+        for i in range(5):
+            second.record("search", {"log": 2, "i": i})
+            second.flush()
+        first.record("search", {"log": 1})
+        first.flush()
+    finally:
+        first.close()
+        second.close()
+    assert [e["log"] for e in iter_events(shared)].count(1) == 2
+
+
+def test_embedding_cache_lru_ttl_and_persistence(tmp_path):
+    from app.embed_cache import EmbeddingCache, get_embedding_cache
+
+    now = [0.0]
+    cache = EmbeddingCache(capacity=2, ttl_s=10, path=tmp_path / "cache.npz", clock=lambda: now[0])
+    assert cache.get("m", "laptop") is None
+    laptop = cache.put("m", "laptop", [1.0, 0.0])
+    assert cache.get("m", "laptop") is laptop and not laptop.flags.writeable
+    assert cache.get("other-model", "laptop") is None
+    cache.put("m", "ps5", [0.0, 1.0])
+    cache.get("m", "laptop")  # laptop is now the most recent
+    cache.put("m", "tv", [0.5, 0.5])
+    assert cache.get("m", "ps5") is None and cache.evictions == 1
+    now[0] = 5.0
+    cache.put("m", "tv", [0.5, 0.5])
+    now[0] = 12.0
+    assert cache.get("m", "laptop") is None and cache.expirations == 1
+    assert cache.stats() == {"size": 1, "capacity": 2, "hits": 2, "misses": 4, "hitRate": 0.3333,
+                             "evictions": 1, "expirations": 1}
+    # Restarts resume warm, without entries that expired meanwhile
+    assert cache.save() == 1
+    restored = EmbeddingCache(capacity=2, ttl_s=10, path=tmp_path / "cache.npz", clock=lambda: now[0])
+    assert restored.get("m", "tv").tolist() == [0.5, 0.5]
+    now[0] = 20.0
+    assert len(EmbeddingCache(capacity=2, ttl_s=10, path=tmp_path / "cache.npz", clock=lambda: now[0])) == 0
+    assert [p.name for p in tmp_path.iterdir()] == ["cache.npz"]  # no temp files left behind
+    # A torn or corrupt file (e.g. BadZipFile) just means a cold start
+    (tmp_path / "cache.npz").write_bytes((tmp_path / "cache.npz").read_bytes()[:40])
+    corrupt = EmbeddingCache(capacity=2, ttl_s=10, path=tmp_path / "cache.npz", clock=lambda: now[0])
+    assert len(corrupt) == 0 and corrupt.get("m", "tv") is None
+
+    # The store embeds the normalized query once; repeats (in any casing/spacing) are hits
+    store = get_store()
+    hits = get_embedding_cache().hits
+    first = store.get_embedding("Embedding  Cache Probe")
+    assert store.get_embedding("embedding cache probe") is first and get_embedding_cache().hits == hits + 1
+
+
+def test_batching_embedder_coalesces_concurrent_queries():
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+    from app.embedder import BatchingEmbedder, Embedder, HashEmbedder
+
+    class SlowModel(HashEmbedder):
+        model_id = "slow"
+
+        def __init__(self):
+            super().__init__(8)
+            self.batch_sizes = []
+
+        def encode(self, texts):
+            self.batch_sizes.append(len(texts))
+            time.sleep(0.01)  # a forward pass costs about the same for 1 or 16 texts
+            return super().encode(texts)
+
+    model = SlowModel()
+    embedder = BatchingEmbedder(model, max_batch=16, window_ms=5)
+    queries = [f"query {i % 20}" for i in range(64)]
+    try:
+        with ThreadPoolExecutor(32) as pool:
+            got = list(pool.map(embedder.embed, queries))
+        reference = HashEmbedder(8)
+        assert all(np.array_equal(g, reference.embed(q)) for g, q in zip(got, queries))
+        # Concurrent calls share forward passes (identical texts share a row), never above max_batch
+        assert len(model.batch_sizes) <= 16 and max(model.batch_sizes) <= 16
+        assert embedder.stats()["items"] == 64 and embedder.stats()["meanBatch"] > 2
+        assert embedder.embed_many(["a", "b"]).shape == (2, 8)
+    finally:
+        embedder.close()
+
+    class MissingWeights(Embedder):
+        model_id = "missing"
+
+        def load(self):
+            raise OSError("no such model")
+
+    # A model that can't load falls back to the hash embedding
+    fallback = BatchingEmbedder(MissingWeights(8))
+    try:
+        assert np.array_equal(fallback.embed("laptop"), HashEmbedder(8).embed("laptop")) and fallback.model_id == "hash"
+    finally:
+        fallback.close()
+
+
 # ── Guardrails: fintech trust language ──
 
 BANNED_CERTAINTY_PHRASES = [
@@ -309,7 +1271,8 @@ def test_ingress_blocks_fraud_intents():
 
 # ── Circuit breaker tests ──
 
-def test_retrieve_circuit_breaker_vector_fail(monkeypatch):
+@pytest.mark.asyncio
+async def test_retrieve_circuit_breaker_vector_fail(monkeypatch):
     """If vector search raises, retrieve falls back to BM25-only."""
     store = get_store()
     monkeypatch.setattr(store, "get_embedding", lambda q: (_ for _ in ()).throw(RuntimeError("embed fail")))
@@ -319,25 +1282,28 @@ def test_retrieve_circuit_breaker_vector_fail(monkeypatch):
         "request_id": "test",
         "debug_trace": [],
     }
-    result = retrieve_node(state)
+    result = await retrieve_node(state)
     assert len(result["candidates"]) >= 1
     # Trace should show bm25-only path
     trace_notes = result["debug_trace"][-1]["notes"]
     assert "bm25-only" in trace_notes
 
 
-def test_retrieve_circuit_breaker_both_fail(monkeypatch):
+@pytest.mark.asyncio
+async def test_retrieve_circuit_breaker_both_fail(monkeypatch):
     """If both vector and BM25 fail, retrieve falls back to unfiltered store offers."""
     store = get_store()
     monkeypatch.setattr(store, "get_embedding", lambda q: (_ for _ in ()).throw(RuntimeError("embed fail")))
-    monkeypatch.setattr(store, "bm25_search", lambda q, top_k=20: (_ for _ in ()).throw(RuntimeError("bm25 fail")))
+    monkeypatch.setattr(
+        store.snapshot(), "bm25_search", lambda q, top_k=20, filters=None: (_ for _ in ()).throw(RuntimeError("bm25 fail")),
+    )
     state = {
         "sanitized_query": "laptop",
         "parsed_constraints": {},
         "request_id": "test",
         "debug_trace": [],
     }
-    result = retrieve_node(state)
+    result = await retrieve_node(state)
     # Should still return results from raw store offers
     assert len(result["candidates"]) >= 1
     trace_notes = result["debug_trace"][-1]["notes"]
@@ -346,13 +1312,19 @@ def test_retrieve_circuit_breaker_both_fail(monkeypatch):
 
 def test_rank_penalizes_constraint_violators():
     """Items that violate user constraints should rank below strict matches."""
-    reranked = [
+    candidates = [
         {"id": "a", "monthlyPayment": 50, "totalPrice": 500, "apr": 0, "termMonths": 12,
-         "eligibilityConfidence": "high", "productName": "Cheap", "_rerank_score": 0.5},
+         "eligibilityConfidence": "high", "productName": "Cheap"},
         {"id": "b", "monthlyPayment": 100, "totalPrice": 1200, "apr": 0, "termMonths": 12,
-         "eligibilityConfidence": "high", "productName": "Expensive", "_rerank_score": 0.9},
+         "eligibilityConfidence": "high", "productName": "Expensive"},
     ]
-    state = {"reranked": reranked, "parsed_constraints": {"max_price": 800}, "request_id": "test"}
+    state = {
+        "candidates": candidates,
+        "candidate_scores": {"rerank": [0.5, 0.9]},
+        "reranked": [1, 0],
+        "parsed_constraints": {"max_price": 800},
+        "request_id": "test",
+    }
     result = rank_node(state)
     ranked = result["ranked"]
     # "Cheap" ($500) should rank above "Expensive" ($1200) despite lower rerank score
@@ -392,3 +1364,254 @@ async def test_search_endpoint_shape_and_ordering():
     why = result.get("why_this_recommendation", "").lower()
     for phrase in BANNED_CERTAINTY_PHRASES:
         assert phrase not in why, f"Banned phrase '{phrase}' in integration test output"
+
+
+def test_embed_catalog_job_is_incremental_and_resumable(tmp_path, monkeypatch):
+    import numpy as np
+    from app import embed_catalog
+    from app.config import get_settings
+    from app.embedder import HashEmbedder
+    from app.seed import offer_embed_text, raw_offers
+
+    offers = list(raw_offers())
+    out = tmp_path / "vectors"
+    first = embed_catalog.run(offers, out, chunk=7)
+    assert first["embedded"] == len(offers) and first["skipped"] == 0
+    vectors = embed_catalog.VectorFile(out, "hash", get_settings().EMBEDDING_DIM)
+    texts = [offer_embed_text(raw) for raw in offers]
+    assert np.allclose(vectors.embed_many(texts, lambda t: 1 / 0), HashEmbedder(vectors.dim).embed_many(texts))
+
+    # Unchanged offers are skipped; an edited one is re-embedded (appended, last index line wins)
+    offers[3] = {**offers[3], "productName": offers[3]["productName"] + " (2026 model)"}
+    second = embed_catalog.run(offers, out, chunk=7)
+    assert (second["embedded"], second["skipped"]) == (1, len(offers) - 1) and second["rows"] == len(offers) + 1
+
+    # A crash mid-commit (unindexed vector rows, torn index line) is cut back on the next run
+    with open(out / "vectors.f32", "ab") as f:
+        f.write(b"\0" * 4 * vectors.dim * 2)
+    with open(out / "index.jsonl", "a") as f:
+        f.write('["offer-999", "abc"')
+    resumed = embed_catalog.VectorFile(out, "hash", vectors.dim)
+    assert resumed.rows == len(offers) + 1 and "offer-999" not in resumed.entries
+    assert (out / "vectors.f32").stat().st_size == resumed.rows * 4 * vectors.dim
+    with pytest.raises(ValueError):
+        embed_catalog.VectorFile(out, "other-model", vectors.dim)
+
+    # Parallel workers write the same vectors
+    parallel = embed_catalog.run(offers[:10], tmp_path / "parallel", workers=2, chunk=3)
+    assert parallel["embedded"] == 10
+    assert np.array_equal(embed_catalog.VectorFile(tmp_path / "parallel", "hash", vectors.dim).vectors(),
+                          HashEmbedder(vectors.dim).embed_many([offer_embed_text(raw) for raw in offers[:10]]))
+
+    # Seeding reads from the file; only the seed offer whose stored text has since changed goes to the model
+    from app.store import InMemoryStore
+
+    monkeypatch.setattr(get_settings(), "EMBED_VECTORS_DIR", str(out))
+    model, calls = embed_catalog.get_embedder(), []
+    embed = model.embed_many
+    monkeypatch.setattr(model, "embed_many", lambda t: calls.append(list(t)) or embed(t))
+    records, embeddings = InMemoryStore._seed_catalog()
+    assert len(records) == len(offers) and calls == [[texts[3]]]
+    assert np.allclose(embeddings, HashEmbedder(vectors.dim).embed_many(texts))
+
+
+@pytest.mark.asyncio
+async def test_retrieve_runs_legs_concurrently_with_per_leg_timeouts(monkeypatch):
+    import time
+    from app.config import get_settings
+    from app.executors import Executors
+    from app.pipeline import retrieve
+
+    executors = Executors(thread_workers=4)  # the shared pool is CPU-count sized
+    monkeypatch.setattr(retrieve, "get_executors", lambda: executors)
+    store = get_store()
+    catalog = store.snapshot()
+    vector_search, bm25_search = catalog.vector_search, catalog.bm25_search
+
+    def slow(fn, seconds):
+        def call(*args, **kwargs):
+            time.sleep(seconds)
+            return fn(*args, **kwargs)
+        return call
+
+    state = {"sanitized_query": "laptop", "parsed_constraints": {}, "request_id": "test", "debug_trace": []}
+    monkeypatch.setattr(get_settings(), "RETRIEVE_TIMEOUT_MS", 2000)
+    monkeypatch.setattr(catalog, "vector_search", slow(vector_search, 0.15))
+    monkeypatch.setattr(catalog, "bm25_search", slow(bm25_search, 0.15))
+    t0 = time.perf_counter()
+    result = await retrieve_node(state)
+    # The legs overlap: about one leg's latency, not the sum
+    assert time.perf_counter() - t0 < 0.28
+    assert result["debug_trace"][-1]["notes"].startswith("hybrid") and "late" not in result["debug_trace"][-1]["notes"]
+
+    # A late BM25 leg is dropped (vector results still served) and noted in the trace
+    monkeypatch.setattr(get_settings(), "RETRIEVE_TIMEOUT_MS", 50)
+    monkeypatch.setattr(catalog, "vector_search", vector_search)
+    monkeypatch.setattr(catalog, "bm25_search", slow(bm25_search, 0.3))
+    result = await retrieve_node(state)
+    assert result["candidates"] and "bm25 leg late > 50ms" in result["debug_trace"][-1]["notes"]
+
+    # A late vector leg trips the same breaker as a failing embedder
+    monkeypatch.setattr(catalog, "vector_search", slow(vector_search, 0.3))
+    monkeypatch.setattr(catalog, "bm25_search", bm25_search)
+    result = await retrieve_node(state)
+    notes = result["debug_trace"][-1]["notes"]
+    assert result["candidates"] and notes.startswith("bm25-only") and "vector leg late" in notes
+    executors.close()
+
+
+@pytest.mark.asyncio
+async def test_executors_arun_waits_for_stage_limit_off_the_loop():
+    import asyncio
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from app.executors import Executors
+
+    executors = Executors(thread_workers=4, stage_limits={"rerank": 1})
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    probe = asyncio.ensure_future(ticker())
+    try:
+        # The second call waits for the stage gate while the loop keeps running
+        results = await asyncio.gather(*(executors.arun("rerank", "thread", time.sleep, 0.1) for _ in range(2)))
+        assert results == [None, None] and ticks >= 20
+        stage = executors.stats()["stages"]["rerank"]
+        assert (stage["completed"], stage["active"], stage["waiting"]) == (2, 0, 0)
+
+        # Waiters park no threads: the loop's default executor stays free for to_thread work
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(1))
+        queued = [asyncio.ensure_future(executors.arun("rerank", "thread", time.sleep, 0.05)) for _ in range(6)]
+        await asyncio.sleep(0.01)
+        assert await asyncio.wait_for(asyncio.to_thread(len, "free"), 0.04) == 4
+        assert executors.stats()["stages"]["rerank"]["waiting"] == 5
+        await asyncio.gather(*queued)
+
+        # A caller cancelled while waiting gives up its place (or the permit, if it was just handed over)
+        holder = asyncio.ensure_future(executors.arun("rerank", "thread", time.sleep, 0.05))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(executors.arun("rerank", "thread", time.sleep, 0))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await holder
+        assert await asyncio.wait_for(executors.arun("rerank", "inline", len, "ok"), 1) == 2
+    finally:
+        probe.cancel()
+        executors.close()
+
+
+@pytest.mark.asyncio
+async def test_debug_trace_appends_one_step_per_node_and_is_skipped_when_off(monkeypatch):
+    from app.pipeline.orchestrator import run_search
+
+    traced = await run_search(query="laptop under $800")
+    assert [t["step"] for t in traced["debug_trace"]] == [
+        "ingress", "intent", "retrieve", "rerank", "rank", "eligibility", "summarize",
+    ]
+    # Nodes return only their own step; the state reducer does the appending
+    step = rank_node({**traced, "debug_trace": [{"step": "earlier", "ms": 0.0, "notes": ""}]})["debug_trace"]
+    assert [t["step"] for t in step] == ["rank"]
+
+    untraced = await run_search(query="laptop under $800", trace=False, cached=False)
+    assert untraced["debug_trace"] == []
+    assert [o["id"] for o in untraced["ranked"]] == [o["id"] for o in traced["ranked"]]
+    # Step latencies (what search events record) don't depend on tracing
+    assert list(untraced["step_ms"]) == [t["step"] for t in traced["debug_trace"]]
+
+
+def test_query_understanding_matches_reference_scans_and_is_memoized(monkeypatch):
+    import re
+    import time
+    from app.config import get_settings
+    from app.pipeline.understanding import (
+        CATEGORY_KEYWORDS, DISALLOWED_PATTERNS, PII_PATTERNS, cache_stats, detect_category, parse_constraints, sanitize,
+    )
+
+    def reference(query):
+        cleaned = query
+        for pattern, replacement in PII_PATTERNS:
+            cleaned = re.sub(pattern, replacement, cleaned)
+        cleaned = re.sub(r"\s+", " ", cleaned.lower().strip())
+        blocked = next((p for p in DISALLOWED_PATTERNS if re.search(p, cleaned, re.IGNORECASE)), None)
+        category = next((cat for cat, kws in CATEGORY_KEYWORDS.items() if any(kw in cleaned for kw in kws)), None)
+        return cleaned, blocked, category
+
+    queries = [
+        "Laptop under $800", "call 555-123-4567 or 555.123.4567", "card 4111111111111111 please",
+        "ssn 123-45-6789 and john.doe@mail.example.com", "How to HACK   credit", "costa rica beach trip",
+        "new balance sneakers for the gym", "coffee machine", "exploit", "exploit this", "smartwatch", "ski steam deck",
+        "tvs and a sofa", "order 1234567890123", "12345678901234567 digits",
+    ]
+    for query in queries:
+        cleaned, blocked = sanitize(query)
+        assert (cleaned, blocked, detect_category(cleaned)) == reference(query), query
+
+    # Redacted queries are never memoized (the memo would hold the raw PII); clean ones are
+    before = cache_stats()["sanitize"]["size"]
+    sanitize("reach me at 555-123-4567")
+    assert cache_stats()["sanitize"]["size"] == before
+    sanitize("a query nobody has sent yet")
+    assert cache_stats()["sanitize"]["size"] == before + 1
+
+    first, _ = parse_constraints("laptop under $800")
+    first["raw_keywords"].append("mutated")
+    second, applied = parse_constraints("laptop under $800")
+    assert second["raw_keywords"] == ["laptop"] and applied == {"budget": "$800", "category": "electronics"}
+    assert cache_stats()["parse"]["hits"] >= 1
+
+    # Long input is cut at a word boundary, which keeps PII tokens whole and the scans bounded
+    monkeypatch.setattr(get_settings(), "QUERY_MAX_CHARS", 20)
+    assert sanitize("laptop for bob@example.com")[0] == "laptop for"
+    # ...and one long token is cut at the limit (then redacted) rather than dropped
+    assert sanitize("Macbookprolaptopunder$2000")[0] == "macbookprolaptopunde"
+    assert sanitize(" bob@example.com" + "x" * 30) == ("[email_redacted]", None)
+    monkeypatch.setattr(get_settings(), "QUERY_MAX_CHARS", 256)
+    t0 = time.perf_counter()
+    sanitize("a" + "." * 40_000 + "@")
+    assert time.perf_counter() - t0 < 0.5
+
+
+@pytest.mark.asyncio
+async def test_search_cache_canonical_key_admission_and_invalidation(monkeypatch):
+    from app import search_cache
+    from app.pipeline.orchestrator import run_search
+    from app.search_cache import SearchResultCache
+
+    now = [0.0]
+    cache = SearchResultCache(capacity=2, ttl_s=60, clock=lambda: now[0])
+    # Full: a key looked up once can't displace one looked up more often, but a more popular one can
+    for key in ("a", "a", "a", "b"):
+        if cache.get(key, 1) is None:
+            cache.put(key, 1, {"k": key}, 10.0)
+    assert cache.get("c", 1) is None and not cache.put("c", 1, {"k": "c"}, 10.0)
+    for _ in range(4):
+        cache.get("d", 1)
+    assert cache.put("d", 1, {"k": "d"}, 10.0)  # evicts "a", the least recently used
+    assert cache.get("b", 1) == ({"k": "b"}, 10.0)
+    # Expiry; a new epoch drops everything, and results from the old one are not stored
+    now[0] = 61.0
+    assert cache.get("b", 1) is None
+    assert cache.get("d", 2) is None and len(cache) == 0 and not cache.put("d", 1, {}, 1.0)
+    stats = cache.stats()
+    assert (stats["rejected"], stats["evictions"], stats["expirations"], stats["invalidated"]) == (1, 1, 1, 1)
+
+    monkeypatch.setattr(search_cache, "_cache", SearchResultCache(capacity=16))
+    first = await run_search(query="Laptop under $800")
+    variant = await run_search(query="under $800   laptop", trace=True)
+    assert [o["id"] for o in variant["ranked"]] == [o["id"] for o in first["ranked"]]
+    assert [t["step"] for t in variant["debug_trace"]] == ["cache"]
+    assert (await run_search(query="under $800 laptop", personalized=False))["debug_trace"][0]["step"] == "ingress"
+    assert (await run_search(query="$800 under laptop"))["debug_trace"][0]["step"] == "ingress"  # no budget parsed
+    assert (await run_search(query="hack credit"))["error"] and len(search_cache.get_search_cache()) == 3
+
+    # A plan change invalidates every entry
+    store = get_store()
+    monkeypatch.setattr(store, "plans", store.plans + [{**store.plans[0], "id": "plan-new"}])
+    assert (await run_search(query="laptop under $800"))["debug_trace"][0]["step"] == "ingress"
+    stats = search_cache.get_search_cache().stats()
+    assert stats["hits"] == 1 and stats["invalidated"] == 3 and stats["savedMs"] > 0